@@ -1,7 +1,7 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-from datetime import datetime, timedelta
-import random
+from werkzeug.middleware.proxy_fix import ProxyFix
+from datetime import timedelta
 import os
 from dotenv import load_dotenv
 
@@ -19,18 +19,226 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 from models import db
 db.init_app(app)
 
-# Import models after db initialization
-from models import Customer, Reservation
+# Import the modules that use db after its initialization
+from booking import (
+    TOTAL_TABLES, SlotFullError, TableAllocationError,
+    allocate_table, allocate_tables, backfill_slot_inventory, book_claimed_table, booked_counts_between,
+    stay_mask, table_mask_for, table_masks_between
+)
+from archive import reservation_archiver, start_reservation_archiver
+from availability_cache import availability_cache, get_booked_count, warm_availability_cache
+from changes import ReservationNotFoundError, ReservationStartedError, cancel_reservation, change_reservation
+from cache_sync import (
+    notify_allocations, notify_slot_changed, publish_allocations, start_invalidation_listener
+)
+from config import Config
+from customers import upsert_customer
+from holds import (
+    HoldExpiredError, HoldLimitError, HoldTooSmallError, claim_hold, create_hold, hold_reaper, release_hold,
+    start_hold_reaper
+)
+from idempotency import current_claim, idempotent, keep_claim, purge_expired_keys, store_response
+from migrations import migrate_database
+from partitions import start_partition_maintenance
+from seating import floor_plan, parse_party_size, popcount, sync_tables
+from retry import TransactionConflictError, retry_stats, run_in_transaction
+from shared_counters import init_shared_counters, lookup_booked_count
+from slot_search import MAX_ALTERNATIVES, nearest_available_slots
+from waitlist import find_entry, join_waitlist, leave_waitlist, queue_entry
+from waitlist_queue import waitlist_queue
+import group_commit
+import slot_dispatcher
+from slots import (
+    SLOT_LENGTH, SLOT_MINUTES, booking_window_ids, booking_window_slots, dining_minutes, dining_slots,
+    first_slot_id_from, format_time_slot, is_bookable, parse_time_slot, slot_from_id, slot_grid, slot_id
+)
 
-# Create tables
+# Behind reverse proxies, request.remote_addr is the guest's address from
+# X-Forwarded-For, so per-client limits (table holds) apply per guest
+if Config.TRUSTED_PROXIES:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=Config.TRUSTED_PROXIES)
+
+# Create or upgrade the schema, then load runtime state
 with app.app_context():
-    db.create_all()
+    migrate_database(db.engine)
+    start_partition_maintenance(db.engine)
+    sync_tables()
+    backfill_slot_inventory()
+    purge_expired_keys()
+    warm_availability_cache()
+    init_shared_counters(app)
+    start_invalidation_listener()
+    group_commit.start_group_committer(app)
+    slot_dispatcher.start_slot_dispatcher(app)
+    start_hold_reaper(app)
+    start_reservation_archiver(db.engine)
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
     return jsonify({'status': 'healthy', 'message': 'Café Fausse API is running'})
 
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    """Runtime counters for this worker process"""
+    stats = {
+        'availability_cache': availability_cache.stats(),
+        'transaction_retries': retry_stats.stats(),
+        'table_holds': hold_reaper.stats(),
+        'waitlist': waitlist_queue.stats(),
+        'archive': reservation_archiver.stats()
+    }
+    if group_commit.group_committer is not None:
+        stats['group_commit'] = group_commit.group_committer.stats()
+    if slot_dispatcher.dispatcher is not None:
+        stats['slot_queue'] = slot_dispatcher.dispatcher.stats()
+    return jsonify(stats)
+
+def closed_slot_response():
+    """400 for a time the restaurant does not take reservations at"""
+    return jsonify({
+        'error': f'Reservations are taken every {SLOT_MINUTES} minutes during business hours, '
+                 f'up to {Config.RESERVATION_ADVANCE_DAYS} days in advance.'
+    }), 400
+
+def invalid_party_response(field='number_of_guests'):
+    """400 for a party size no table or combination of tables can seat"""
+    return jsonify({
+        'error': f'{field} must be a whole number from 1 to {floor_plan.max_party}. '
+                 f'For larger parties, please call the restaurant.'
+    }), 400
+
+def party_size_from(value):
+    """A request's party size, or None if no table or combination of tables can seat it"""
+    party_size = parse_party_size(value)
+    if party_size is None or party_size > floor_plan.max_party:
+        return None
+    return party_size
+
+def seating_fields(allocation):
+    """Where a booked party sits, for a JSON response"""
+    return {
+        'reservation_id': allocation.reservation_id,
+        'table_number': allocation.table_number,
+        'table_numbers': list(allocation.table_numbers),
+        'zone': floor_plan.zone[allocation.table_number],
+        'duration_minutes': allocation.duration_minutes
+    }
+
+def alternative_slots(time_slot, party_size=2, n=5):
+    """Nearest open slots to time_slot, formatted for a JSON response"""
+    return [
+        {'time_slot': format_time_slot(slot), 'available_tables': available}
+        for slot, available in nearest_available_slots(time_slot, party_size, n)
+    ]
+
+def slot_full_response(time_slot, party_size=2):
+    """400 for a fully booked slot, listing the closest times still open"""
+    return jsonify({
+        'error': 'This time slot is fully booked. Please choose another time.',
+        'alternatives': alternative_slots(time_slot, party_size)
+    }), 400
+
+def reservation_payload(data, time_slot, allocation):
+    """Body of the 201 response for a confirmed reservation"""
+    return {
+        'success': True,
+        'message': 'Reservation confirmed successfully!',
+        **seating_fields(allocation),
+        'number_of_guests': data['number_of_guests'],
+        'time_slot': format_time_slot(time_slot),
+        'slot_id': slot_id(time_slot)
+    }
+
+def book_table_transaction(data, time_slot):
+    """Book a table for one reservation request in its own transaction"""
+    # Create or find customer in one round trip
+    customer = upsert_customer(
+        email=data['email'],
+        name=data['customer_name'],
+        phone=data.get('phone', ''),
+        newsletter_signup=data.get('newsletter_signup', False)
+    )
+    
+    # Lock the slot's inventory row and claim the smallest table, or adjacent
+    # tables, that fit
+    allocation = allocate_table(customer.id, time_slot, data['number_of_guests'])
+    
+    # Tell other workers to evict the slots of the stay once the booking commits
+    stamp = notify_allocations([allocation])
+    # An Idempotency-Key's response commits with the booking it reports
+    store_response(current_claim(), 201, reservation_payload(data, time_slot, allocation))
+    db.session.commit()
+    return allocation, stamp
+
+def book_held_table_transaction(data, time_slot, hold_token):
+    """Turn a table hold into a reservation in its own transaction"""
+    customer = upsert_customer(
+        email=data['email'],
+        name=data['customer_name'],
+        phone=data.get('phone', ''),
+        newsletter_signup=data.get('newsletter_signup', False)
+    )
+    
+    # The held table is already taken in the inventory for the stay;
+    # consuming the hold and inserting the reservation keep it taken
+    table_number, duration_minutes = claim_hold(hold_token, time_slot, data['number_of_guests'])
+    allocation = book_claimed_table(
+        customer.id, time_slot, table_number, data['number_of_guests'], duration_minutes
+    )
+    
+    notify_slot_changed(time_slot)
+    store_response(current_claim(), 201, reservation_payload(data, time_slot, allocation))
+    db.session.commit()
+    return allocation
+
+def join_waitlist_transaction(data, time_slot):
+    """Put a party on a full slot's waitlist in its own transaction"""
+    customer = upsert_customer(
+        email=data['email'],
+        name=data['customer_name'],
+        phone=data.get('phone', ''),
+        newsletter_signup=data.get('newsletter_signup', False)
+    )
+    entry = join_waitlist(customer.id, time_slot, data['number_of_guests'])
+    payload = {
+        'success': True,
+        'waitlisted': True,
+        'message': 'This time slot is fully booked. You are on the waitlist and will get '
+                   'the first table that fits your party.',
+        'waitlist_id': entry.id,
+        'number_of_guests': data['number_of_guests'],
+        'time_slot': format_time_slot(time_slot),
+        'alternatives': alternative_slots(time_slot, data['number_of_guests'])
+    }
+    
+    # Other workers reload the slot's waitlist queue once this commits
+    notify_slot_changed(time_slot)
+    store_response(current_claim(), 202, payload)
+    db.session.commit()
+    return entry, payload
+
+def waitlist_response(data, time_slot):
+    """202 for a party that asked to wait for a full slot"""
+    try:
+        entry, payload = run_in_transaction(join_waitlist_transaction, data, time_slot)
+    except TransactionConflictError:
+        db.session.rollback()
+        return jsonify({'error': 'This time slot is in high demand. Please try again.'}), 409
+    queue_entry(entry.id, entry.requested_at, time_slot, data['number_of_guests'])
+    
+    return jsonify(payload), 202
+
+def book_table(data, time_slot):
+    """Book a table, retrying on serialization failures and deadlocks"""
+    allocation, stamp = run_in_transaction(book_table_transaction, data, time_slot)
+    
+    # Write the slot's new count through to the availability cache
+    # and the shared counters read by the other workers on this host
+    publish_allocations([allocation], stamp)
+    return allocation
+
 @app.route('/api/reservations', methods=['POST'])
+@idempotent
 def create_reservation():
     try:
         data = request.get_json()
@@ -41,53 +249,355 @@ def create_reservation():
             if not data.get(field):
                 return jsonify({'error': f'{field} is required'}), 400
         
-        # Check if time slot is available
-        time_slot = datetime.fromisoformat(data['time_slot'].replace('Z', '+00:00'))
-        existing_reservations = Reservation.query.filter_by(time_slot=time_slot).count()
+        data['number_of_guests'] = party_size_from(data['number_of_guests'])
+        if data['number_of_guests'] is None:
+            return invalid_party_response()
         
-        # Check if all 30 tables are booked for this time slot
-        if existing_reservations >= 30:
-            return jsonify({'error': 'This time slot is fully booked. Please choose another time.'}), 400
+        time_slot = parse_time_slot(data['time_slot'])
+        if not is_bookable(time_slot):
+            return closed_slot_response()
         
-        # Create or find customer
-        customer = Customer.query.filter_by(email=data['email']).first()
-        if not customer:
-            customer = Customer(
-                name=data['customer_name'],
+        try:
+            if data.get('hold_token'):
+                # The table was set aside when the guest picked the slot
+                allocation = run_in_transaction(book_held_table_transaction, data, time_slot, data['hold_token'])
+            elif group_commit.group_committer is not None:
+                # Wait for the next micro-batch to commit this booking
+                allocation = group_commit.group_committer.book(
+                    data, time_slot, timeout=Config.BOOKING_TIMEOUT,
+                    response_body=lambda allocation: reservation_payload(data, time_slot, allocation)
+                )
+            elif slot_dispatcher.dispatcher is not None:
+                # Wait for this slot's worker to seat and persist the booking
+                allocation = slot_dispatcher.dispatcher.book(
+                    data, time_slot, timeout=Config.BOOKING_TIMEOUT,
+                    response_body=lambda allocation: reservation_payload(data, time_slot, allocation)
+                )
+            else:
+                allocation = book_table(data, time_slot)
+        except SlotFullError:
+            db.session.rollback()
+            if data.get('join_waitlist'):
+                return waitlist_response(data, time_slot)
+            return slot_full_response(time_slot, data['number_of_guests'])
+        except HoldExpiredError:
+            db.session.rollback()
+            return jsonify({'error': 'Your table hold has expired. Please choose a time again.'}), 410
+        except HoldTooSmallError:
+            db.session.rollback()
+            return jsonify({
+                'error': f'Your table hold does not fit a party of {data["number_of_guests"]}. '
+                         f'Please choose a time again.'
+            }), 409
+        except (TableAllocationError, TransactionConflictError):
+            db.session.rollback()
+            return jsonify({'error': 'This time slot is in high demand. Please try again.'}), 409
+        except group_commit.BookingPendingError:
+            # The booking is still queued and stores its own response for the
+            # Idempotency-Key, so the key must not be released or answered here
+            if current_claim() is None:
+                # Without a key a retry would be a second booking
+                return jsonify({
+                    'pending': True,
+                    'message': 'Your reservation is still being processed. Please do not submit it again, '
+                               'as that could book a second table; call the restaurant to confirm it.'
+                }), 202
+            keep_claim()
+            return jsonify({
+                'pending': True,
+                'message': 'Your reservation is still being processed. Send the same request again '
+                           'with the same Idempotency-Key to see the result.'
+            }), 202
+        
+        return jsonify(reservation_payload(data, time_slot, allocation)), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/reservations/batch', methods=['POST'])
+@idempotent
+def create_batch_reservation():
+    """Book several tables across one or more slots for one customer, all or nothing"""
+    try:
+        data = request.get_json()
+        
+        # Validate required fields
+        required_fields = ['customer_name', 'email', 'reservations']
+        for field in required_fields:
+            if not data.get(field):
+                return jsonify({'error': f'{field} is required'}), 400
+        
+        items = data['reservations']
+        if not isinstance(items, list):
+            return jsonify({'error': 'reservations must be a list'}), 400
+        if len(items) > Config.MAX_BATCH_RESERVATIONS:
+            return jsonify({'error': f'A batch can book at most {Config.MAX_BATCH_RESERVATIONS} tables'}), 400
+        for index, item in enumerate(items):
+            for field in ['time_slot', 'number_of_guests']:
+                if not isinstance(item, dict) or not item.get(field):
+                    return jsonify({'error': f'reservations[{index}].{field} is required'}), 400
+        
+        party_sizes = [party_size_from(item['number_of_guests']) for item in items]
+        for index, party_size in enumerate(party_sizes):
+            if party_size is None:
+                return invalid_party_response(f'reservations[{index}].number_of_guests')
+        
+        time_slots = [parse_time_slot(item['time_slot']) for item in items]
+        if not all(is_bookable(time_slot) for time_slot in time_slots):
+            return closed_slot_response()
+        
+        def transaction():
+            customer = upsert_customer(
                 email=data['email'],
+                name=data['customer_name'],
                 phone=data.get('phone', ''),
                 newsletter_signup=data.get('newsletter_signup', False)
             )
-            db.session.add(customer)
-            db.session.flush()  # Get the customer ID
-        
-        # Assign random table (1-30)
-        available_tables = list(range(1, 31))
-        booked_tables = [r.table_number for r in Reservation.query.filter_by(time_slot=time_slot).all()]
-        available_tables = [t for t in available_tables if t not in booked_tables]
-        assigned_table = random.choice(available_tables)
-        
-        # Create reservation
-        reservation = Reservation(
-            customer_id=customer.id,
-            time_slot=time_slot,
-            table_number=assigned_table
-        )
-        db.session.add(reservation)
-        db.session.commit()
+            allocations = allocate_tables(customer.id, time_slots, party_sizes)
+            stamp = notify_allocations(allocations)
+            payload = {
+                'success': True,
+                'message': f'{len(allocations)} reservations confirmed successfully!',
+                'reservations': [
+                    {
+                        **seating_fields(allocation),
+                        'time_slot': format_time_slot(time_slot),
+                        'number_of_guests': party_size
+                    }
+                    for party_size, time_slot, allocation in zip(party_sizes, time_slots, allocations)
+                ]
+            }
+            store_response(current_claim(), 201, payload)
+            db.session.commit()
+            return allocations, payload, stamp
+        
+        try:
+            allocations, payload, stamp = run_in_transaction(transaction)
+        except SlotFullError as e:
+            db.session.rollback()
+            full_slot = e.args[0]
+            return jsonify({
+                'error': f'Not enough free tables at {format_time_slot(full_slot)}. No tables were booked.',
+                'time_slot': format_time_slot(full_slot)
+            }), 400
+        except (TableAllocationError, TransactionConflictError):
+            db.session.rollback()
+            return jsonify({'error': 'These time slots are in high demand. Please try again.'}), 409
+        
+        publish_allocations(allocations, stamp)
+        
+        return jsonify(payload), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+def reservation_not_found_response():
+    """404 for an unknown reservation id or an email that does not match it"""
+    return jsonify({'error': 'Reservation not found. Please check the reservation number and email.'}), 404
+
+def reservation_started_response():
+    """400 for a reservation whose time has already come"""
+    return jsonify({'error': 'This reservation has already started and can no longer be changed.'}), 400
+
+@app.route('/api/reservations/<int:reservation_id>', methods=['DELETE'])
+def delete_reservation(reservation_id):
+    """Cancel a reservation; its tables can be booked again straight away"""
+    try:
+        # DELETE bodies are often dropped by clients and proxies, so the
+        # email may also come in the query string
+        data = request.get_json(silent=True) or {}
+        email = request.args.get('email') or data.get('email')
+        if not email:
+            return jsonify({'error': 'email is required'}), 400
+        
+        try:
+            reservation = cancel_reservation(reservation_id, email)
+        except ReservationNotFoundError:
+            db.session.rollback()
+            return reservation_not_found_response()
+        except ReservationStartedError:
+            db.session.rollback()
+            return reservation_started_response()
+        except TransactionConflictError:
+            db.session.rollback()
+            return jsonify({'error': 'This reservation is being changed. Please try again.'}), 409
         
         return jsonify({
             'success': True,
-            'message': 'Reservation confirmed successfully!',
+            'message': 'Reservation cancelled',
             'reservation_id': reservation.id,
-            'table_number': assigned_table,
-            'time_slot': time_slot.isoformat()
+            'time_slot': format_time_slot(reservation.time_slot)
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/reservations/<int:reservation_id>', methods=['PATCH'])
+def update_reservation(reservation_id):
+    """Move a reservation to another slot and/or change its party size"""
+    try:
+        data = request.get_json()
+        
+        if not data.get('email'):
+            return jsonify({'error': 'email is required'}), 400
+        if not data.get('time_slot') and not data.get('number_of_guests'):
+            return jsonify({'error': 'time_slot or number_of_guests is required'}), 400
+        
+        party_size = None
+        if data.get('number_of_guests'):
+            party_size = party_size_from(data['number_of_guests'])
+            if party_size is None:
+                return invalid_party_response()
+        
+        time_slot = None
+        if data.get('time_slot'):
+            time_slot = parse_time_slot(data['time_slot'])
+            if not is_bookable(time_slot):
+                return closed_slot_response()
+        
+        try:
+            allocation, party_size, time_slot = change_reservation(
+                reservation_id, data['email'], time_slot, party_size
+            )
+        except ReservationNotFoundError:
+            db.session.rollback()
+            return reservation_not_found_response()
+        except ReservationStartedError:
+            db.session.rollback()
+            return reservation_started_response()
+        except SlotFullError as e:
+            db.session.rollback()
+            full_slot, party_size = e.args
+            return jsonify({
+                'error': 'No table is free for this change. Your reservation has not been changed.',
+                'alternatives': alternative_slots(full_slot, party_size)
+            }), 400
+        except (TableAllocationError, TransactionConflictError):
+            db.session.rollback()
+            return jsonify({'error': 'This time slot is in high demand. Please try again.'}), 409
+        
+        return jsonify({
+            'success': True,
+            'message': 'Reservation updated successfully!',
+            **seating_fields(allocation),
+            'number_of_guests': party_size,
+            'time_slot': format_time_slot(time_slot),
+            'slot_id': slot_id(time_slot)
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/holds', methods=['POST'])
+def create_table_hold():
+    """Set a table aside in a slot while the guest completes the reservation form"""
+    try:
+        data = request.get_json()
+        
+        if not data.get('time_slot'):
+            return jsonify({'error': 'time_slot is required'}), 400
+        minutes = data.get('minutes', Config.HOLD_MINUTES)
+        if not isinstance(minutes, int) or not 1 <= minutes <= Config.MAX_HOLD_MINUTES:
+            return jsonify({'error': f'minutes must be between 1 and {Config.MAX_HOLD_MINUTES}'}), 400
+        party_size = party_size_from(data.get('number_of_guests', 2))
+        if party_size is None:
+            return invalid_party_response()
+        if party_size > floor_plan.max_capacity:
+            return jsonify({
+                'error': 'Parties seated at tables pushed together cannot be held. '
+                         'Your tables are chosen when you book.'
+            }), 400
+        
+        time_slot = parse_time_slot(data['time_slot'])
+        if not is_bookable(time_slot):
+            return closed_slot_response()
+        
+        try:
+            hold = create_hold(time_slot, minutes, party_size, request.remote_addr)
+        except HoldLimitError:
+            db.session.rollback()
+            return jsonify({
+                'error': f'You already hold {Config.MAX_HOLDS_PER_CLIENT} tables. '
+                         'Release one or book it before holding another.'
+            }), 429
+        except SlotFullError:
+            db.session.rollback()
+            return slot_full_response(time_slot, party_size)
+        except TransactionConflictError:
+            db.session.rollback()
+            return jsonify({'error': 'This time slot is in high demand. Please try again.'}), 409
+        
+        return jsonify({
+            'hold_token': hold.token,
+            'time_slot': format_time_slot(hold.time_slot),
+            'table_number': hold.table_number,
+            'zone': floor_plan.zone[hold.table_number],
+            'duration_minutes': hold.duration_minutes,
+            'expires_at': hold.expires_at.isoformat() + 'Z'
         }), 201
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/holds/<token>', methods=['DELETE'])
+def delete_table_hold(token):
+    """Release a hold early, e.g. when the guest picks another time"""
+    try:
+        if release_hold(token) is None:
+            return jsonify({'error': 'Hold not found or already released'}), 404
+        return jsonify({'success': True, 'message': 'Hold released'})
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/waitlist/<int:entry_id>', methods=['GET'])
+def get_waitlist_entry(entry_id):
+    """Whether a waiting party has been given a table yet"""
+    try:
+        email = request.args.get('email')
+        if not email:
+            return jsonify({'error': 'email parameter is required'}), 400
+        
+        entry = find_entry(entry_id, email)
+        if entry is None:
+            return jsonify({'error': 'Waitlist entry not found'}), 404
+        
+        return jsonify({
+            'waitlist_id': entry.id,
+            'status': 'waiting' if entry.reservation_id is None else 'confirmed',
+            'reservation_id': entry.reservation_id,
+            'time_slot': format_time_slot(entry.time_slot),
+            'number_of_guests': entry.party_size,
+            'requested_at': entry.requested_at.isoformat() + 'Z'
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/waitlist/<int:entry_id>', methods=['DELETE'])
+def delete_waitlist_entry(entry_id):
+    """Leave a slot's waitlist"""
+    try:
+        data = request.get_json(silent=True) or {}
+        email = request.args.get('email') or data.get('email')
+        if not email:
+            return jsonify({'error': 'email is required'}), 400
+        
+        if not leave_waitlist(entry_id, email):
+            return jsonify({'error': 'Waitlist entry not found or already confirmed'}), 404
+        return jsonify({'success': True, 'message': 'Removed from the waitlist'})
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/reservations/check', methods=['GET'])
 def check_availability():
     try:
@@ -95,20 +605,162 @@ def check_availability():
         if not time_slot:
             return jsonify({'error': 'time_slot parameter is required'}), 400
         
-        time_slot_dt = datetime.fromisoformat(time_slot.replace('Z', '+00:00'))
-        existing_reservations = Reservation.query.filter_by(time_slot=time_slot_dt).count()
+        party_size = None
+        if request.args.get('party') is not None:
+            party_size = party_size_from(request.args['party'])
+            if party_size is None:
+                return invalid_party_response('party')
+        
+        time_slot_dt = parse_time_slot(time_slot)
+        if not is_bookable(time_slot_dt):
+            return closed_slot_response()
+        
+        if party_size is not None:
+            # Which tables are free for the whole stay matters, not just how many
+            tables = floor_plan.seat(table_mask_for(time_slot_dt, dining_minutes(party_size)), party_size)
+            return jsonify({
+                'time_slot': time_slot,
+                'slot_id': slot_id(time_slot_dt),
+                'party': party_size,
+                'total_tables': TOTAL_TABLES,
+                'is_available': tables is not None,
+                'tables_needed': len(tables) if tables else None
+            })
+        
+        existing_reservations = lookup_booked_count(time_slot_dt)
+        if existing_reservations is None:
+            existing_reservations = get_booked_count(time_slot_dt)
         
         return jsonify({
             'time_slot': time_slot,
-            'available_tables': 30 - existing_reservations,
-            'total_tables': 30,
-            'is_available': existing_reservations < 30
+            'slot_id': slot_id(time_slot_dt),
+            'available_tables': TOTAL_TABLES - existing_reservations,
+            'total_tables': TOTAL_TABLES,
+            'is_available': existing_reservations < TOTAL_TABLES
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/slots', methods=['GET'])
+def list_slots():
+    """Every bookable slot in the booking window, from the compiled business-hours grid"""
+    try:
+        first, last = booking_window_ids()
+        return jsonify({
+            'timezone': Config.TIMEZONE,
+            'slot_minutes': SLOT_MINUTES,
+            'advance_days': Config.RESERVATION_ADVANCE_DAYS,
+            'max_party': floor_plan.max_party,
+            'slots': [
+                {'slot_id': slot_id(slot), 'time_slot': format_time_slot(slot)}
+                for slot in booking_window_slots()
+                if first <= slot_id(slot) <= last
+            ]
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/availability', methods=['GET'])
+def range_availability():
+    """Remaining tables for every booked slot between 'from' and 'to', and whether an optional party fits"""
+    try:
+        start_param = request.args.get('from')
+        end_param = request.args.get('to')
+        if not start_param or not end_param:
+            return jsonify({'error': 'from and to parameters are required'}), 400
+        party_size = None
+        if request.args.get('party') is not None:
+            party_size = party_size_from(request.args['party'])
+            if party_size is None:
+                return invalid_party_response('party')
+        
+        start = parse_time_slot(start_param)
+        end = parse_time_slot(end_param)
+        if end < start:
+            return jsonify({'error': 'to must not be before from'}), 400
+        if end - start > timedelta(days=Config.RESERVATION_ADVANCE_DAYS + 1):
+            return jsonify({'error': f'Range cannot exceed {Config.RESERVATION_ADVANCE_DAYS + 1} days'}), 400
+        
+        if party_size is not None:
+            # A stay starting in the range can run past its end. Slots missing from
+            # the result have every table free for the stay, which seats any valid party.
+            stay = dining_slots(dining_minutes(party_size))
+            masks = table_masks_between(start, end + (stay - 1) * SLOT_LENGTH)
+            first, last = first_slot_id_from(start), slot_id(end)
+            # Stepping back from a booked slot can land outside business hours
+            starts = sorted({
+                value - step for value in masks for step in range(stay)
+                if first <= value - step <= last and slot_grid.is_open(value - step)
+            })
+            slots = []
+            for value in starts:
+                tables = floor_plan.seat(stay_mask(masks, value, stay), party_size)
+                slots.append({
+                    'slot_id': value,
+                    'time_slot': format_time_slot(slot_from_id(value)),
+                    'available_tables': TOTAL_TABLES - popcount(masks.get(value, 0)),
+                    'is_available': tables is not None,
+                    'tables_needed': len(tables) if tables else None
+                })
+            return jsonify({
+                'from': format_time_slot(start),
+                'to': format_time_slot(end),
+                'party': party_size,
+                'total_tables': TOTAL_TABLES,
+                'slots': slots
+            })
+        
+        # Slots missing from the result have every table free
+        counts = booked_counts_between(start, end)
+        
+        return jsonify({
+            'from': format_time_slot(start),
+            'to': format_time_slot(end),
+            'total_tables': TOTAL_TABLES,
+            'slots': [
+                {
+                    'slot_id': value,
+                    'time_slot': format_time_slot(slot_from_id(value)),
+                    'available_tables': TOTAL_TABLES - count,
+                    'is_available': count < TOTAL_TABLES
+                }
+                for value, count in counts.items()
+            ]
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/availability/nearest', methods=['GET'])
+def nearest_availability():
+    """The N open slots closest to a requested time, searched outward across business hours"""
+    try:
+        time_slot = request.args.get('time_slot')
+        if not time_slot:
+            return jsonify({'error': 'time_slot parameter is required'}), 400
+        
+        party_size = party_size_from(request.args.get('party', 2))
+        n = request.args.get('n', 5, type=int)
+        if party_size is None:
+            return invalid_party_response('party')
+        if not 1 <= n <= MAX_ALTERNATIVES:
+            return jsonify({'error': f'n must be between 1 and {MAX_ALTERNATIVES}'}), 400
+        
+        time_slot_dt = parse_time_slot(time_slot)
+        
+        return jsonify({
+            'time_slot': format_time_slot(time_slot_dt),
+            'party': party_size,
+            'alternatives': alternative_slots(time_slot_dt, party_size, n)
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/newsletter', methods=['POST'])
+@idempotent
 def newsletter_signup():
     try:
         data = request.get_json()
@@ -116,25 +768,20 @@ def newsletter_signup():
         if not data.get('email'):
             return jsonify({'error': 'Email is required'}), 400
         
-        # Check if email already exists
-        existing_customer = Customer.query.filter_by(email=data['email']).first()
-        
-        if existing_customer:
-            # Update newsletter signup status
-            existing_customer.newsletter_signup = True
-            db.session.commit()
-            return jsonify({'message': 'Email updated for newsletter subscription'}), 200
+        # Create the customer, or switch on the newsletter for an existing one
+        customer = upsert_customer(
+            email=data['email'],
+            name=data.get('name', ''),
+            newsletter_signup=True
+        )
+        if customer.created:
+            payload, status_code = {'message': 'Successfully subscribed to newsletter'}, 201
         else:
-            # Create new customer for newsletter
-            customer = Customer(
-                name=data.get('name', ''),
-                email=data['email'],
-                phone='',
-                newsletter_signup=True
-            )
-            db.session.add(customer)
-            db.session.commit()
-            return jsonify({'message': 'Successfully subscribed to newsletter'}), 201
+            payload, status_code = {'message': 'Email updated for newsletter subscription'}, 200
+        store_response(current_claim(), status_code, payload)
+        db.session.commit()
+        
+        return jsonify(payload), status_code
             
     except Exception as e:
         db.session.rollback()
@@ -151,7 +798,7 @@ def get_restaurant_info():
             'monday_saturday': '5:00 PM – 11:00 PM',
             'sunday': '5:00 PM – 9:00 PM'
         },
-        'total_tables': 30
+        'total_tables': Config.TOTAL_TABLES
     })
 
 @app.route('/api/menu', methods=['GET'])
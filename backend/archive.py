@@ -0,0 +1,259 @@
+"""
+Archival of past reservations to compressed Parquet files.
+
+Reservations are only needed for reporting once their slot is well in the
+past, so they are moved out of PostgreSQL. The live table then holds little
+more than the booking window, and its partitions and indexes stay small.
+
+Every Config.ARCHIVE_INTERVAL hours the archiver:
+
+- streams reservations older than Config.ARCHIVE_AFTER_DAYS through a
+  server-side cursor, Config.ARCHIVE_CHUNK_SIZE rows at a time, so memory use
+  does not depend on how much history there is;
+- writes each chunk to a zstd-compressed Parquet file under
+  Config.ARCHIVE_DIR/reservations/<YYYY-MM>/, renaming it into place only once
+  it is complete;
+- deletes the archived rows in batches of Config.ARCHIVE_DELETE_BATCH, one
+  short transaction each, so bookings never wait on a long delete;
+- archives any month partition that partitions.py has detached, then drops
+  it.
+
+A row is deleted only after the file holding it is on disk. If a run stops
+between writing a file and deleting its rows, the next run writes those rows
+again, so readers that need exact counts should drop duplicate ids.
+read_archived_reservations() returns the archive as a pyarrow Table for
+analytics.
+"""
+
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from sqlalchemy import text
+
+from config import Config
+from slots import restaurant_now, slot_from_id, slot_id
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary key for pg_try_advisory_lock; the holder runs the archiver
+ARCHIVE_LOCK_ID = 4_417_003
+
+TRY_LOCK_SQL = text("SELECT pg_try_advisory_lock(:lock_id)")
+UNLOCK_SQL = text("SELECT pg_advisory_unlock(:lock_id)")
+
+RESERVATION_SCHEMA = pa.schema([
+    ('id', pa.int32()),
+    ('customer_id', pa.int32()),
+    ('time_slot', pa.timestamp('us')),
+    ('slot_id', pa.int32()),
+    ('table_number', pa.int16()),
+    ('party_size', pa.int16()),
+    ('duration_minutes', pa.int16()),
+    ('combined_with', pa.int32()),
+    ('created_at', pa.timestamp('us')),
+])
+
+COLUMNS = ', '.join(RESERVATION_SCHEMA.names)
+
+STREAM_RESERVATIONS_SQL = text(f"""
+    SELECT {COLUMNS}
+    FROM reservations
+    WHERE slot_id < :cutoff
+    ORDER BY slot_id, id
+""")
+
+# Repeating the slot ids as a plain filter lets the planner prune partitions
+DELETE_ROWS_SQL = """
+    DELETE FROM {table} r
+    USING unnest(CAST(:ids AS integer[]), CAST(:slot_ids AS integer[])) AS d(id, slot_id)
+    WHERE r.id = d.id AND r.slot_id = d.slot_id AND r.slot_id = ANY(CAST(:slot_ids AS integer[]))
+"""
+
+# Inventory rows for past slots are no longer read by anything
+DELETE_INVENTORY_SQL = text("DELETE FROM slot_inventory WHERE slot_id < :cutoff")
+
+# Month partitions detached by partitions.py, waiting to be archived
+DETACHED_PARTITIONS_SQL = text(r"""
+    SELECT relname FROM pg_class
+    WHERE relkind = 'r' AND NOT relispartition
+      AND relname ~ '^reservations_\d{4}_\d{2}$'
+    ORDER BY relname
+""")
+
+
+def archive_root():
+    return os.path.join(Config.ARCHIVE_DIR, 'reservations')
+
+
+def write_chunk(rows):
+    """Write a chunk of reservation rows to new Parquet files, one per month."""
+    months = {}
+    for row in rows:
+        months.setdefault(f'{row.time_slot:%Y-%m}', []).append(row._asdict())
+    paths = []
+    for month, month_rows in months.items():
+        month_dir = os.path.join(archive_root(), month)
+        os.makedirs(month_dir, exist_ok=True)
+        first = month_rows[0]
+        path = os.path.join(month_dir, f"part-{first['slot_id']}-{first['id']}-{uuid.uuid4().hex[:8]}.parquet")
+        pq.write_table(pa.Table.from_pylist(month_rows, schema=RESERVATION_SCHEMA), path + '.tmp', compression='zstd')
+        os.replace(path + '.tmp', path)
+        paths.append(path)
+    return paths
+
+
+def delete_archived(engine, table, rows):
+    """Delete archived rows in short transactions."""
+    statement = text(DELETE_ROWS_SQL.format(table=table))
+    for start in range(0, len(rows), Config.ARCHIVE_DELETE_BATCH):
+        batch = rows[start:start + Config.ARCHIVE_DELETE_BATCH]
+        with engine.begin() as conn:
+            conn.execute(statement, {
+                'ids': [row.id for row in batch],
+                'slot_ids': [row.slot_id for row in batch],
+            })
+
+
+def stream_chunks(engine, statement, params=None):
+    """Yield lists of rows read through a server-side cursor."""
+    with engine.connect() as conn:
+        result = conn.execution_options(
+            stream_results=True, yield_per=Config.ARCHIVE_CHUNK_SIZE
+        ).execute(statement, params or {})
+        for chunk in result.partitions():
+            yield chunk
+
+
+def archive_reservations(engine, cutoff):
+    """Archive and delete live reservations in slots before cutoff (a slot id)."""
+    archived = 0
+    for chunk in stream_chunks(engine, STREAM_RESERVATIONS_SQL, {'cutoff': cutoff}):
+        write_chunk(chunk)
+        delete_archived(engine, 'reservations', chunk)
+        archived += len(chunk)
+    with engine.begin() as conn:
+        conn.execute(DELETE_INVENTORY_SQL, {'cutoff': cutoff})
+    return archived
+
+
+def archive_detached_partitions(engine):
+    """Archive every detached month partition, then drop it."""
+    archived = 0
+    with engine.connect() as conn:
+        names = list(conn.execute(DETACHED_PARTITIONS_SQL).scalars())
+    for name in names:
+        for chunk in stream_chunks(engine, text(f'SELECT {COLUMNS} FROM {name} ORDER BY slot_id, id')):
+            write_chunk(chunk)
+            delete_archived(engine, name, chunk)
+            archived += len(chunk)
+        with engine.begin() as conn:
+            conn.execute(text(f'DROP TABLE {name}'))
+        logger.info('Archived and dropped detached partition %s', name)
+    return archived
+
+
+class ReservationArchiver(threading.Thread):
+    """Runs the archiver every Config.ARCHIVE_INTERVAL hours."""
+
+    def __init__(self):
+        super().__init__(name='reservation-archiver', daemon=True)
+        self.engine = None
+        self.archived = 0
+        self.runs = 0
+        self.last_run = None
+        self._stop_event = threading.Event()
+
+    def start_for(self, engine):
+        self.engine = engine
+        self.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run_once(self):
+        """Archive one batch of history unless another process is already doing it."""
+        cutoff_day = (restaurant_now() - timedelta(days=Config.ARCHIVE_AFTER_DAYS)).date()
+        cutoff = slot_id(datetime.combine(cutoff_day, datetime.min.time()))
+        started = time.monotonic()
+        with self.engine.connect() as lock_conn:
+            lock_conn = lock_conn.execution_options(isolation_level='AUTOCOMMIT')
+            if not lock_conn.execute(TRY_LOCK_SQL, {'lock_id': ARCHIVE_LOCK_ID}).scalar():
+                return 0
+            try:
+                archived = archive_detached_partitions(self.engine) + archive_reservations(self.engine, cutoff)
+            finally:
+                lock_conn.execute(UNLOCK_SQL, {'lock_id': ARCHIVE_LOCK_ID})
+        self.archived += archived
+        self.runs += 1
+        self.last_run = datetime.utcnow()
+        if archived:
+            logger.info('Archived %d reservations before %s in %.1fs',
+                        archived, slot_from_id(cutoff), time.monotonic() - started)
+        return archived
+
+    def run(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.warning('Reservation archiving failed: %s', e)
+            if self._stop_event.wait(Config.ARCHIVE_INTERVAL * 3600):
+                return
+
+    def stats(self):
+        return {
+            'enabled': self.is_alive(),
+            'reservations_archived': self.archived,
+            'runs': self.runs,
+            'last_run': self.last_run.isoformat() if self.last_run else None,
+        }
+
+
+reservation_archiver = ReservationArchiver()
+
+
+def start_reservation_archiver(engine):
+    if Config.ARCHIVE_ENABLED and not reservation_archiver.is_alive():
+        reservation_archiver.start_for(engine)
+    return reservation_archiver
+
+
+def read_archived_reservations(start=None, end=None, columns=None):
+    """
+    Archived reservations with time_slot in [start, end) as a pyarrow Table.
+
+    Only the month directories that overlap the range are opened, and the
+    time filter is pushed down to the Parquet row groups.
+    """
+    root = archive_root()
+    if not os.path.isdir(root):
+        return RESERVATION_SCHEMA.empty_table().select(columns or RESERVATION_SCHEMA.names)
+
+    months = sorted(os.listdir(root))
+    if start is not None:
+        months = [month for month in months if month >= f'{start:%Y-%m}']
+    if end is not None:
+        months = [month for month in months if month <= f'{end - timedelta(microseconds=1):%Y-%m}']
+    files = [
+        os.path.join(root, month, name)
+        for month in months
+        for name in sorted(os.listdir(os.path.join(root, month)))
+        if name.endswith('.parquet')
+    ]
+
+    condition = None
+    if start is not None:
+        condition = ds.field('time_slot') >= pa.scalar(start, pa.timestamp('us'))
+    if end is not None:
+        before_end = ds.field('time_slot') < pa.scalar(end, pa.timestamp('us'))
+        condition = before_end if condition is None else condition & before_end
+    return ds.dataset(files, schema=RESERVATION_SCHEMA, format='parquet').to_table(
+        columns=columns, filter=condition
+    )
@@ -0,0 +1,162 @@
+"""
+In-process cache of booked table counts per time slot.
+
+Availability reads outnumber bookings by a wide margin, and a slot's count
+only changes when a reservation commits. The cache is a bounded LRU keyed by
+integer slot id (slots.slot_id); entries also expire after a TTL
+so counts changed by other processes are eventually picked up. The booking
+path writes the new count through as soon as it commits.
+
+A count read from the database on a miss is only cached if nothing wrote or
+evicted that slot since the read began: every change is stamped from one
+counter, and fill compares the stamps with the one begin_read returned, so
+a slow read cannot clobber a newer write-through.
+
+Write-throughs are ordered the same way. The writing transaction takes its
+stamp before it commits, while it still holds the slots' inventory locks,
+so a later commit to the same slot always takes a later stamp. A
+write-through whose slot was written, filled or evicted since its stamp
+cannot tell whose count is newer and evicts the slot instead, so the next
+read goes to the database. A request thread that publishes late therefore
+never leaves an older count in place of a newer one.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from booking import booked_count, booked_counts_between
+from config import Config
+from slots import business_slots, restaurant_now, slot_id
+
+
+class AvailabilityCache:
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # slot id -> (booked_count, expires_at, stamp)
+        self._dropped = OrderedDict()  # slot id -> stamp of its last invalidation or eviction
+        self._stamp = 0
+        self._floor = 0  # Reads that began before this stamp are not cached
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Cached booked count for the slot id, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def write_through(self, key, count, stamp):
+        """
+        Cache the count a transaction committed, given the stamp begin_read
+        returned before that commit. If the slot changed since, evict it.
+        """
+        with self._lock:
+            if self._changed_since(key, stamp):
+                self._entries.pop(key, None)
+                self._drop(key)
+                return False
+            self._store(key, count)
+            return True
+
+    def _store(self, key, count):
+        self._stamp += 1
+        self._entries[key] = (count, time.monotonic() + self.ttl_seconds, self._stamp)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self._drop(evicted)
+
+    def _drop(self, key):
+        self._stamp += 1
+        self._dropped[key] = self._stamp
+        self._dropped.move_to_end(key)
+        while len(self._dropped) > self.max_entries:
+            _, stamp = self._dropped.popitem(last=False)
+            self._floor = max(self._floor, stamp)
+
+    def begin_read(self):
+        """
+        Stamp to pass to fill with a count read from the database after this
+        call, or to write_through with a count committed after it.
+        """
+        with self._lock:
+            return self._stamp
+
+    def fill(self, key, count, stamp):
+        """Cache a count read since begin_read returned stamp, unless the slot changed since."""
+        with self._lock:
+            if self._changed_since(key, stamp):
+                return False
+            self._store(key, count)
+            return True
+
+    def _changed_since(self, key, stamp):
+        entry = self._entries.get(key)
+        return (stamp < self._floor or (entry is not None and entry[2] > stamp)
+                or self._dropped.get(key, 0) > stamp)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._stamp += 1
+            self._entries.clear()
+            self._dropped.clear()
+            self._floor = self._stamp
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+availability_cache = AvailabilityCache(
+    max_entries=Config.AVAILABILITY_CACHE_SIZE,
+    ttl_seconds=Config.AVAILABILITY_CACHE_TTL
+)
+
+
+def get_booked_count(time_slot):
+    """Booked table count for a slot, served from the cache when possible."""
+    key = slot_id(time_slot)
+    count = availability_cache.get(key)
+    if count is None:
+        stamp = availability_cache.begin_read()
+        count = booked_count(time_slot)
+        availability_cache.fill(key, count, stamp)
+    return count
+
+
+def warm_availability_cache(days=None):
+    """Load counts for every business-hours slot in the next `days` days."""
+    days = Config.AVAILABILITY_CACHE_WARM_DAYS if days is None else days
+    slots = list(business_slots(restaurant_now().date(), days))
+    if not slots:
+        return 0
+
+    stamp = availability_cache.begin_read()
+    counts = booked_counts_between(slots[0], slots[-1])
+    for slot in slots:
+        key = slot_id(slot)
+        availability_cache.fill(key, counts.get(key, 0), stamp)
+    return len(slots)
@@ -0,0 +1,594 @@
+"""
+Table allocation for Café Fausse reservations.
+
+Every time slot has a row in slot_inventory, keyed by its integer slot id
+(slots.slot_id), holding the number of booked tables and a bitmask of which
+tables are taken. A booking locks only the rows of the slots its stay
+covers (SELECT ... FOR UPDATE), picks the smallest table that seats the
+party and is free in all of them (seating.floor_plan), and inserts the
+reservation and updates the counters in a single statement. Concurrent
+bookings for overlapping slots queue on the shared rows; other slots are
+unaffected.
+
+A party keeps its table for slots.dining_minutes(party_size), so a 90-minute
+stay booked at 7:00 sets the table's bit in the 7:00, 7:30 and 8:00 rows.
+The inventory is the interval index: whether a stay overlaps any other is
+the OR of the masks of the slots it covers - at most a handful of rows -
+however many bookings the evening has. Inventory rows are seeded from the
+reservations that cover them, looking back at most slots.MAX_DINING_SLOTS.
+
+A party too large for any one table is seated at adjacent tables pushed
+together. Each table gets its own reservations row, so the per-table unique
+constraint and the inventory bits work unchanged; the rows after the first
+point at the lead (lowest-numbered) table's reservation through
+combined_with, and the lead's id is the reservation id the guest gets.
+
+The unique (slot_id, table_number) constraint on reservations and the
+overlap exclusion constraint on its partitions stay as a backstop: if the
+inventory ever disagrees with the reservations table, the conflicting
+tables are marked as taken and others are picked.
+"""
+
+from collections import Counter, namedtuple
+from datetime import datetime
+
+from sqlalchemy import bindparam, select, text
+from sqlalchemy.exc import DatabaseError
+
+from config import Config
+from models import SlotInventory, db, execute_core
+from retry import TABLE_TAKEN_SQLSTATES, sqlstate
+from seating import floor_plan
+from slots import (
+    MAX_DINING_SLOTS, SLOT_MINUTES, dining_minutes, dining_slots, first_slot_id_from, slot_from_id, slot_id
+)
+
+TOTAL_TABLES = Config.TOTAL_TABLES
+
+# How many times a booking retries after hitting an already-taken table
+MAX_ALLOCATION_ATTEMPTS = 5
+
+inventory = SlotInventory.__table__
+
+# Inventory reads on the booking and availability paths are Core statements
+# that fetch only the columns they use (see models.execute_core)
+LOCK_INVENTORY = (
+    select(inventory.c.slot_id, inventory.c.booked_count, inventory.c.table_mask)
+    .where(inventory.c.slot_id.between(bindparam('first'), bindparam('last')))
+    .order_by(inventory.c.slot_id)
+    .with_for_update()
+)
+
+READ_INVENTORY = select(inventory.c.booked_count).where(inventory.c.slot_id == bindparam('slot_id'))
+
+READ_INVENTORY_RANGE = (
+    select(inventory.c.slot_id, inventory.c.booked_count)
+    .where(inventory.c.slot_id.between(bindparam('first'), bindparam('last')))
+    .where(inventory.c.booked_count > 0)
+    .order_by(inventory.c.slot_id)
+)
+
+READ_MASK_RANGE = (
+    select(inventory.c.slot_id, inventory.c.table_mask)
+    .where(inventory.c.slot_id.between(bindparam('first'), bindparam('last')))
+    .where(inventory.c.booked_count > 0)
+    .order_by(inventory.c.slot_id)
+)
+
+# Reservation r's stay covers slot s. The first condition bounds the
+# lookback so only the rows just before s are read.
+COVERS_SLOT = (
+    f"r.slot_id BETWEEN s.slot_id - {MAX_DINING_SLOTS - 1} AND s.slot_id "
+    f"AND r.slot_id + CEIL(r.duration_minutes / {SLOT_MINUTES}.0) > s.slot_id"
+)
+
+# Create any missing inventory rows, seeded from the reservations that cover
+# them. The constant slot id range lets the planner prune partitions.
+CREATE_INVENTORIES_SQL = text(f"""
+    INSERT INTO slot_inventory (slot_id, time_slot, booked_count, table_mask)
+    SELECT s.slot_id, s.time_slot, COUNT(r.id), COALESCE(BIT_OR(1::bigint << (r.table_number - 1)), 0)
+    FROM unnest(CAST(:slot_ids AS integer[]), CAST(:time_slots AS timestamp[])) AS s(slot_id, time_slot)
+    LEFT JOIN reservations r
+        ON {COVERS_SLOT}
+        AND r.slot_id BETWEEN :first_start AND :last_start
+    GROUP BY s.slot_id, s.time_slot
+    ON CONFLICT (slot_id) DO NOTHING
+""")
+
+# Backfill inventory rows for every slot covered only by legacy reservations
+BACKFILL_INVENTORY_SQL = text(f"""
+    INSERT INTO slot_inventory (slot_id, time_slot, booked_count, table_mask)
+    SELECT r.slot_id + c.step,
+           MIN(r.time_slot + c.step * INTERVAL '{SLOT_MINUTES} minutes'),
+           COUNT(*),
+           BIT_OR(1::bigint << (r.table_number - 1))
+    FROM reservations r
+    CROSS JOIN LATERAL generate_series(
+        0, CAST(CEIL(r.duration_minutes / {SLOT_MINUTES}.0) AS integer) - 1
+    ) AS c(step)
+    GROUP BY r.slot_id + c.step
+    ON CONFLICT (slot_id) DO NOTHING
+""")
+
+BOOK_TABLE_SQL = text("""
+    WITH booked AS (
+        INSERT INTO reservations (customer_id, time_slot, slot_id, table_number, party_size, duration_minutes, created_at)
+        VALUES (:customer_id, :time_slot, :slot_id, :table_number, :party_size, :duration_minutes, :created_at)
+        RETURNING id
+    )
+    UPDATE slot_inventory
+    SET booked_count = booked_count + 1,
+        table_mask = table_mask | (1::bigint << (:table_number - 1))
+    FROM booked
+    WHERE slot_inventory.slot_id BETWEEN :slot_id AND :last_slot_id
+    RETURNING booked.id, slot_inventory.slot_id, slot_inventory.booked_count
+""")
+
+# The lead table's row and the rows of the tables pushed against it, in one statement
+BOOK_COMBINED_TABLES_SQL = text("""
+    WITH booked AS (
+        INSERT INTO reservations (customer_id, time_slot, slot_id, table_number, party_size, duration_minutes, created_at)
+        VALUES (:customer_id, :time_slot, :slot_id, :table_number, :party_size, :duration_minutes, :created_at)
+        RETURNING id
+    ), combined AS (
+        INSERT INTO reservations (
+            customer_id, time_slot, slot_id, table_number, party_size, duration_minutes, combined_with, created_at
+        )
+        SELECT :customer_id, :time_slot, :slot_id, t.table_number, :party_size, :duration_minutes, booked.id, :created_at
+        FROM booked, unnest(CAST(:extra_tables AS integer[])) AS t(table_number)
+        RETURNING id
+    )
+    UPDATE slot_inventory
+    SET booked_count = booked_count + :tables_booked,
+        table_mask = table_mask | CAST(:combined_mask AS bigint)
+    FROM booked
+    WHERE slot_inventory.slot_id BETWEEN :slot_id AND :last_slot_id
+    RETURNING booked.id, slot_inventory.slot_id, slot_inventory.booked_count
+""")
+
+# In each slot from :slot_id to :last_slot_id, mark the tables among
+# :table_numbers that a reservation already covers but the mask missed
+MARK_TABLES_TAKEN_SQL = text(f"""
+    WITH taken AS (
+        SELECT s.slot_id, COUNT(DISTINCT r.table_number) AS tables,
+               BIT_OR(1::bigint << (r.table_number - 1)) AS mask
+        FROM slot_inventory s
+        JOIN reservations r
+            ON {COVERS_SLOT}
+            AND r.slot_id BETWEEN :slot_id - {MAX_DINING_SLOTS - 1} AND :last_slot_id
+            AND r.table_number = ANY(CAST(:table_numbers AS integer[]))
+        WHERE s.slot_id BETWEEN :slot_id AND :last_slot_id
+          AND s.table_mask & (1::bigint << (r.table_number - 1)) = 0
+        GROUP BY s.slot_id
+    )
+    UPDATE slot_inventory
+    SET booked_count = booked_count + taken.tables,
+        table_mask = table_mask | taken.mask
+    FROM taken
+    WHERE slot_inventory.slot_id = taken.slot_id
+""")
+
+# Batch bookings lock every slot they cover in a fixed (slot_id) order, the
+# same order single bookings use, so overlapping bookings cannot deadlock
+LOCK_INVENTORIES_SQL = text("""
+    SELECT slot_id, booked_count, table_mask
+    FROM slot_inventory
+    WHERE slot_id = ANY(CAST(:slot_ids AS integer[]))
+    ORDER BY slot_id
+    FOR UPDATE
+""")
+
+BOOK_TABLES_SQL = text("""
+    INSERT INTO reservations (customer_id, time_slot, slot_id, table_number, party_size, duration_minutes, created_at)
+    SELECT b.customer_id, b.time_slot, b.slot_id, b.table_number, b.party_size, b.duration_minutes, :created_at
+    FROM unnest(
+        CAST(:customer_ids AS integer[]),
+        CAST(:time_slots AS timestamp[]),
+        CAST(:slot_ids AS integer[]),
+        CAST(:table_numbers AS integer[]),
+        CAST(:party_sizes AS integer[]),
+        CAST(:durations AS integer[])
+    ) AS b(customer_id, time_slot, slot_id, table_number, party_size, duration_minutes)
+    RETURNING id, slot_id, table_number
+""")
+
+# Point the extra rows of batch-booked combinations at their lead reservation
+LINK_COMBINED_SQL = text("""
+    UPDATE reservations r
+    SET combined_with = l.lead_id
+    FROM unnest(CAST(:ids AS integer[]), CAST(:slot_ids AS integer[]), CAST(:lead_ids AS integer[]))
+        AS l(id, slot_id, lead_id)
+    WHERE r.id = l.id AND r.slot_id = l.slot_id AND r.slot_id = ANY(CAST(:slot_ids AS integer[]))
+""")
+
+UPDATE_INVENTORIES_SQL = text("""
+    UPDATE slot_inventory
+    SET booked_count = slot_inventory.booked_count + u.tables_booked,
+        table_mask = slot_inventory.table_mask | u.table_mask
+    FROM unnest(CAST(:slot_ids AS integer[]), CAST(:counts AS integer[]), CAST(:masks AS bigint[]))
+        AS u(slot_id, tables_booked, table_mask)
+    WHERE slot_inventory.slot_id = u.slot_id
+    RETURNING slot_inventory.slot_id, slot_inventory.booked_count
+""")
+
+# Table holds occupy inventory bits just like a booking of the same length,
+# so every availability read already accounts for them
+HOLD_TABLE_SQL = text("""
+    WITH held AS (
+        INSERT INTO table_holds (token, time_slot, slot_id, table_number, duration_minutes, expires_at, client, created_at)
+        VALUES (:token, :time_slot, :slot_id, :table_number, :duration_minutes, :expires_at, :client, :created_at)
+        RETURNING token
+    )
+    UPDATE slot_inventory
+    SET booked_count = booked_count + 1,
+        table_mask = table_mask | (1::bigint << (:table_number - 1))
+    FROM held
+    WHERE slot_inventory.slot_id BETWEEN :slot_id AND :last_slot_id
+    RETURNING slot_inventory.slot_id, slot_inventory.booked_count
+""")
+
+# Book a table whose inventory bits are already set (e.g. by a hold)
+BOOK_CLAIMED_TABLE_SQL = text("""
+    INSERT INTO reservations (customer_id, time_slot, slot_id, table_number, party_size, duration_minutes, created_at)
+    VALUES (:customer_id, :time_slot, :slot_id, :table_number, :party_size, :duration_minutes, :created_at)
+    RETURNING id
+""")
+
+# Each slot's count drops by the released tables it actually had marked taken
+RELEASE_TABLES_SQL = text("""
+    UPDATE slot_inventory
+    SET booked_count = booked_count - (
+            SELECT COUNT(*) FROM unnest(CAST(:table_numbers AS integer[])) AS t(table_number)
+            WHERE slot_inventory.table_mask & (1::bigint << (t.table_number - 1)) <> 0
+        ),
+        table_mask = table_mask & ~CAST(:mask AS bigint)
+    WHERE slot_id BETWEEN :slot_id AND :last_slot_id
+      AND table_mask & CAST(:mask AS bigint) <> 0
+    RETURNING slot_id, booked_count
+""")
+
+
+# Result of a successful booking: reservation_id and table_number are the
+# lead table's, table_numbers every table the party sits at, booked_counts
+# the new {slot_id: booked count} of every slot whose count it changed
+Allocation = namedtuple(
+    'Allocation', ['reservation_id', 'table_number', 'table_numbers', 'duration_minutes', 'booked_counts']
+)
+
+
+class SlotFullError(Exception):
+    """Raised when no table that seats the party is free for its whole stay."""
+
+
+class TableAllocationError(Exception):
+    """Raised when a table could not be claimed after repeated conflicts."""
+
+
+def table_bit(table_number):
+    """Bit in slot_inventory.table_mask that represents a table."""
+    return 1 << (table_number - 1)
+
+
+def tables_mask(table_numbers):
+    """Inventory bits of a set of tables."""
+    mask = 0
+    for table_number in table_numbers:
+        mask |= table_bit(table_number)
+    return mask
+
+
+def free_tables(table_mask):
+    """Table numbers that are not set in the mask."""
+    return [t for t in range(1, TOTAL_TABLES + 1) if not table_mask & table_bit(t)]
+
+
+def stay_slot_ids(time_slot, duration_minutes):
+    """Ids of the slots a stay starting at time_slot covers."""
+    first = slot_id(time_slot)
+    return range(first, first + dining_slots(duration_minutes))
+
+
+def create_inventories(slot_ids):
+    """Create the inventory rows that do not exist yet for the given slot ids."""
+    slot_ids = sorted(set(slot_ids))
+    db.session.execute(CREATE_INVENTORIES_SQL, {
+        'slot_ids': slot_ids,
+        'time_slots': [slot_from_id(value) for value in slot_ids],
+        'first_start': slot_ids[0] - (MAX_DINING_SLOTS - 1),
+        'last_start': slot_ids[-1],
+    })
+
+
+def lock_slot_inventory(time_slot, duration_minutes=SLOT_MINUTES):
+    """
+    Lock the inventory rows of every slot a stay covers for the rest of the
+    transaction, creating them on first use. Returns (booked_count of the
+    first slot, mask of the tables taken in any of them).
+    """
+    slot_ids = stay_slot_ids(time_slot, duration_minutes)
+    params = {'first': slot_ids[0], 'last': slot_ids[-1]}
+    rows = execute_core(LOCK_INVENTORY, params).all()
+    if len(rows) < len(slot_ids):
+        create_inventories(slot_ids)
+        rows = execute_core(LOCK_INVENTORY, params).all()
+    taken = 0
+    for row in rows:
+        taken |= row.table_mask
+    return rows[0].booked_count, taken
+
+
+def lock_inventories(slot_ids):
+    """
+    Lock the inventory rows of any set of slots, creating them on first use,
+    and return their taken-table masks as {slot_id: mask}.
+    """
+    slot_ids = sorted(set(slot_ids))
+    create_inventories(slot_ids)
+    return {
+        row.slot_id: row.table_mask
+        for row in db.session.execute(LOCK_INVENTORIES_SQL, {'slot_ids': slot_ids})
+    }
+
+
+def booked_count(time_slot):
+    """Number of tables booked for a slot, read from its single inventory row."""
+    count = execute_core(READ_INVENTORY, {'slot_id': slot_id(time_slot)}).scalar()
+    return count or 0
+
+
+def booked_counts_between(start, end):
+    """
+    Booked table counts for every slot in [start, end] that has bookings,
+    as a {slot_id: count} dict read in one range scan of slot_inventory.
+    """
+    rows = execute_core(READ_INVENTORY_RANGE, {'first': first_slot_id_from(start), 'last': slot_id(end)})
+    return {row.slot_id: row.booked_count for row in rows}
+
+
+def table_mask_for(time_slot, duration_minutes=SLOT_MINUTES):
+    """Mask of the tables taken at any point of a stay starting at time_slot."""
+    slot_ids = stay_slot_ids(time_slot, duration_minutes)
+    taken = 0
+    for row in execute_core(READ_MASK_RANGE, {'first': slot_ids[0], 'last': slot_ids[-1]}):
+        taken |= row.table_mask
+    return taken
+
+
+def table_masks_between(start, end):
+    """Taken-table masks for every slot in [start, end] that has bookings, as {slot_id: mask}."""
+    rows = execute_core(READ_MASK_RANGE, {'first': first_slot_id_from(start), 'last': slot_id(end)})
+    return {row.slot_id: row.table_mask for row in rows}
+
+
+def stay_mask(masks, first, slots):
+    """OR of the masks ({slot_id: mask}) of `slots` slots starting at slot id first."""
+    taken = 0
+    for value in range(first, first + slots):
+        taken |= masks.get(value, 0)
+    return taken
+
+
+def backfill_slot_inventory():
+    """Create inventory rows for slots booked before slot_inventory existed."""
+    db.session.execute(BACKFILL_INVENTORY_SQL)
+    db.session.commit()
+
+
+def allocate_table(customer_id, time_slot, party_size=2, duration_minutes=None):
+    """
+    Book the smallest table that seats the party and is free for its whole
+    stay, or else the smallest set of adjacent such tables, and return an
+    Allocation. The stay defaults to slots.dining_minutes(party_size).
+
+    Each insert runs inside a savepoint so a constraint conflict only undoes
+    that attempt, not the inventory locks or the caller's other work.
+    """
+    duration_minutes = duration_minutes or dining_minutes(party_size)
+    _, table_mask = lock_slot_inventory(time_slot, duration_minutes)
+    slot_ids = stay_slot_ids(time_slot, duration_minutes)
+
+    params = {
+        'customer_id': customer_id,
+        'time_slot': time_slot,
+        'slot_id': slot_ids[0],
+        'last_slot_id': slot_ids[-1],
+        'party_size': party_size,
+        'duration_minutes': duration_minutes,
+        'created_at': datetime.utcnow(),
+    }
+
+    for _ in range(MAX_ALLOCATION_ATTEMPTS):
+        tables = floor_plan.seat(table_mask, party_size)
+        if tables is None:
+            raise SlotFullError(time_slot)
+        params['table_number'] = tables[0]
+
+        try:
+            with db.session.begin_nested():
+                if len(tables) == 1:
+                    rows = db.session.execute(BOOK_TABLE_SQL, params).all()
+                else:
+                    rows = db.session.execute(BOOK_COMBINED_TABLES_SQL, {
+                        **params,
+                        'extra_tables': list(tables[1:]),
+                        'tables_booked': len(tables),
+                        'combined_mask': tables_mask(tables),
+                    }).all()
+        except DatabaseError as e:
+            if sqlstate(e) not in TABLE_TAKEN_SQLSTATES:
+                raise
+            # The inventory missed an existing booking - record it and pick again
+            db.session.execute(MARK_TABLES_TAKEN_SQL, {
+                'slot_id': params['slot_id'],
+                'last_slot_id': params['last_slot_id'],
+                'table_numbers': list(tables),
+            })
+            _, table_mask = lock_slot_inventory(time_slot, duration_minutes)
+            continue
+
+        return Allocation(
+            rows[0].id, tables[0], tables, duration_minutes, {row.slot_id: row.booked_count for row in rows}
+        )
+
+    raise TableAllocationError(time_slot)
+
+
+def hold_table(token, time_slot, expires_at, party_size=2, client=None):
+    """
+    Take the smallest table that seats the party out of the inventory of
+    every slot its stay covers, for a hold, and return (table_number,
+    duration_minutes, {slot_id: booked count}). The caller commits. Holds
+    are for single tables; a party that needs tables pushed together is
+    seated when it books.
+    """
+    duration_minutes = dining_minutes(party_size)
+    _, table_mask = lock_slot_inventory(time_slot, duration_minutes)
+    table_number = floor_plan.best_fit(table_mask, party_size)
+    if table_number is None:
+        raise SlotFullError(time_slot)
+
+    slot_ids = stay_slot_ids(time_slot, duration_minutes)
+    rows = db.session.execute(HOLD_TABLE_SQL, {
+        'token': token,
+        'time_slot': time_slot,
+        'slot_id': slot_ids[0],
+        'last_slot_id': slot_ids[-1],
+        'table_number': table_number,
+        'duration_minutes': duration_minutes,
+        'expires_at': expires_at,
+        'client': client,
+        'created_at': datetime.utcnow(),
+    }).all()
+    return table_number, duration_minutes, {row.slot_id: row.booked_count for row in rows}
+
+
+def book_claimed_table(customer_id, time_slot, table_number, party_size, duration_minutes):
+    """Insert a reservation for a table already marked taken for the whole stay."""
+    reservation_id = db.session.execute(BOOK_CLAIMED_TABLE_SQL, {
+        'customer_id': customer_id,
+        'time_slot': time_slot,
+        'slot_id': slot_id(time_slot),
+        'table_number': table_number,
+        'party_size': party_size,
+        'duration_minutes': duration_minutes,
+        'created_at': datetime.utcnow(),
+    }).scalar_one()
+    return Allocation(reservation_id, table_number, (table_number,), duration_minutes, {})
+
+
+def release_table(time_slot, table_number, duration_minutes=SLOT_MINUTES):
+    """
+    Give a table back to the inventory of every slot a stay covers and
+    return their new {slot_id: booked count}, leaving out slots where the
+    table was not marked taken. The caller commits.
+    """
+    return release_tables(time_slot, (table_number,), duration_minutes)
+
+
+def release_tables(time_slot, table_numbers, duration_minutes=SLOT_MINUTES):
+    """release_table for every table of a party, in one statement."""
+    slot_ids = stay_slot_ids(time_slot, duration_minutes)
+    rows = db.session.execute(RELEASE_TABLES_SQL, {
+        'slot_id': slot_ids[0],
+        'last_slot_id': slot_ids[-1],
+        'table_numbers': list(table_numbers),
+        'mask': tables_mask(table_numbers),
+    })
+    return {row.slot_id: row.booked_count for row in rows}
+
+
+def allocate_tables(customer_id, time_slots, party_sizes):
+    """
+    Seat one party per entry in time_slots (a slot may repeat), of the
+    matching entry of party_sizes, for a single customer and return
+    Allocations in the same order.
+
+    All-or-nothing: if any slot has no table left for its party,
+    SlotFullError is raised for that slot and the caller rolls back.
+    """
+    return allocate_many([customer_id] * len(time_slots), time_slots, party_sizes)
+
+
+def allocate_many(customer_ids, time_slots, party_sizes, all_or_nothing=True):
+    """
+    Book the best-fitting free table, or adjacent tables, for each
+    (customer_id, time_slot, party_size) entry, free for the party's whole
+    stay.
+
+    The whole set is a fixed number of set-based statements regardless of
+    its size. Larger parties are seated first so the small ones do not take
+    the only tables that fit them. With all_or_nothing=False, an entry
+    whose slot has no table left for its party gets a SlotFullError in its
+    place in the result instead of failing the rest.
+    """
+    durations = [dining_minutes(party_size) for party_size in party_sizes]
+    stays = [stay_slot_ids(slot, minutes) for slot, minutes in zip(time_slots, durations)]
+    masks = lock_inventories({value for stay in stays for value in stay})
+
+    # Pick the tables in memory against the locked masks of each stay's slots
+    chosen = [None] * len(time_slots)
+    new_masks = {}
+    tables_per_slot = Counter()
+    for i in sorted(range(len(time_slots)), key=lambda i: -party_sizes[i]):
+        stay = stays[i]
+        tables = floor_plan.seat(stay_mask(masks, stay[0], len(stay)), party_sizes[i])
+        if tables is None:
+            if all_or_nothing:
+                raise SlotFullError(time_slots[i])
+            continue
+        for value in stay:
+            masks[value] |= tables_mask(tables)
+            new_masks[value] = new_masks.get(value, 0) | tables_mask(tables)
+            tables_per_slot[value] += len(tables)
+        chosen[i] = tables
+
+    # One row per table; a combination's rows are linked to its lead row below
+    rows = [(i, table_number) for i, tables in enumerate(chosen) if tables for table_number in tables]
+    booked = []
+    booked_counts = {}
+    if rows:
+        try:
+            with db.session.begin_nested():
+                booked = db.session.execute(BOOK_TABLES_SQL, {
+                    'created_at': datetime.utcnow(),
+                    'customer_ids': [customer_ids[i] for i, _ in rows],
+                    'time_slots': [time_slots[i] for i, _ in rows],
+                    'slot_ids': [stays[i][0] for i, _ in rows],
+                    'table_numbers': [table_number for _, table_number in rows],
+                    'party_sizes': [party_sizes[i] for i, _ in rows],
+                    'durations': [durations[i] for i, _ in rows],
+                }).all()
+        except DatabaseError as e:
+            if sqlstate(e) not in TABLE_TAKEN_SQLSTATES:
+                raise
+            # The inventory missed an existing booking; let the client retry
+            raise TableAllocationError(time_slots)
+
+        updated_slots = sorted(tables_per_slot)
+        counts = db.session.execute(UPDATE_INVENTORIES_SQL, {
+            'slot_ids': updated_slots,
+            'counts': [tables_per_slot[value] for value in updated_slots],
+            'masks': [new_masks[value] for value in updated_slots],
+        })
+        booked_counts = {row.slot_id: row.booked_count for row in counts}
+
+    reservation_ids = {(row.slot_id, row.table_number): row.id for row in booked}
+    combined = [
+        (reservation_ids[(stays[i][0], table_number)], stays[i][0], reservation_ids[(stays[i][0], tables[0])])
+        for i, tables in enumerate(chosen) if tables and len(tables) > 1
+        for table_number in tables[1:]
+    ]
+    if combined:
+        ids, combined_slot_ids, lead_ids = zip(*combined)
+        db.session.execute(LINK_COMBINED_SQL, {
+            'ids': list(ids), 'slot_ids': list(combined_slot_ids), 'lead_ids': list(lead_ids),
+        })
+
+    return [
+        SlotFullError(slot) if tables is None
+        else Allocation(
+            reservation_ids[(stay[0], tables[0])], tables[0], tables, minutes,
+            {value: booked_counts[value] for value in stay}
+        )
+        for slot, stay, minutes, tables in zip(time_slots, stays, durations, chosen)
+    ]
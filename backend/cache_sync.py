@@ -0,0 +1,210 @@
+"""
+Cross-process invalidation of the availability cache.
+
+Every worker keeps its own AvailabilityCache, so a booking committed by one
+worker leaves stale counts in the others. The booking transaction issues a
+NOTIFY on the reservation_changed channel, which PostgreSQL delivers only
+once the transaction commits. A background thread in each worker LISTENs on
+that channel and evicts the affected slot, so every process and node sharing
+the database stays coherent without a separate cache server. The same
+notification evicts the slot from the in-memory waitlist queue, since a
+change to a slot's bookings in another worker may have seated or added
+waiting parties.
+"""
+
+import logging
+import threading
+import uuid
+from collections import Counter, namedtuple
+
+from sqlalchemy import text
+
+from availability_cache import availability_cache
+from booking import Allocation
+from config import Config
+from models import db
+from shared_counters import record_booking, write_sequence
+from slots import slot_from_id, slot_id
+from waitlist_queue import waitlist_queue
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'reservation_changed'
+
+# Identifies this process in payloads so it can skip its own notifications
+PROCESS_TOKEN = uuid.uuid4().hex[:12]
+
+# Payload slot value meaning "drop every cached slot"
+ALL_SLOTS = '*'
+
+NOTIFY_SQL = text("SELECT pg_notify(:channel, :payload)")
+
+# Where a transaction's slot counts fall in the order of writes: a stamp of
+# this process's availability cache and a value of slot_write_seq (None when
+# the shared counters are off)
+WriteStamp = namedtuple('WriteStamp', ['cache', 'sequence'])
+
+
+def notify_slot_changed(time_slot):
+    """Queue a notification for the slot; it is sent when the transaction commits."""
+    slot_key = ALL_SLOTS if time_slot is None else slot_id(time_slot)
+    db.session.execute(NOTIFY_SQL, {'channel': CHANNEL, 'payload': f'{PROCESS_TOKEN}|{slot_key}'})
+
+
+def notify_slots_changed(time_slots):
+    """
+    Queue one notification per distinct slot. Call it after the slots'
+    inventory rows are updated and before the commit; it returns the
+    WriteStamp to pass to publish_slot_changes once the transaction has
+    committed. Taken while the row locks are held, the stamp orders this
+    transaction's counts after every earlier commit to the same slots, in
+    this process's cache and in the shared counters.
+    """
+    for time_slot in sorted(set(time_slots)):
+        notify_slot_changed(time_slot)
+    return WriteStamp(availability_cache.begin_read(), write_sequence())
+
+
+def notify_allocations(allocations):
+    """
+    Queue one notification per slot whose count the allocations changed,
+    which includes every slot a stay covers, not just the one it starts in.
+    Returns the stamp to pass to publish_allocations, as notify_slots_changed.
+    """
+    return notify_slots_changed(
+        slot_from_id(value)
+        for allocation in allocations if isinstance(allocation, Allocation)
+        for value in allocation.booked_counts
+    )
+
+
+def publish_allocations(allocations, stamp):
+    """
+    After a booking commits, write the new count of every slot it changed
+    through to this process's cache and the host's shared counters. Entries
+    that are not an Allocation (a failed item in a group commit) are skipped.
+    stamp is what notify_allocations returned before the commit.
+    """
+    tables_booked = Counter()
+    new_counts = {}
+    for allocation in allocations:
+        if isinstance(allocation, Allocation):
+            for value, count in allocation.booked_counts.items():
+                tables_booked[value] += len(allocation.table_numbers)
+                new_counts[value] = count
+
+    for value, count in new_counts.items():
+        availability_cache.write_through(value, count, stamp.cache)
+        record_booking(slot_from_id(value), count, stamp.sequence, tables_booked=tables_booked[value])
+
+
+def publish_slot_counts(counts, tables_changed, stamp):
+    """
+    Publish new {slot_id: count} values after a commit that took (positive
+    tables_changed) or gave back (negative) tables outside a booking, such as
+    placing or releasing a hold. stamp is what notify_slots_changed returned
+    before the commit.
+    """
+    publish_slot_changes(counts, {value: tables_changed for value in counts}, stamp)
+
+
+def publish_slot_changes(counts, tables_changed, stamp):
+    """
+    publish_slot_counts with a {slot_id: tables taken or given back} change
+    per slot, for a transaction such as moving a reservation that gave
+    tables back in some slots and took them in others.
+    """
+    for value, count in counts.items():
+        availability_cache.write_through(value, count, stamp.cache)
+        record_booking(slot_from_id(value), count, stamp.sequence, tables_booked=tables_changed.get(value, 0))
+
+
+def handle_notification(payload):
+    """Evict the slot named in a notification payload from the local cache."""
+    origin, _, slot_key = payload.partition('|')
+    if origin == PROCESS_TOKEN:
+        return  # This process already wrote the new count through
+    if slot_key == ALL_SLOTS:
+        availability_cache.clear()
+        waitlist_queue.clear()
+    else:
+        availability_cache.invalidate(int(slot_key))
+        waitlist_queue.invalidate(int(slot_key))
+
+
+class InvalidationListener(threading.Thread):
+    """Daemon thread that LISTENs for reservation changes and evicts cache entries."""
+
+    def __init__(self, engine, poll_interval):
+        super().__init__(name='cache-invalidation-listener', daemon=True)
+        self.engine = engine
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+        self._connected_before = False
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self._listen()
+            except Exception as e:
+                logger.warning('Cache invalidation listener lost its connection: %s', e)
+            self._stop_event.wait(self.poll_interval)
+
+    def _listen(self):
+        pooled = self.engine.raw_connection()
+        conn = pooled.driver_connection  # Detaching clears it on the pooled proxy
+        pooled.detach()  # Keep this connection out of the request pool
+        try:
+            conn.autocommit = True
+            cursor = conn.cursor()
+            cursor.execute(f'LISTEN {CHANNEL}')
+            logger.info('Listening for cache invalidations on %s', CHANNEL)
+            if self._connected_before:
+                # Notifications may have been missed while disconnected
+                availability_cache.clear()
+                waitlist_queue.clear()
+            self._connected_before = True
+
+            while not self._stop_event.is_set():
+                for payload in self._drain(conn, cursor):
+                    handle_notification(payload)
+                self._stop_event.wait(self.poll_interval)
+        finally:
+            pooled.close()
+
+    @staticmethod
+    def _drain(conn, cursor):
+        """Collect pending notification payloads from a pg8000 or psycopg2 connection."""
+        if hasattr(conn, 'notifies'):
+            # psycopg2 reads notifications off the socket on poll()
+            conn.poll()
+            payloads = [n.payload for n in conn.notifies]
+            conn.notifies.clear()
+            return payloads
+
+        # pg8000 only reads notifications while processing a query response
+        cursor.execute('SELECT 1')
+        cursor.fetchall()
+        notifications = conn.notifications
+        if len(notifications) == notifications.maxlen:
+            # The buffer overflowed, so some slots were dropped - evict everything
+            notifications.clear()
+            return [f'|{ALL_SLOTS}']
+        payloads = [payload for _, _, payload in notifications]
+        notifications.clear()
+        return payloads
+
+
+_listener = None
+
+
+def start_invalidation_listener():
+    """Start the listener thread for this process (once)."""
+    global _listener
+    if _listener is None and Config.CACHE_INVALIDATION_ENABLED:
+        _listener = InvalidationListener(db.engine, Config.CACHE_INVALIDATION_POLL_INTERVAL)
+        _listener.start()
+    return _listener
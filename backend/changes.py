@@ -0,0 +1,207 @@
+"""
+Cancelling and changing reservations.
+
+DELETE /api/reservations/<id> cancels a booking and PATCH moves it to
+another slot or party size, each as one transaction. A reservation is found
+by its id (the lead table's row, see booking.py) and the guest's email.
+
+Giving the party's tables back touches only the inventory rows of the slots
+its stay covers: one UPDATE clears the tables' bits and lowers the counts,
+however many bookings the evening has. Nothing is rebuilt. After the commit
+the new counts are written through to this process's availability cache and
+the host's shared counters, and a NOTIFY tells the other workers to evict
+those slots, exactly as for a booking, so the tables can be booked again at
+once.
+
+A change keeps the reservation id. The inventory rows of the old and the
+new stay are locked together in slot_id order, the order bookings use, so a
+change cannot deadlock with them. The party's own tables are taken out of
+the locked masks and it is seated again, for its new time and size, against
+what is left. If nothing fits, the transaction rolls back and the original
+booking stands.
+
+Tables given back by either one go to parties on the waitlist for those
+slots in the same transaction (see waitlist.py), so the rows locked up
+front also cover the slots promotion may book.
+"""
+
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.exc import DatabaseError
+
+from booking import (
+    UPDATE_INVENTORIES_SQL, Allocation, SlotFullError, TableAllocationError,
+    lock_inventories, release_tables, stay_mask, stay_slot_ids, tables_mask
+)
+from cache_sync import notify_slots_changed, publish_slot_changes
+from models import db
+from retry import TABLE_TAKEN_SQLSTATES, run_in_transaction, sqlstate
+from seating import floor_plan
+from slots import dining_minutes, restaurant_now, slot_from_id, slot_id
+from waitlist import finish_promotions, promote_waiting, promotion_window
+
+# The lead row, locked, with every table the party sits at
+FIND_RESERVATION_SQL = text("""
+    SELECT r.id, r.customer_id, r.time_slot, r.slot_id, r.party_size, r.duration_minutes,
+           ARRAY(
+               SELECT t.table_number FROM reservations t
+               WHERE t.slot_id = r.slot_id AND (t.id = r.id OR t.combined_with = r.id)
+               ORDER BY t.table_number
+           ) AS table_numbers
+    FROM reservations r
+    JOIN customers c ON c.id = r.customer_id
+    WHERE r.id = :reservation_id AND r.combined_with IS NULL AND lower(c.email) = lower(:email)
+    FOR UPDATE OF r
+""")
+
+CANCEL_RESERVATION_SQL = text("""
+    DELETE FROM reservations
+    WHERE slot_id = :slot_id AND (id = :reservation_id OR combined_with = :reservation_id)
+""")
+
+REMOVE_COMBINED_SQL = text("""
+    DELETE FROM reservations
+    WHERE slot_id = :old_slot_id AND combined_with = :reservation_id
+""")
+
+# Changing slot_id moves the row to the new slot's partition
+MOVE_RESERVATION_SQL = text("""
+    UPDATE reservations
+    SET time_slot = :time_slot, slot_id = :slot_id, table_number = :table_number,
+        party_size = :party_size, duration_minutes = :duration_minutes
+    WHERE id = :reservation_id AND slot_id = :old_slot_id
+""")
+
+ADD_COMBINED_SQL = text("""
+    INSERT INTO reservations (
+        customer_id, time_slot, slot_id, table_number, party_size, duration_minutes, combined_with, created_at
+    )
+    SELECT :customer_id, :time_slot, :slot_id, t.table_number, :party_size, :duration_minutes,
+           :reservation_id, :created_at
+    FROM unnest(CAST(:extra_tables AS integer[])) AS t(table_number)
+""")
+
+
+class ReservationNotFoundError(Exception):
+    """Raised when no reservation has this id and email (or it was already cancelled)."""
+
+
+class ReservationStartedError(Exception):
+    """Raised when the reservation's time has already come, so it can no longer be changed."""
+
+
+def find_reservation(reservation_id, email):
+    """Lock a reservation the guest may still change and return its row."""
+    reservation = db.session.execute(FIND_RESERVATION_SQL, {
+        'reservation_id': reservation_id,
+        'email': email,
+    }).first()
+    if reservation is None:
+        raise ReservationNotFoundError(reservation_id)
+    if reservation.time_slot <= restaurant_now():
+        raise ReservationStartedError(reservation_id)
+    return reservation
+
+
+def cancel_reservation(reservation_id, email):
+    """
+    Delete a reservation and give its tables back for its whole stay.
+    Returns the cancelled reservation's row.
+    """
+    def transaction():
+        reservation = find_reservation(reservation_id, email)
+        lock_inventories(promotion_window(stay_slot_ids(reservation.time_slot, reservation.duration_minutes)))
+        db.session.execute(CANCEL_RESERVATION_SQL, {
+            'slot_id': reservation.slot_id,
+            'reservation_id': reservation.id,
+        })
+        counts = release_tables(reservation.time_slot, reservation.table_numbers, reservation.duration_minutes)
+        tables_changed = {value: -len(reservation.table_numbers) for value in counts}
+        promotions = promote_waiting(counts, tables_changed)
+        stamp = notify_slots_changed(slot_from_id(value) for value in counts)
+        db.session.commit()
+        return reservation, counts, tables_changed, promotions, stamp
+
+    reservation, counts, tables_changed, promotions, stamp = run_in_transaction(transaction)
+    finish_promotions(promotions)
+    publish_slot_changes(counts, tables_changed, stamp)
+    return reservation
+
+
+def change_reservation(reservation_id, email, time_slot=None, party_size=None):
+    """
+    Move a reservation to time_slot and/or reseat it for party_size (either
+    left as booked when None) and return (Allocation, party_size, time_slot).
+    Raises SlotFullError(time_slot, party_size), and changes nothing, if
+    the party does not fit.
+    """
+    def transaction():
+        reservation = find_reservation(reservation_id, email)
+        new_slot = time_slot or reservation.time_slot
+        new_party = party_size or reservation.party_size
+        duration_minutes = dining_minutes(new_party)
+        old_stay = stay_slot_ids(reservation.time_slot, reservation.duration_minutes)
+        new_stay = stay_slot_ids(new_slot, duration_minutes)
+        masks = lock_inventories([*promotion_window(old_stay), *new_stay])
+
+        # The party's current tables are free to it
+        old_mask = tables_mask(reservation.table_numbers)
+        for value in old_stay:
+            masks[value] &= ~old_mask
+        tables = floor_plan.seat(stay_mask(masks, new_stay[0], len(new_stay)), new_party)
+        if tables is None:
+            raise SlotFullError(new_slot, new_party)
+
+        released = release_tables(reservation.time_slot, reservation.table_numbers, reservation.duration_minutes)
+        params = {
+            'reservation_id': reservation.id,
+            'customer_id': reservation.customer_id,
+            'old_slot_id': reservation.slot_id,
+            'time_slot': new_slot,
+            'slot_id': slot_id(new_slot),
+            'table_number': tables[0],
+            'extra_tables': list(tables[1:]),
+            'party_size': new_party,
+            'duration_minutes': duration_minutes,
+            'created_at': datetime.utcnow(),
+        }
+        try:
+            with db.session.begin_nested():
+                db.session.execute(REMOVE_COMBINED_SQL, params)
+                db.session.execute(MOVE_RESERVATION_SQL, params)
+                if len(tables) > 1:
+                    db.session.execute(ADD_COMBINED_SQL, params)
+        except DatabaseError as e:
+            if sqlstate(e) not in TABLE_TAKEN_SQLSTATES:
+                raise
+            # The inventory missed an existing booking; let the client retry
+            raise TableAllocationError(new_slot)
+
+        rows = db.session.execute(UPDATE_INVENTORIES_SQL, {
+            'slot_ids': list(new_stay),
+            'counts': [len(tables)] * len(new_stay),
+            'masks': [tables_mask(tables)] * len(new_stay),
+        })
+        booked_counts = {row.slot_id: row.booked_count for row in rows}
+
+        tables_changed = Counter()
+        for value in released:
+            tables_changed[value] -= len(reservation.table_numbers)
+        for value in booked_counts:
+            tables_changed[value] += len(tables)
+        # A slot both stays cover ends at its count after the booking
+        counts = {**released, **booked_counts}
+        freed = {value: counts[value] for value in released}
+        promotions = promote_waiting(freed, tables_changed)
+        counts.update(freed)
+        stamp = notify_slots_changed(slot_from_id(value) for value in counts)
+        db.session.commit()
+        allocation = Allocation(reservation.id, tables[0], tables, duration_minutes, booked_counts)
+        return allocation, new_party, new_slot, counts, tables_changed, promotions, stamp
+
+    allocation, new_party, new_slot, counts, tables_changed, promotions, stamp = run_in_transaction(transaction)
+    finish_promotions(promotions)
+    publish_slot_changes(counts, tables_changed, stamp)
+    return allocation, new_party, new_slot
@@ -10,7 +10,92 @@ class Config:
     
     # Restaurant configuration
     TOTAL_TABLES = 30
+    # Floor plan: (first table, last table, seats, zone), covering tables 1..TOTAL_TABLES
+    TABLE_LAYOUT = [
+        (1, 8, 2, 'bar'),
+        (9, 20, 4, 'main'),
+        (21, 26, 4, 'patio'),
+        (27, 28, 6, 'main'),
+        (29, 30, 8, 'private'),
+    ]
+    # Runs of tables that can be pushed together for a large party; each table
+    # is adjacent to the ones next to it in its run
+    TABLE_ADJACENCY = [
+        (1, 2, 3, 4, 5, 6, 7, 8),                                    # along the bar
+        (9, 10, 11, 12, 13, 14),                                     # main room, front row
+        (15, 16, 17, 18, 19, 20),                                    # main room, back row
+        (9, 15), (10, 16), (11, 17), (12, 18), (13, 19), (14, 20),   # front row to back row
+        (21, 22, 23, 24, 25, 26),                                    # patio
+        (27, 28),
+        (29, 30),                                                    # private room
+    ]
+    MAX_COMBINED_TABLES = 3     # Most tables pushed together for one party
+    SEATING_CACHE_SIZE = 4096   # Memoized (free tables, party size) combination searches
+    # How long a party keeps its table from the start of its time slot
+    DINING_MINUTES = int(os.environ.get('DINING_MINUTES', 90))  # Any party size not listed below
+    DINING_MINUTES_BY_PARTY = [(5, 8, 120), (9, 16, 150)]        # (smallest party, largest party, minutes)
     RESERVATION_ADVANCE_DAYS = 30  # How many days in advance reservations can be made
+    MAX_BATCH_RESERVATIONS = 30    # Tables a single group/event booking may request
+    TIMEZONE = os.environ.get('RESTAURANT_TIMEZONE') or 'America/New_York'  # Time slots are stored in local time
+    
+    # Booking write path: 'direct' (one transaction per request),
+    # 'group_commit' (concurrent requests share one transaction per micro-batch) or
+    # 'slot_queue' (one serial worker per time slot, slots run in parallel)
+    BOOKING_MODE = os.environ.get('BOOKING_MODE') or 'direct'
+    BOOKING_TIMEOUT = 10  # Seconds a request waits for a queued booking
+    GROUP_COMMIT_WINDOW_MS = float(os.environ.get('GROUP_COMMIT_WINDOW_MS', 5))
+    GROUP_COMMIT_MAX_BATCH = int(os.environ.get('GROUP_COMMIT_MAX_BATCH', 200))
+    SLOT_WORKER_IDLE_TIMEOUT = 30  # Seconds before an idle slot worker thread exits
+    
+    # Table holds placed while a guest fills in the reservation form
+    HOLD_MINUTES = int(os.environ.get('HOLD_MINUTES', 5))  # Default hold length
+    MAX_HOLD_MINUTES = 15                                   # Longest hold a client may ask for
+    # Active holds one client address may keep. The address is the peer of the
+    # connection unless TRUSTED_PROXIES is set: behind a reverse proxy or load
+    # balancer, set it to the number of proxies in front of the app so the
+    # guest's address is taken from X-Forwarded-For. Otherwise every guest
+    # arrives from the proxy's address and they all share one limit.
+    MAX_HOLDS_PER_CLIENT = int(os.environ.get('MAX_HOLDS_PER_CLIENT', 2))
+    TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 0))
+    
+    # Monthly partitions of the reservations table (see partitions.py)
+    RESERVATION_PARTITION_MONTHS_AHEAD = 2  # Months created beyond the end of the booking window
+    RESERVATION_RETENTION_MONTHS = int(os.environ.get('RESERVATION_RETENTION_MONTHS', 12))  # Older months are detached; 0 keeps all
+    PARTITION_MAINTENANCE_INTERVAL = 6      # Hours between partition maintenance runs
+    
+    # Archival of past reservations to Parquet files (see archive.py)
+    ARCHIVE_ENABLED = os.environ.get('ARCHIVE_ENABLED', 'false').lower() == 'true'
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 90))  # Reservations older than this are archived
+    ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'archive')
+    ARCHIVE_CHUNK_SIZE = 5000   # Rows streamed per fetch and written per file
+    ARCHIVE_DELETE_BATCH = 500  # Rows deleted per transaction
+    ARCHIVE_INTERVAL = 24       # Hours between archiver runs
+    
+    # Booking transactions. Bookings already lock their slot_inventory rows, so
+    # READ COMMITTED is enough; SERIALIZABLE is supported and relies on the retries.
+    BOOKING_ISOLATION_LEVEL = os.environ.get('BOOKING_ISOLATION_LEVEL') or 'READ COMMITTED'
+    TRANSACTION_RETRY_ATTEMPTS = 5        # Tries before a conflicting booking gives up with a 409
+    TRANSACTION_RETRY_BASE_DELAY = 0.01   # Seconds; doubled on every retry
+    TRANSACTION_RETRY_MAX_DELAY = 0.5     # Seconds; cap on a single backoff
+    
+    # Availability cache (per process)
+    AVAILABILITY_CACHE_SIZE = int(os.environ.get('AVAILABILITY_CACHE_SIZE', 2048))  # Max cached time slots
+    AVAILABILITY_CACHE_TTL = int(os.environ.get('AVAILABILITY_CACHE_TTL', 60))      # Seconds before a count is re-read
+    AVAILABILITY_CACHE_WARM_DAYS = 7  # Days of slots loaded at startup
+    
+    # Cross-worker cache invalidation (PostgreSQL LISTEN/NOTIFY)
+    CACHE_INVALIDATION_ENABLED = os.environ.get('CACHE_INVALIDATION_ENABLED', 'true').lower() == 'true'
+    CACHE_INVALIDATION_POLL_INTERVAL = float(os.environ.get('CACHE_INVALIDATION_POLL_INTERVAL', 0.5))  # Seconds
+    
+    # Shared-memory availability counters for single-host, multi-worker deployments
+    SHARED_COUNTERS_ENABLED = os.environ.get('SHARED_COUNTERS_ENABLED', 'false').lower() == 'true'
+    SHARED_COUNTERS_NAME = os.environ.get('SHARED_COUNTERS_NAME') or 'cafe_fausse_counters_v3'
+    SHARED_COUNTERS_REFRESH_INTERVAL = 60  # Seconds between rebuilds of the window from the database
+    
+    # Idempotency-Key handling for POST endpoints
+    IDEMPOTENCY_CACHE_SIZE = 1024      # Stored responses kept in memory per process
+    IDEMPOTENCY_CLAIM_TIMEOUT = 60     # Seconds before an unfinished request's key can be reclaimed
+    IDEMPOTENCY_KEY_TTL_HOURS = 24     # How long stored responses are kept
     
     # Business hours (in 24-hour format)
     BUSINESS_HOURS = {
@@ -22,3 +107,7 @@ class Config:
         'saturday': {'open': 17, 'close': 23},    # 5 PM - 11 PM
         'sunday': {'open': 17, 'close': 21}       # 5 PM - 9 PM
     }
+    
+    # Calendar overrides for the weekly hours, as 'YYYY-MM-DD' dates
+    CLOSED_DATES = [day for day in os.environ.get('CLOSED_DATES', '').split(',') if day]  # Holidays, private events
+    SPECIAL_HOURS = {}  # e.g. {'2025-12-24': {'open': 17, 'close': 20}}
@@ -0,0 +1,44 @@
+"""
+Customer resolution shared by the reservation and newsletter endpoints.
+
+Customers are identified by email. Resolving one is a single
+INSERT ... ON CONFLICT (email) DO UPDATE ... RETURNING statement, so there is
+no separate lookup round trip and two concurrent requests with the same email
+cannot race into a unique-constraint violation.
+"""
+
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import Boolean, false, func, literal_column
+from sqlalchemy.dialects.postgresql import insert
+
+from models import Customer, execute_core
+
+# created is False when the email already belonged to a customer
+ResolvedCustomer = namedtuple('ResolvedCustomer', ['id', 'created'])
+
+# An existing customer keeps their details; the newsletter flag is only ever
+# switched on. xmax is 0 only for a freshly inserted row. The VALUES clause
+# comes from the parameter keys passed in upsert_customer.
+customers = Customer.__table__
+insert_customer = insert(customers)
+UPSERT_CUSTOMER = insert_customer.on_conflict_do_update(
+    index_elements=[customers.c.email],
+    set_={
+        'newsletter_signup':
+            func.coalesce(customers.c.newsletter_signup, false()) | insert_customer.excluded.newsletter_signup
+    },
+).returning(customers.c.id, literal_column('xmax = 0', Boolean).label('created'))
+
+
+def upsert_customer(email, name='', phone='', newsletter_signup=False):
+    """Find or create the customer with this email and return a ResolvedCustomer."""
+    row = execute_core(UPSERT_CUSTOMER, {
+        'name': name,
+        'email': email,
+        'phone': phone,
+        'newsletter_signup': bool(newsletter_signup),
+        'created_at': datetime.utcnow(),
+    }).one()
+    return ResolvedCustomer(row.id, row.created)
@@ -0,0 +1,243 @@
+"""
+Group-commit write path for bursts of reservation requests.
+
+When a popular slot opens, hundreds of bookings arrive within seconds and
+each one normally pays for its own transaction and commit. In group-commit
+mode (Config.BOOKING_MODE = 'group_commit') request threads hand their
+booking to a single committer thread instead. The committer gathers whatever
+arrives within a short window (a few milliseconds), allocates the whole
+batch in memory against each slot's locked free-table mask, and persists it
+in one transaction with one commit. Each waiting request then receives its
+own result - a table, or the reason it could not be seated.
+
+Every item runs in its own savepoint, so one customer row or table that
+fails only fails its own request. If the batch's set-based insert hits a
+booking the inventory missed, it is undone and the items are seated one by
+one instead, each in a savepoint of its own.
+
+A request that stops waiting at its timeout gets BookingPendingError. Its
+booking stays queued and commits with its batch, which stores the
+Idempotency-Key response in the same transaction (or frees the key if the
+booking fails), so a retry with the key gets the real result.
+"""
+
+import concurrent.futures
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+
+from sqlalchemy.exc import DBAPIError
+
+from booking import SlotFullError, TableAllocationError, allocate_many, allocate_table
+from cache_sync import notify_allocations, publish_allocations
+from config import Config
+from customers import upsert_customer
+from idempotency import current_claim, release_claim, store_response
+from models import db
+from retry import RETRYABLE_SQLSTATES, run_in_transaction, sqlstate
+
+logger = logging.getLogger(__name__)
+
+
+class BookingPendingError(Exception):
+    """Raised when a queued booking is not committed in time; its batch still commits it."""
+
+
+class PendingBooking:
+    __slots__ = ('data', 'time_slot', 'response_body', 'claim', 'future')
+
+    def __init__(self, data, time_slot, response_body=None):
+        self.data = data
+        self.time_slot = time_slot
+        self.response_body = response_body  # Allocation -> JSON body of the 201
+        self.claim = current_claim()
+        self.future = Future()
+
+    def wait(self, timeout):
+        """
+        The booking's Allocation, or what allocating it raised. Raises
+        BookingPendingError if it is not committed within timeout seconds.
+        """
+        try:
+            return self.future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            # Once cancelled, the batch stores the response for the key itself
+            if self.future.cancel():
+                raise BookingPendingError(self.time_slot)
+            return self.future.result()
+
+    def resolve(self, result):
+        """Hand the result to the waiting request; False if it stopped waiting."""
+        try:
+            if isinstance(result, Exception):
+                self.future.set_exception(result)
+            else:
+                self.future.set_result(result)
+        except InvalidStateError:
+            return False
+        return True
+
+
+def in_savepoint(work, *args, **kwargs):
+    """
+    Run work(*args, **kwargs) in a savepoint and return its result, or the
+    exception that undid it. Serialization failures and deadlocks still
+    abort the whole transaction so it is retried.
+    """
+    try:
+        with db.session.begin_nested():
+            return work(*args, **kwargs)
+    except DBAPIError as e:
+        if sqlstate(e) in RETRYABLE_SQLSTATES:
+            raise
+        return e
+    except (SlotFullError, TableAllocationError) as e:
+        return e
+
+
+def upsert_pending_customer(pending):
+    return upsert_customer(
+        email=pending.data['email'],
+        name=pending.data['customer_name'],
+        phone=pending.data.get('phone', ''),
+        newsletter_signup=pending.data.get('newsletter_signup', False)
+    ).id
+
+
+def allocate_batch(batch, customer_ids):
+    """
+    Seat every pending booking with a customer id, all in one set-based pass
+    or, if that hits a conflict, one by one. Returns an Allocation or an
+    exception per booking.
+    """
+    items = [i for i, customer_id in enumerate(customer_ids) if not isinstance(customer_id, Exception)]
+    results = list(customer_ids)
+    if not items:
+        return results
+
+    allocations = in_savepoint(
+        allocate_many,
+        [customer_ids[i] for i in items],
+        [batch[i].time_slot for i in items],
+        [batch[i].data['number_of_guests'] for i in items],
+        all_or_nothing=False
+    )
+    if isinstance(allocations, Exception):
+        # A conflict undid the whole insert; this way it only fails its own booking
+        allocations = [
+            in_savepoint(allocate_table, customer_ids[i], batch[i].time_slot, batch[i].data['number_of_guests'])
+            for i in items
+        ]
+    for i, allocation in zip(items, allocations):
+        results[i] = allocation
+    return results
+
+
+def commit_bookings(app, batch):
+    """
+    Allocate and persist a list of PendingBookings in one transaction, then
+    resolve each one's future. Returns False if the transaction failed.
+    """
+    def transaction():
+        customer_ids = [in_savepoint(upsert_pending_customer, pending) for pending in batch]
+        results = allocate_batch(batch, customer_ids)
+        stamp = notify_allocations(results)
+        for pending, result in zip(batch, results):
+            if pending.response_body is not None and not isinstance(result, Exception):
+                store_response(pending.claim, 201, pending.response_body(result))
+        db.session.commit()
+        return results, stamp
+
+    with app.app_context():
+        try:
+            results, stamp = run_in_transaction(transaction)
+            committed = True
+        except Exception as e:
+            db.session.rollback()
+            logger.warning('Committing %d queued bookings failed: %s', len(batch), e)
+            results, committed = [e] * len(batch), False
+
+        if committed:
+            publish_allocations(results, stamp)
+
+        # A request that stopped waiting for a failed booking may try again
+        abandoned = [
+            pending.claim for pending, result in zip(batch, results)
+            if not pending.resolve(result) and isinstance(result, Exception)
+        ]
+        if any(claim is not None for claim in abandoned):
+            for claim in abandoned:
+                release_claim(claim)
+            db.session.commit()
+
+    return committed
+
+
+class GroupCommitter(threading.Thread):
+    def __init__(self, app, window_ms, max_batch):
+        super().__init__(name='reservation-group-committer', daemon=True)
+        self.app = app
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.bookings = 0
+        self.largest_batch = 0
+
+    def book(self, data, time_slot, timeout=None, response_body=None):
+        """
+        Queue a booking and wait for its batch to commit. Returns an
+        Allocation or raises what allocating it raised (e.g. SlotFullError),
+        or BookingPendingError after timeout seconds. response_body turns
+        the Allocation into the response stored for the request's
+        Idempotency-Key.
+        """
+        pending = PendingBooking(data, time_slot, response_body)
+        self._queue.put(pending)
+        return pending.wait(timeout)
+
+    def run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._commit(batch)
+
+    def _commit(self, batch):
+        if commit_bookings(self.app, batch):
+            with self._stats_lock:
+                self.batches += 1
+                self.bookings += len(batch)
+                self.largest_batch = max(self.largest_batch, len(batch))
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'window_ms': self.window * 1000,
+                'batches': self.batches,
+                'bookings': self.bookings,
+                'largest_batch': self.largest_batch,
+                'average_batch': round(self.bookings / self.batches, 2) if self.batches else 0.0
+            }
+
+
+group_committer = None
+
+
+def start_group_committer(app):
+    """Start the committer thread for this process when group commit is enabled."""
+    global group_committer
+    if group_committer is None and Config.BOOKING_MODE == 'group_commit':
+        group_committer = GroupCommitter(app, Config.GROUP_COMMIT_WINDOW_MS, Config.GROUP_COMMIT_MAX_BATCH)
+        group_committer.start()
+    return group_committer
@@ -0,0 +1,228 @@
+"""
+Two-phase booking with expiring table holds.
+
+POST /api/holds sets a table aside for a slot for a few minutes while the
+guest fills in the form; create_reservation later turns the hold into a
+booking. A held table occupies its slot_inventory bits exactly like a
+booking of the party's length of stay, so availability checks include
+active holds automatically.
+
+Holds are stored in the table_holds table (the source of truth, and what
+survives a crash) and tracked in memory in a min-heap ordered by expiry. A
+reaper thread sleeps until the earliest expiry, pops it (O(log n)) and gives
+the table back. Holds that were booked or released early are simply skipped
+when they reach the top of the heap. Several processes may track the same
+hold after a restart; the DELETE ... RETURNING in release_hold makes sure
+only one of them gives the table back. A table given back goes to a
+waiting party first, if one fits (see waitlist.py).
+
+Each hold records the address it was placed from, and one address may keep
+at most Config.MAX_HOLDS_PER_CLIENT active holds, so a client cannot take a
+slot's tables out of circulation by holding them one after another. Holds
+from the same address are placed one at a time, under a transaction-level
+advisory lock on the address, so concurrent requests cannot both slip under
+the limit.
+"""
+
+import heapq
+import logging
+import threading
+import uuid
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from booking import hold_table, lock_inventories, release_table, stay_slot_ids
+from cache_sync import notify_slots_changed, publish_slot_changes, publish_slot_counts
+from config import Config
+from models import db
+from retry import run_in_transaction
+from seating import floor_plan
+from slots import dining_minutes, slot_from_id, slot_id
+from waitlist import finish_promotions, promote_waiting, promotion_window
+
+logger = logging.getLogger(__name__)
+
+Hold = namedtuple('Hold', ['token', 'time_slot', 'table_number', 'duration_minutes', 'expires_at'])
+
+CLAIM_HOLD_SQL = text("""
+    DELETE FROM table_holds
+    WHERE token = :token AND slot_id = :slot_id AND expires_at > :now
+    RETURNING table_number, duration_minutes
+""")
+
+RELEASE_HOLD_SQL = text("""
+    DELETE FROM table_holds
+    WHERE token = :token
+    RETURNING time_slot, table_number, duration_minutes
+""")
+
+RELEASE_EXPIRED_HOLD_SQL = text("""
+    DELETE FROM table_holds
+    WHERE token = :token AND expires_at <= :now
+    RETURNING time_slot, table_number, duration_minutes
+""")
+
+# Two-key advisory locks in this namespace serialize one address's holds
+CLIENT_LOCK_NAMESPACE = 5
+
+LOCK_CLIENT_SQL = text("""
+    SELECT pg_advisory_xact_lock(:namespace, hashtext(:client))
+""")
+
+COUNT_CLIENT_HOLDS_SQL = text("""
+    SELECT count(*) FROM table_holds
+    WHERE client = :client AND expires_at > :now
+""")
+
+LOAD_HOLDS_SQL = text("""
+    SELECT token, expires_at FROM table_holds
+""")
+
+
+class HoldExpiredError(Exception):
+    """Raised when a hold token is unknown, already used, expired, or for another slot."""
+
+
+class HoldLimitError(Exception):
+    """Raised when the client already has Config.MAX_HOLDS_PER_CLIENT active holds."""
+
+
+class HoldTooSmallError(Exception):
+    """
+    Raised when the hold cannot seat the party being booked, because the
+    table is too small or the party stays longer; args are (token, capacity).
+    """
+
+
+def create_hold(time_slot, minutes, party_size=2, client=None):
+    """
+    Hold the smallest free table that seats the party for `minutes` and
+    return the Hold. Raises HoldLimitError if client, the address the
+    request came from, already has as many active holds as it may keep.
+    """
+    token = str(uuid.uuid4())
+    expires_at = datetime.utcnow() + timedelta(minutes=minutes)
+
+    def transaction():
+        if client is not None:
+            db.session.execute(LOCK_CLIENT_SQL, {'namespace': CLIENT_LOCK_NAMESPACE, 'client': client})
+            active = db.session.execute(COUNT_CLIENT_HOLDS_SQL, {'client': client, 'now': datetime.utcnow()}).scalar()
+            if active >= Config.MAX_HOLDS_PER_CLIENT:
+                raise HoldLimitError(client)
+        table_number, duration_minutes, counts = hold_table(token, time_slot, expires_at, party_size, client)
+        stamp = notify_slots_changed(slot_from_id(value) for value in counts)
+        db.session.commit()
+        return table_number, duration_minutes, counts, stamp
+
+    table_number, duration_minutes, counts, stamp = run_in_transaction(transaction)
+    publish_slot_counts(counts, tables_changed=1, stamp=stamp)
+    hold_reaper.track(token, expires_at)
+    return Hold(token, time_slot, table_number, duration_minutes, expires_at)
+
+
+def claim_hold(token, time_slot, party_size=2):
+    """
+    Consume an active hold on the slot inside the caller's booking
+    transaction and return (table_number, duration_minutes). The table stays
+    taken in the inventory for the held length of stay, which the booking
+    keeps. The caller rolls back if the hold does not fit the party.
+    """
+    row = db.session.execute(CLAIM_HOLD_SQL, {
+        'token': token,
+        'slot_id': slot_id(time_slot),
+        'now': datetime.utcnow(),
+    }).first()
+    if row is None:
+        raise HoldExpiredError(token)
+    capacity = floor_plan.capacity[row.table_number]
+    if capacity < party_size or row.duration_minutes < dining_minutes(party_size):
+        raise HoldTooSmallError(token, capacity)
+    return row.table_number, row.duration_minutes
+
+
+def release_hold(token, expired_only=False):
+    """
+    Delete a hold and give its table back. Returns the hold's time slot, or
+    None if there was nothing to release (already booked, released or reaped).
+    """
+    def transaction():
+        if expired_only:
+            row = db.session.execute(RELEASE_EXPIRED_HOLD_SQL, {'token': token, 'now': datetime.utcnow()}).first()
+        else:
+            row = db.session.execute(RELEASE_HOLD_SQL, {'token': token}).first()
+        if row is None:
+            db.session.rollback()
+            return None, {}, {}, [], None
+        lock_inventories(promotion_window(stay_slot_ids(row.time_slot, row.duration_minutes)))
+        counts = release_table(row.time_slot, row.table_number, row.duration_minutes)
+        tables_changed = {value: -1 for value in counts}
+        promotions = promote_waiting(counts, tables_changed)
+        stamp = notify_slots_changed(slot_from_id(value) for value in counts)
+        db.session.commit()
+        return row.time_slot, counts, tables_changed, promotions, stamp
+
+    time_slot, counts, tables_changed, promotions, stamp = run_in_transaction(transaction)
+    finish_promotions(promotions)
+    publish_slot_changes(counts, tables_changed, stamp)
+    return time_slot
+
+
+class HoldReaper(threading.Thread):
+    """Releases holds as they expire, earliest first."""
+
+    def __init__(self):
+        super().__init__(name='table-hold-reaper', daemon=True)
+        self.app = None
+        self._heap = []  # (expires_at, token)
+        self._condition = threading.Condition()
+        self.expired = 0
+
+    def track(self, token, expires_at):
+        with self._condition:
+            heapq.heappush(self._heap, (expires_at, token))
+            # Wake the reaper if this hold expires before the one it waits for
+            if self._heap[0][1] == token:
+                self._condition.notify()
+
+    def start_for(self, app):
+        """Load every stored hold (crash recovery) and start reaping."""
+        self.app = app
+        with app.app_context():
+            for row in db.session.execute(LOAD_HOLDS_SQL):
+                self.track(row.token, row.expires_at)
+            db.session.rollback()
+        self.start()
+
+    def run(self):
+        while True:
+            with self._condition:
+                while not self._heap:
+                    self._condition.wait()
+                expires_at, token = self._heap[0]
+                delay = (expires_at - datetime.utcnow()).total_seconds()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+                heapq.heappop(self._heap)
+
+            try:
+                with self.app.app_context():
+                    if release_hold(token, expired_only=True) is not None:
+                        self.expired += 1
+            except Exception as e:
+                logger.warning('Could not release expired hold %s: %s', token, e)
+
+    def stats(self):
+        with self._condition:
+            return {'tracked': len(self._heap), 'expired': self.expired}
+
+
+hold_reaper = HoldReaper()
+
+
+def start_hold_reaper(app):
+    if not hold_reaper.is_alive():
+        hold_reaper.start_for(app)
+    return hold_reaper
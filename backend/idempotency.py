@@ -0,0 +1,208 @@
+"""
+Idempotency-Key support for POST endpoints.
+
+Clients on flaky networks resubmit the same form. When a request carries an
+Idempotency-Key header, the first request claims the key in the
+idempotency_keys table, runs normally, and stores its response; any replay
+of the same key gets the stored response back without running the view (and
+its transaction) again. Recently used responses are also held in an
+in-memory LRU so most replays never reach the database.
+
+A view whose transaction does the work (e.g. books a table) stores its
+response in that same transaction with store_response, so a worker dying
+between the commit and the end of the request cannot leave a booking behind
+a key with no response. Such a key would otherwise answer 409 until it went
+stale, and then run the view again.
+
+A view whose work outlives the request (a queued booking that misses its
+timeout, see group_commit.py) calls keep_claim: the key stays claimed, so
+retries get 409 rather than booking again, until the work stores its
+response or, if it fails, calls release_claim.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import current_app, g, has_request_context, jsonify, make_response, request
+from sqlalchemy import text
+
+from config import Config
+from models import db
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+# Responses that ask the client to try again are not stored
+RETRYABLE_STATUS_CODES = {409, 429}
+
+CLAIM_KEY_SQL = text("""
+    INSERT INTO idempotency_keys (key, endpoint, request_hash, created_at)
+    VALUES (:key, :endpoint, :request_hash, :now)
+    ON CONFLICT (key, endpoint) DO NOTHING
+    RETURNING key
+""")
+
+# Take over a claim whose request never finished (e.g. the worker crashed)
+RECLAIM_STALE_KEY_SQL = text("""
+    UPDATE idempotency_keys
+    SET request_hash = :request_hash, created_at = :now
+    WHERE key = :key AND endpoint = :endpoint
+      AND status_code IS NULL AND created_at < :stale_before
+    RETURNING key
+""")
+
+READ_KEY_SQL = text("""
+    SELECT request_hash, status_code, response_body
+    FROM idempotency_keys
+    WHERE key = :key AND endpoint = :endpoint
+""")
+
+STORE_RESPONSE_SQL = text("""
+    UPDATE idempotency_keys
+    SET status_code = :status_code, response_body = :response_body
+    WHERE key = :key AND endpoint = :endpoint
+""")
+
+RELEASE_KEY_SQL = text("""
+    DELETE FROM idempotency_keys
+    WHERE key = :key AND endpoint = :endpoint AND status_code IS NULL
+""")
+
+PURGE_KEYS_SQL = text("""
+    DELETE FROM idempotency_keys WHERE created_at < :expired_before
+""")
+
+
+class ResponseCache:
+    """Bounded LRU of stored responses keyed by (endpoint, key)."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, cache_key):
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                self._entries.move_to_end(cache_key)
+            return entry
+
+    def set(self, cache_key, entry):
+        with self._lock:
+            self._entries[cache_key] = entry
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+response_cache = ResponseCache(Config.IDEMPOTENCY_CACHE_SIZE)
+
+
+def _replay(entry, request_hash):
+    stored_hash, status_code, body = entry
+    if stored_hash != request_hash:
+        return jsonify({'error': f'{HEADER} was already used for a different request'}), 422
+    response = make_response(body, status_code)
+    response.mimetype = 'application/json'
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _claim(params):
+    """Claim the key for this request; True if the caller should run the view."""
+    now = datetime.utcnow()
+    claimed = db.session.execute(CLAIM_KEY_SQL, {**params, 'now': now}).first()
+    if claimed is None:
+        stale_before = now - timedelta(seconds=Config.IDEMPOTENCY_CLAIM_TIMEOUT)
+        claimed = db.session.execute(
+            RECLAIM_STALE_KEY_SQL, {**params, 'now': now, 'stale_before': stale_before}
+        ).first()
+    db.session.commit()
+    return claimed is not None
+
+
+def current_claim():
+    """The Idempotency-Key this request claimed, as statement parameters, or None."""
+    if not has_request_context():
+        return None
+    return g.get('idempotency_claim')
+
+
+def store_response(claim, status_code, payload):
+    """
+    Store the JSON response for a claimed key inside the caller's
+    transaction, so it commits together with the work it reports.
+    """
+    if claim is not None:
+        db.session.execute(STORE_RESPONSE_SQL, {
+            **claim, 'status_code': status_code, 'response_body': current_app.json.dumps(payload)
+        })
+
+
+def keep_claim():
+    """Leave this request's key claimed without a response; its work stores one later."""
+    if has_request_context():
+        g.idempotency_kept = True
+
+
+def release_claim(claim):
+    """Free a kept key whose work failed, inside the caller's transaction."""
+    if claim is not None:
+        db.session.execute(RELEASE_KEY_SQL, claim)
+
+
+def idempotent(view):
+    """Make a POST view safe to retry with an Idempotency-Key header."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({'error': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters'}), 400
+
+        cache_key = (request.endpoint, key)
+        request_hash = hashlib.sha256(request.get_data()).hexdigest()
+        params = {'key': key, 'endpoint': request.endpoint, 'request_hash': request_hash}
+
+        entry = response_cache.get(cache_key)
+        if entry is not None:
+            return _replay(entry, request_hash)
+
+        if not _claim(params):
+            row = db.session.execute(READ_KEY_SQL, params).first()
+            if row is None or row.status_code is None:
+                return jsonify({'error': f'A request with this {HEADER} is still being processed'}), 409
+            entry = (row.request_hash, row.status_code, row.response_body)
+            response_cache.set(cache_key, entry)
+            return _replay(entry, request_hash)
+
+        g.idempotency_claim = params
+        response = make_response(view(*args, **kwargs))
+        if g.get('idempotency_kept'):
+            return response
+
+        if response.status_code >= 500 or response.status_code in RETRYABLE_STATUS_CODES:
+            # Not a final answer; let the client retry with the same key
+            db.session.execute(RELEASE_KEY_SQL, params)
+        else:
+            body = response.get_data(as_text=True)
+            db.session.execute(STORE_RESPONSE_SQL, {
+                **params, 'status_code': response.status_code, 'response_body': body
+            })
+            response_cache.set(cache_key, (request_hash, response.status_code, body))
+        db.session.commit()
+        return response
+
+    return wrapper
+
+
+def purge_expired_keys():
+    """Drop keys older than the retention period."""
+    expired_before = datetime.utcnow() - timedelta(hours=Config.IDEMPOTENCY_KEY_TTL_HOURS)
+    db.session.execute(PURGE_KEYS_SQL, {'expired_before': expired_before})
+    db.session.commit()
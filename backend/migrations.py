@@ -0,0 +1,297 @@
+"""
+Versioned schema migrations.
+
+models.py is the one definition of the schema, including its constraints and
+indexes. A new database is created from it (db.metadata.create_all) and
+stamped with every migration version. An existing database is brought
+forward by the numbered migrations below, each recorded in schema_migrations
+once applied. Index migrations run outside a transaction so they can use
+CREATE INDEX CONCURRENTLY and never block bookings while they build; the
+others run in one transaction each. An advisory lock keeps workers that
+start together from migrating at the same time.
+
+Databases bootstrapped from older copies of schema.sql, create_tables.py or
+direct_create_tables.py differ in small ways (constraint names, defaults),
+so every migration checks the catalog before it changes anything.
+"""
+
+import logging
+from collections import namedtuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex, CreateSequence, CreateTable
+
+from config import Config
+from models import Reservation, SchemaMigration, db, slot_write_sequence
+from partitions import LIST_PARTITIONS_SQL, PARENT_TABLE, create_partitions, overlap_constraint, overlap_constraint_name
+from slots import SLOT_MINUTES
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary key for pg_advisory_lock, shared by every process running migrations
+MIGRATION_LOCK_ID = 4_417_001
+
+LOCK_SQL = text("SELECT pg_advisory_lock(:lock_id)")
+UNLOCK_SQL = text("SELECT pg_advisory_unlock(:lock_id)")
+
+APPLIED_VERSIONS_SQL = text("SELECT version FROM schema_migrations")
+
+RECORD_VERSION_SQL = text("""
+    INSERT INTO schema_migrations (version, description)
+    VALUES (:version, :description)
+    ON CONFLICT (version) DO NOTHING
+""")
+
+CONSTRAINT_EXISTS_SQL = text("""
+    SELECT 1 FROM pg_constraint
+    WHERE conrelid = CAST(:table AS regclass) AND conname = :name
+""")
+
+FOREIGN_KEYS_SQL = text("""
+    SELECT conname, confdeltype FROM pg_constraint
+    WHERE conrelid = CAST(:table AS regclass) AND contype = 'f'
+""")
+
+INVALID_INDEX_SQL = text("""
+    SELECT 1 FROM pg_index
+    JOIN pg_class ON pg_class.oid = pg_index.indexrelid
+    WHERE pg_class.relname = :name AND NOT pg_index.indisvalid
+""")
+
+TABLE_KIND_SQL = text("SELECT relkind FROM pg_class WHERE oid = CAST(:table AS regclass)")
+
+KEY_CONSTRAINTS_SQL = text("""
+    SELECT conname FROM pg_constraint
+    WHERE conrelid = CAST(:table AS regclass) AND contype IN ('p', 'u')
+""")
+
+RESERVATION_MONTHS_SQL = text("SELECT MIN(time_slot), MAX(time_slot) FROM reservations_unpartitioned")
+
+# Reservations made before durations existed only ever took their own slot
+COPY_RESERVATIONS_SQL = text(f"""
+    INSERT INTO reservations (id, customer_id, time_slot, slot_id, table_number, duration_minutes, created_at)
+    SELECT id, customer_id, time_slot, slot_id, table_number, {SLOT_MINUTES}, created_at
+    FROM reservations_unpartitioned
+""")
+
+RESET_RESERVATION_IDS_SQL = text("""
+    SELECT setval(pg_get_serial_sequence('reservations', 'id'), COALESCE(MAX(id), 0) + 1, false)
+    FROM reservations
+""")
+
+# version: applied in ascending order; concurrent: run in autocommit mode
+Migration = namedtuple('Migration', ['version', 'description', 'upgrade', 'concurrent'])
+
+
+def constraint_exists(conn, table, name):
+    return conn.execute(CONSTRAINT_EXISTS_SQL, {'table': table, 'name': name}).first() is not None
+
+
+def create_index_concurrently(conn, name, table, columns):
+    """Build an index without locking out writes, replacing a failed earlier build."""
+    if conn.execute(INVALID_INDEX_SQL, {'name': name}).first() is not None:
+        conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {name}'))
+    conn.execute(text(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({columns})'))
+
+
+def add_slot_ids(conn):
+    """Store an integer slot id on reservations and key inventory and holds by it."""
+    tables = inspect(conn)
+    columns = {column['name'] for column in tables.get_columns('reservations')}
+    if 'slot_id' not in columns:
+        # 1800 seconds = one half-hour slot (see slots.slot_id)
+        conn.execute(text("ALTER TABLE reservations ADD COLUMN slot_id INTEGER"))
+        conn.execute(text("UPDATE reservations SET slot_id = FLOOR(EXTRACT(EPOCH FROM time_slot) / 1800)"))
+        conn.execute(text("ALTER TABLE reservations ALTER COLUMN slot_id SET NOT NULL"))
+        conn.execute(text("ALTER TABLE reservations DROP CONSTRAINT IF EXISTS uq_reservations_time_slot_table"))
+        conn.execute(text(
+            "ALTER TABLE reservations ADD CONSTRAINT uq_reservations_slot_table UNIQUE (slot_id, table_number)"
+        ))
+        # Both are rebuilt: create_all recreates them and the startup backfill
+        # refills the inventory from reservations
+        conn.execute(text("DROP TABLE IF EXISTS table_holds"))
+        conn.execute(text("DROP TABLE IF EXISTS slot_inventory"))
+    elif tables.has_table('slot_inventory'):
+        # Created while the column was still an autoincrementing key
+        conn.execute(text("ALTER TABLE slot_inventory ALTER COLUMN slot_id DROP DEFAULT"))
+
+
+def add_model_constraints(conn):
+    """Constraints and server defaults that schema.sql had but the models did not."""
+    if not constraint_exists(conn, 'reservations', 'reservations_table_number_check'):
+        # NOT VALID + VALIDATE checks existing rows without blocking writes
+        conn.execute(text(
+            "ALTER TABLE reservations ADD CONSTRAINT reservations_table_number_check "
+            f"CHECK (table_number >= 1 AND table_number <= {Config.TOTAL_TABLES}) NOT VALID"
+        ))
+        conn.execute(text("ALTER TABLE reservations VALIDATE CONSTRAINT reservations_table_number_check"))
+
+    foreign_keys = conn.execute(FOREIGN_KEYS_SQL, {'table': 'reservations'}).all()
+    if not any(row.confdeltype == 'c' for row in foreign_keys):
+        for row in foreign_keys:
+            conn.execute(text(f'ALTER TABLE reservations DROP CONSTRAINT "{row.conname}"'))
+        conn.execute(text(
+            "ALTER TABLE reservations ADD CONSTRAINT reservations_customer_id_fkey "
+            "FOREIGN KEY (customer_id) REFERENCES customers (id) ON DELETE CASCADE NOT VALID"
+        ))
+        conn.execute(text("ALTER TABLE reservations VALIDATE CONSTRAINT reservations_customer_id_fkey"))
+
+    # Tables missing here are created from the models after the migrations
+    existing = set(inspect(conn).get_table_names())
+    for table in ['customers', 'reservations', 'idempotency_keys', 'table_holds']:
+        if table in existing:
+            conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN created_at SET DEFAULT CURRENT_TIMESTAMP"))
+    conn.execute(text("ALTER TABLE customers ALTER COLUMN newsletter_signup SET DEFAULT false"))
+    if 'slot_inventory' in existing:
+        conn.execute(text("ALTER TABLE slot_inventory ALTER COLUMN booked_count SET DEFAULT 0"))
+        conn.execute(text("ALTER TABLE slot_inventory ALTER COLUMN table_mask SET DEFAULT 0"))
+
+
+def add_model_indexes(conn):
+    """Indexes declared on the models, built online."""
+    create_index_concurrently(conn, 'idx_reservations_time_slot', 'reservations', 'time_slot')
+    create_index_concurrently(conn, 'idx_reservations_customer_id', 'reservations', 'customer_id')
+    if inspect(conn).has_table('idempotency_keys'):
+        create_index_concurrently(conn, 'idx_idempotency_keys_created_at', 'idempotency_keys', 'created_at')
+    # customers.email is UNIQUE, which already indexes it
+    conn.execute(text('DROP INDEX CONCURRENTLY IF EXISTS idx_customers_email'))
+
+
+def partition_reservations(conn):
+    """Rebuild reservations as a table partitioned by month of slot_id."""
+    if conn.execute(TABLE_KIND_SQL, {'table': 'reservations'}).scalar() == 'p':
+        return
+
+    # Move the old table aside; index and sequence names are schema-wide, so
+    # free the ones the new table is about to create
+    conn.execute(text("ALTER TABLE reservations RENAME TO reservations_unpartitioned"))
+    sequence = conn.execute(text("SELECT pg_get_serial_sequence('reservations_unpartitioned', 'id')")).scalar()
+    if sequence:
+        conn.execute(text(f"ALTER SEQUENCE {sequence} RENAME TO reservations_unpartitioned_id_seq"))
+    for name in conn.execute(KEY_CONSTRAINTS_SQL, {'table': 'reservations_unpartitioned'}).scalars():
+        conn.execute(text(f'ALTER TABLE reservations_unpartitioned DROP CONSTRAINT "{name}"'))
+    for index in Reservation.__table__.indexes:
+        conn.execute(text(f'DROP INDEX IF EXISTS {index.name}'))
+
+    Reservation.__table__.create(conn)
+    first, last = conn.execute(RESERVATION_MONTHS_SQL).one()
+    if first is not None:
+        create_partitions(conn, first.date(), last.date())
+    conn.execute(COPY_RESERVATIONS_SQL)
+    conn.execute(RESET_RESERVATION_IDS_SQL)
+    conn.execute(text("DROP TABLE reservations_unpartitioned"))
+
+
+def add_party_sizes(conn):
+    """Record each reservation's party size; older rows are assumed to be couples."""
+    columns = {column['name'] for column in inspect(conn).get_columns('reservations')}
+    if 'party_size' not in columns:
+        # A constant default is stored in the catalog; no table rewrite
+        conn.execute(text("ALTER TABLE reservations ADD COLUMN party_size INTEGER NOT NULL DEFAULT 2"))
+
+
+def add_combined_tables(conn):
+    """Link the extra tables of a combined booking to the lead table's reservation."""
+    columns = {column['name'] for column in inspect(conn).get_columns('reservations')}
+    if 'combined_with' not in columns:
+        conn.execute(text("ALTER TABLE reservations ADD COLUMN combined_with INTEGER"))
+
+
+def add_dining_durations(conn):
+    """Give reservations and holds a length of stay and reject overlapping stays at a table."""
+    tables = inspect(conn)
+    for table in ('reservations', 'table_holds'):
+        if not tables.has_table(table):
+            continue  # Created from the models, with the column, after the migrations
+        columns = {column['name'] for column in tables.get_columns(table)}
+        if 'duration_minutes' not in columns:
+            # Existing rows only ever took their own slot; new ones always set it
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN duration_minutes INTEGER NOT NULL DEFAULT {SLOT_MINUTES}"))
+            conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN duration_minutes DROP DEFAULT"))
+    for name in conn.execute(LIST_PARTITIONS_SQL, {'parent': PARENT_TABLE}).scalars():
+        if not constraint_exists(conn, name, overlap_constraint_name(name)):
+            conn.execute(text(f'ALTER TABLE {name} ADD {overlap_constraint(name)}'))
+
+
+def add_hold_clients(conn):
+    """Record which client placed each hold."""
+    if not inspect(conn).has_table('table_holds'):
+        return  # Created from the models, with the column, after the migrations
+    columns = {column['name'] for column in inspect(conn).get_columns('table_holds')}
+    if 'client' not in columns:
+        conn.execute(text("ALTER TABLE table_holds ADD COLUMN client VARCHAR(64)"))
+
+
+def add_slot_write_sequence(conn):
+    """Sequence that orders commits changing slot counts, for the shared counters."""
+    slot_write_sequence.create(conn, checkfirst=True)
+
+
+MIGRATIONS = [
+    Migration(1, 'Integer slot ids on reservations, inventory and holds', add_slot_ids, False),
+    Migration(2, 'Constraints and defaults declared in the models', add_model_constraints, False),
+    Migration(3, 'Indexes declared in the models', add_model_indexes, True),
+    Migration(4, 'Monthly range partitions of reservations by slot_id', partition_reservations, False),
+    Migration(5, 'Party size on reservations', add_party_sizes, False),
+    Migration(6, 'Combined tables on reservations', add_combined_tables, False),
+    Migration(7, 'Dining durations and overlapping-stay constraints', add_dining_durations, False),
+    Migration(8, 'Client address on table holds', add_hold_clients, False),
+    Migration(9, 'Sequence ordering slot count changes', add_slot_write_sequence, False),
+]
+
+
+def migrate_database(engine):
+    """
+    Create or upgrade the schema to match models.py and return the list of
+    migration versions applied by this call.
+    """
+    applied_now = []
+    with engine.connect() as lock_conn:
+        lock_conn = lock_conn.execution_options(isolation_level='AUTOCOMMIT')
+        lock_conn.execute(LOCK_SQL, {'lock_id': MIGRATION_LOCK_ID})
+        try:
+            fresh = not inspect(lock_conn).has_table('reservations')
+            SchemaMigration.__table__.create(lock_conn, checkfirst=True)
+
+            if fresh:
+                db.metadata.create_all(lock_conn)
+                for migration in MIGRATIONS:
+                    record_version(lock_conn, migration)
+                logger.info('Created database schema at version %d', MIGRATIONS[-1].version)
+                return applied_now
+
+            applied = set(lock_conn.execute(APPLIED_VERSIONS_SQL).scalars())
+            for migration in MIGRATIONS:
+                if migration.version in applied:
+                    continue
+                logger.info('Applying migration %d: %s', migration.version, migration.description)
+                if migration.concurrent:
+                    migration.upgrade(lock_conn)
+                    record_version(lock_conn, migration)
+                else:
+                    with engine.begin() as conn:
+                        migration.upgrade(conn)
+                        record_version(conn, migration)
+                applied_now.append(migration.version)
+
+            # Tables added to the models since this database was created
+            db.metadata.create_all(lock_conn)
+        finally:
+            lock_conn.execute(UNLOCK_SQL, {'lock_id': MIGRATION_LOCK_ID})
+    return applied_now
+
+
+def record_version(conn, migration):
+    conn.execute(RECORD_VERSION_SQL, {'version': migration.version, 'description': migration.description})
+
+
+def schema_ddl():
+    """CREATE statements for every sequence, table and index in the models, in dependency order."""
+    dialect = postgresql.dialect()
+    statements = [str(CreateSequence(slot_write_sequence, if_not_exists=True).compile(dialect=dialect)).strip()]
+    for table in db.metadata.sorted_tables:
+        statements.append(str(CreateTable(table, if_not_exists=True).compile(dialect=dialect)).strip())
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            statements.append(str(CreateIndex(index, if_not_exists=True).compile(dialect=dialect)).strip())
+    return statements
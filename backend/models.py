@@ -1,9 +1,22 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 
+from config import Config
+
 # This will be initialized by app.py
 db = SQLAlchemy()
 
+def execute_core(statement, params=None):
+    """
+    Run a Core statement on the current session's connection and transaction.
+
+    Hot paths use this with column-only select()/insert() statements built once
+    at import time: they skip the ORM's per-call execution and entity
+    machinery, and their compiled form is reused from the engine's statement
+    cache on every call.
+    """
+    return db.session.connection().execute(statement, params or {})
+
 class Customer(db.Model):
     __tablename__ = 'customers'
     
@@ -11,8 +24,8 @@ class Customer(db.Model):
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     phone = db.Column(db.String(20), nullable=True)
-    newsletter_signup = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    newsletter_signup = db.Column(db.Boolean, default=False, server_default=db.false())
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, server_default=db.func.current_timestamp())
     
     # Relationship with reservations
     reservations = db.relationship('Reservation', backref='customer', lazy=True)
@@ -32,12 +45,35 @@ class Customer(db.Model):
 
 class Reservation(db.Model):
     __tablename__ = 'reservations'
+    __table_args__ = (
+        # A table can only be booked once per time slot; also the index
+        # behind every lookup by slot_id
+        db.UniqueConstraint('slot_id', 'table_number', name='uq_reservations_slot_table'),
+        db.CheckConstraint(
+            f'table_number >= 1 AND table_number <= {Config.TOTAL_TABLES}',
+            name='reservations_table_number_check'
+        ),
+        db.Index('idx_reservations_time_slot', 'time_slot'),
+        db.Index('idx_reservations_customer_id', 'customer_id'),
+        # One partition per month of slot ids (see partitions.py)
+        {'postgresql_partition_by': 'RANGE (slot_id)'},
+    )
     
-    id = db.Column(db.Integer, primary_key=True)
-    customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'), nullable=False)
+    # The primary key of a partitioned table must include the partition key
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customers.id', ondelete='CASCADE'), nullable=False)
     time_slot = db.Column(db.DateTime, nullable=False)
+    # Half-hour buckets since 1970-01-01 in restaurant-local time (see slots.slot_id)
+    slot_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
     table_number = db.Column(db.Integer, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    party_size = db.Column(db.Integer, nullable=False, default=2, server_default=db.text('2'))
+    # How long the party keeps the table from time_slot (slots.dining_minutes);
+    # each partition rejects overlapping stays at one table (see partitions.py)
+    duration_minutes = db.Column(db.Integer, nullable=False)
+    # For a table pushed against another for a large party: the id of the
+    # lead table's reservation in the same slot (see booking.py)
+    combined_with = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, server_default=db.func.current_timestamp())
     
     def __repr__(self):
         return f'<Reservation {self.id} - Table {self.table_number}>'
@@ -47,6 +83,119 @@ class Reservation(db.Model):
             'id': self.id,
             'customer_id': self.customer_id,
             'time_slot': self.time_slot.isoformat(),
+            'slot_id': self.slot_id,
             'table_number': self.table_number,
+            'party_size': self.party_size,
+            'duration_minutes': self.duration_minutes,
+            'combined_with': self.combined_with,
             'created_at': self.created_at.isoformat()
         }
+
+class DiningTable(db.Model):
+    __tablename__ = 'tables'
+    
+    # Written from Config.TABLE_LAYOUT at startup (see seating.sync_tables)
+    table_number = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    capacity = db.Column(db.Integer, nullable=False)
+    zone = db.Column(db.String(20), nullable=False)
+    
+    def __repr__(self):
+        return f'<DiningTable {self.table_number} - {self.capacity} seats>'
+
+class SlotInventory(db.Model):
+    __tablename__ = 'slot_inventory'
+    
+    # One row per time slot; bit (n - 1) of table_mask is set when table n is booked
+    slot_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    time_slot = db.Column(db.DateTime, nullable=False)
+    booked_count = db.Column(db.Integer, nullable=False, default=0, server_default=db.text('0'))
+    table_mask = db.Column(db.BigInteger, nullable=False, default=0, server_default=db.text('0'))
+    
+    def __repr__(self):
+        return f'<SlotInventory {self.time_slot} - {self.booked_count} booked>'
+    
+    def to_dict(self):
+        return {
+            'slot_id': self.slot_id,
+            'time_slot': self.time_slot.isoformat(),
+            'booked_count': self.booked_count,
+            'table_mask': self.table_mask
+        }
+
+# Orders commits that change slot counts across processes: a transaction
+# takes the next value while it holds the slots' inventory locks, so a later
+# commit to a slot always has a larger value (see shared_counters.py)
+slot_write_sequence = db.Sequence('slot_write_seq', metadata=db.metadata)
+
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (
+        # Expired keys are purged by age
+        db.Index('idx_idempotency_keys_created_at', 'created_at'),
+    )
+    
+    # A key is claimed (status_code NULL) before the request runs and holds
+    # the stored response once it has finished
+    key = db.Column(db.String(255), primary_key=True)
+    endpoint = db.Column(db.String(100), primary_key=True)
+    request_hash = db.Column(db.String(64), nullable=False)
+    status_code = db.Column(db.Integer, nullable=True)
+    response_body = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, server_default=db.func.current_timestamp())
+    
+    def __repr__(self):
+        return f'<IdempotencyKey {self.endpoint} {self.key}>'
+
+class TableHold(db.Model):
+    __tablename__ = 'table_holds'
+    __table_args__ = (
+        db.UniqueConstraint('slot_id', 'table_number', name='uq_table_holds_slot_table'),
+    )
+    
+    # A table set aside for a guest who is still filling in the form; it is
+    # counted in slot_inventory until it is booked, released or expires
+    token = db.Column(db.String(36), primary_key=True)
+    time_slot = db.Column(db.DateTime, nullable=False)
+    slot_id = db.Column(db.Integer, nullable=False)
+    table_number = db.Column(db.Integer, nullable=False)
+    # The hold covers the same slots a booking of this length would
+    duration_minutes = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    # Address the hold was placed from, for the per-client limit on active holds
+    client = db.Column(db.String(64))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, server_default=db.func.current_timestamp())
+    
+    def __repr__(self):
+        return f'<TableHold {self.token} - Table {self.table_number}>'
+
+class WaitlistEntry(db.Model):
+    __tablename__ = 'waitlist'
+    __table_args__ = (
+        # Promotion loads the parties still waiting for one slot at a time
+        db.Index('idx_waitlist_waiting', 'slot_id', postgresql_where=db.text('reservation_id IS NULL')),
+    )
+    
+    # A party waiting for a table in a full slot; reservation_id is set when
+    # a freed table is booked for it (see waitlist.py)
+    id = db.Column(db.Integer, primary_key=True)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customers.id', ondelete='CASCADE'), nullable=False)
+    time_slot = db.Column(db.DateTime, nullable=False)
+    slot_id = db.Column(db.Integer, nullable=False)
+    party_size = db.Column(db.Integer, nullable=False)
+    requested_at = db.Column(db.DateTime, nullable=False)
+    reservation_id = db.Column(db.Integer, nullable=True)
+    promoted_at = db.Column(db.DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f'<WaitlistEntry {self.id} - {self.time_slot} for {self.party_size}>'
+
+class SchemaMigration(db.Model):
+    __tablename__ = 'schema_migrations'
+    
+    # One row per migration in migrations.py applied to this database
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    description = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow, server_default=db.func.current_timestamp())
+    
+    def __repr__(self):
+        return f'<SchemaMigration {self.version}>'
@@ -0,0 +1,202 @@
+"""
+Monthly range partitions of the reservations table.
+
+reservations is partitioned by RANGE (slot_id), one partition per calendar
+month (reservations_YYYY_MM). Slot ids grow with time, so month boundaries
+map to slot id boundaries. Slot ids also start every booking lookup, and
+they are part of the unique (slot_id, table_number) key that PostgreSQL
+requires to include the partition key. A booking, and any lookup of one
+slot, touches a single month's partition and its small indexes, however
+much history the table keeps.
+
+Maintenance creates the partitions for the current month through the end of
+the booking window plus Config.RESERVATION_PARTITION_MONTHS_AHEAD, and
+detaches partitions older than Config.RESERVATION_RETENTION_MONTHS. A
+detached month stays in the database as a plain table until it is archived.
+It runs at startup and then periodically on a background thread, and only
+one process does it at a time.
+
+Every partition carries an exclusion constraint that rejects two stays at
+the same table whose [time_slot, time_slot + duration_minutes) ranges
+overlap. PostgreSQL only accepts it per partition, since the partition key
+cannot be part of it. A stay could only clash with one in another month
+across midnight at a month's end, when the restaurant is closed.
+"""
+
+import logging
+import re
+import threading
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import text
+
+from config import Config
+from slots import slot_id
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = 'reservations'
+PARTITION_NAME = re.compile(r'^reservations_(\d{4})_(\d{2})$')
+
+# Arbitrary key for pg_try_advisory_lock; the holder maintains partitions
+PARTITION_LOCK_ID = 4_417_002
+
+TRY_LOCK_SQL = text("SELECT pg_try_advisory_lock(:lock_id)")
+UNLOCK_SQL = text("SELECT pg_advisory_unlock(:lock_id)")
+
+LIST_PARTITIONS_SQL = text("""
+    SELECT child.relname AS name, inherits.inhdetachpending AS detach_pending
+    FROM pg_inherits inherits
+    JOIN pg_class parent ON parent.oid = inherits.inhparent
+    JOIN pg_class child ON child.oid = inherits.inhrelid
+    WHERE parent.relname = :parent
+""")
+
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def months_between(first, last):
+    """First days of every month from first's month through last's month."""
+    month = month_start(first)
+    while month <= last:
+        yield month
+        month = next_month(month)
+
+
+def partition_name(month):
+    return f'{PARENT_TABLE}_{month:%Y_%m}'
+
+
+def partition_bounds(month):
+    """Slot id range [start, end) covering a calendar month."""
+    start = datetime(month.year, month.month, 1)
+    end = datetime.combine(next_month(month), datetime.min.time())
+    return slot_id(start), slot_id(end)
+
+
+def overlap_constraint_name(name):
+    return f'{name}_no_overlap'
+
+
+def overlap_constraint(name):
+    """
+    Exclusion constraint against overlapping stays at one table. Both sides
+    are ranges, so the plain GiST range operators cover it without btree_gist.
+    """
+    return (
+        f'CONSTRAINT {overlap_constraint_name(name)} EXCLUDE USING gist ('
+        f"int4range(table_number, table_number, '[]') WITH &&, "
+        f"tsrange(time_slot, time_slot + duration_minutes * INTERVAL '1 minute') WITH &&)"
+    )
+
+
+def create_partition_sql(month):
+    start, end = partition_bounds(month)
+    name = partition_name(month)
+    return text(
+        f'CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} '
+        f'({overlap_constraint(name)}) '
+        f'FOR VALUES FROM ({start}) TO ({end})'
+    )
+
+
+def create_partitions(conn, first, last):
+    """Create the monthly partitions covering first..last (dates)."""
+    for month in months_between(first, last):
+        conn.execute(create_partition_sql(month))
+
+
+def partition_month(name):
+    match = PARTITION_NAME.match(name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+def maintain_partitions(conn, today=None):
+    """
+    Create upcoming partitions and detach expired ones on an autocommit
+    connection. Returns (created, detached) partition names.
+    """
+    today = today or date.today()
+    existing = {row.name: row.detach_pending for row in conn.execute(LIST_PARTITIONS_SQL, {'parent': PARENT_TABLE})}
+
+    created = []
+    last_month = today + timedelta(days=Config.RESERVATION_ADVANCE_DAYS)
+    for _ in range(Config.RESERVATION_PARTITION_MONTHS_AHEAD):
+        last_month = next_month(month_start(last_month))
+    for month in months_between(today, last_month):
+        if partition_name(month) not in existing:
+            conn.execute(create_partition_sql(month))
+            created.append(partition_name(month))
+
+    detached = []
+    if Config.RESERVATION_RETENTION_MONTHS > 0:
+        cutoff = month_start(today)
+        for _ in range(Config.RESERVATION_RETENTION_MONTHS):
+            cutoff = month_start(cutoff - timedelta(days=1))
+        # Finish interrupted detaches first; only one may be pending at a time
+        for name, detach_pending in sorted(existing.items(), key=lambda item: (not item[1], item[0])):
+            month = partition_month(name)
+            if month is None or month >= cutoff:
+                continue
+            if detach_pending:
+                # An earlier concurrent detach was interrupted
+                conn.execute(text(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name} FINALIZE'))
+            else:
+                conn.execute(text(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name} CONCURRENTLY'))
+            detached.append(name)
+
+    return created, detached
+
+
+def run_partition_maintenance(engine):
+    """Maintain partitions unless another process is already doing it."""
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level='AUTOCOMMIT')
+        if not conn.execute(TRY_LOCK_SQL, {'lock_id': PARTITION_LOCK_ID}).scalar():
+            return [], []
+        try:
+            created, detached = maintain_partitions(conn)
+        finally:
+            conn.execute(UNLOCK_SQL, {'lock_id': PARTITION_LOCK_ID})
+    if created or detached:
+        logger.info('Reservation partitions created: %s; detached: %s', created or 'none', detached or 'none')
+    return created, detached
+
+
+class PartitionMaintainer(threading.Thread):
+    """Re-runs partition maintenance every Config.PARTITION_MAINTENANCE_INTERVAL hours."""
+
+    def __init__(self, engine, interval_hours):
+        super().__init__(name='reservation-partition-maintainer', daemon=True)
+        self.engine = engine
+        self.interval = interval_hours * 3600
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                run_partition_maintenance(self.engine)
+            except Exception as e:
+                logger.warning('Reservation partition maintenance failed: %s', e)
+
+
+_maintainer = None
+
+
+def start_partition_maintenance(engine):
+    """Create this month's and upcoming partitions now, then keep them maintained."""
+    global _maintainer
+    run_partition_maintenance(engine)
+    if _maintainer is None:
+        _maintainer = PartitionMaintainer(engine, Config.PARTITION_MAINTENANCE_INTERVAL)
+        _maintainer.start()
+    return _maintainer
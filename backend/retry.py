@@ -0,0 +1,114 @@
+"""
+Automatic retry of booking transactions that lose a concurrency conflict.
+
+PostgreSQL aborts a transaction with SQLSTATE 40001 (serialization failure)
+or 40P01 (deadlock detected) when it cannot order it against a concurrent
+one. Those failures are transient: running the same transaction again gives
+the right answer. run_in_transaction runs a unit of work at the configured
+isolation level and retries these two failures with bounded exponential
+backoff and full jitter, so clients get a booking or a real "fully booked"
+instead of a 500. Retry counts are kept for /api/stats.
+"""
+
+import logging
+import random
+import threading
+import time
+
+from sqlalchemy.exc import DBAPIError
+
+from config import Config
+from models import db
+
+logger = logging.getLogger(__name__)
+
+SERIALIZATION_FAILURE = '40001'
+DEADLOCK_DETECTED = '40P01'
+RETRYABLE_SQLSTATES = {SERIALIZATION_FAILURE, DEADLOCK_DETECTED}
+
+# A booking hit a table that is already taken: the unique (slot_id,
+# table_number) key or the overlapping-stay exclusion constraint. Matched by
+# SQLSTATE because drivers do not all raise these as IntegrityError.
+UNIQUE_VIOLATION = '23505'
+EXCLUSION_VIOLATION = '23P01'
+TABLE_TAKEN_SQLSTATES = {UNIQUE_VIOLATION, EXCLUSION_VIOLATION}
+
+
+class TransactionConflictError(Exception):
+    """Raised when a transaction still conflicts after every retry."""
+
+
+def sqlstate(error):
+    """SQLSTATE of a database error raised through SQLAlchemy, for pg8000 or psycopg2."""
+    orig = getattr(error, 'orig', error)
+    code = getattr(orig, 'pgcode', None)  # psycopg2
+    if code is None and orig is not None and orig.args and isinstance(orig.args[0], dict):
+        code = orig.args[0].get('C')  # pg8000
+    return code
+
+
+class RetryStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.transactions = 0
+        self.retries = {}
+        self.exhausted = 0
+
+    def record_transaction(self):
+        with self._lock:
+            self.transactions += 1
+
+    def record_retry(self, code):
+        with self._lock:
+            self.retries[code] = self.retries.get(code, 0) + 1
+
+    def record_exhausted(self):
+        with self._lock:
+            self.exhausted += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'isolation_level': Config.BOOKING_ISOLATION_LEVEL,
+                'transactions': self.transactions,
+                'retries': dict(self.retries),
+                'total_retries': sum(self.retries.values()),
+                'exhausted': self.exhausted
+            }
+
+
+retry_stats = RetryStats()
+
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2^attempt)]."""
+    ceiling = min(Config.TRANSACTION_RETRY_MAX_DELAY, Config.TRANSACTION_RETRY_BASE_DELAY * 2 ** attempt)
+    return random.uniform(0, ceiling)
+
+
+def run_in_transaction(work, *args, **kwargs):
+    """
+    Run work(*args, **kwargs) as one transaction on db.session and return its
+    result. The work must commit (or leave the commit to the caller) and be
+    safe to run again from scratch: on a serialization failure or deadlock
+    the transaction is rolled back and retried after a jittered delay.
+    """
+    attempts = Config.TRANSACTION_RETRY_ATTEMPTS
+    retry_stats.record_transaction()
+    for attempt in range(attempts):
+        # Isolation level has to be chosen before the transaction's first statement
+        db.session.connection(execution_options={'isolation_level': Config.BOOKING_ISOLATION_LEVEL})
+        try:
+            return work(*args, **kwargs)
+        except DBAPIError as e:
+            db.session.rollback()
+            code = sqlstate(e)
+            if code not in RETRYABLE_SQLSTATES:
+                raise
+            if attempt == attempts - 1:
+                retry_stats.record_exhausted()
+                raise TransactionConflictError(code) from e
+            retry_stats.record_retry(code)
+            delay = backoff_delay(attempt)
+            logger.info('Retrying transaction after SQLSTATE %s (attempt %d, %.1f ms)', code, attempt + 1, delay * 1000)
+            time.sleep(delay)
@@ -6,13 +6,16 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app import app, db
+from migrations import migrate_database
 
 def create_tables():
     with app.app_context():
         try:
-            print("Creating database tables...")
-            db.create_all()
+            print("Creating or upgrading database tables...")
+            applied = migrate_database(db.engine)
             print("✅ Database tables created successfully!")
+            if applied:
+                print(f"Applied migrations: {', '.join(str(version) for version in applied)}")
             
             # Verify tables were created
             from sqlalchemy import text
@@ -2,9 +2,15 @@
 """
 Directly create tables using SQLAlchemy
 """
+import os
+import sys
 import pg8000
 from sqlalchemy import create_engine, text
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from migrations import migrate_database
+from partitions import run_partition_maintenance
+
 def create_tables_directly():
     try:
         # Create connection string
@@ -13,40 +19,15 @@ def create_tables_directly():
         # Create engine
         engine = create_engine(connection_string)
         
-        # Create tables using raw SQL
+        # Create or upgrade tables from the models, without starting the app
+        applied = migrate_database(engine)
+        run_partition_maintenance(engine)
+        print("✅ Tables created successfully!")
+        if applied:
+            print(f"Applied migrations: {', '.join(str(version) for version in applied)}")
+        
         with engine.connect() as conn:
-            # Start a transaction
-            trans = conn.begin()
-            
             try:
-                # Create customers table
-                conn.execute(text("""
-                    CREATE TABLE IF NOT EXISTS customers (
-                        id SERIAL PRIMARY KEY,
-                        name VARCHAR(100) NOT NULL,
-                        email VARCHAR(120) UNIQUE NOT NULL,
-                        phone VARCHAR(20),
-                        newsletter_signup BOOLEAN DEFAULT FALSE,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    );
-                """))
-                
-                # Create reservations table
-                conn.execute(text("""
-                    CREATE TABLE IF NOT EXISTS reservations (
-                        id SERIAL PRIMARY KEY,
-                        customer_id INTEGER NOT NULL,
-                        time_slot TIMESTAMP NOT NULL,
-                        table_number INTEGER NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (customer_id) REFERENCES customers(id)
-                    );
-                """))
-                
-                # Commit the transaction
-                trans.commit()
-                print("✅ Tables created successfully!")
-                
                 # Verify tables exist
                 result = conn.execute(text("""
                     SELECT table_name 
@@ -64,8 +45,7 @@ def create_tables_directly():
                     print("❌ No tables found after creation")
                     
             except Exception as e:
-                trans.rollback()
-                print(f"❌ Error creating tables: {e}")
+                print(f"❌ Error listing tables: {e}")
                 raise
                 
     except Exception as e:
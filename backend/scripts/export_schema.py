@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Regenerate database/schema.sql from the models.
+
+Run this after changing models.py (and adding a migration) so the SQL file
+used for manual setup matches what the app creates.
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from datetime import date
+
+from migrations import MIGRATIONS, schema_ddl
+from partitions import create_partition_sql
+from seating import floor_plan
+
+SCHEMA_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    'database', 'schema.sql'
+)
+
+HEADER = """-- Café Fausse Database Schema
+-- PostgreSQL Database Setup
+-- Generated from backend/models.py by backend/scripts/export_schema.py - do not edit by hand
+
+-- Create database (run this command separately)
+-- CREATE DATABASE cafe_fausse;
+
+-- Connect to the database
+-- \\c cafe_fausse;
+"""
+
+# Month of the sample reservations below; the app creates the partitions for
+# the current booking window itself when it starts
+SAMPLE_MONTH = date(2024, 12, 1)
+
+SAMPLE_DATA = """-- Insert sample data (optional)
+INSERT INTO customers (name, email, phone, newsletter_signup) VALUES
+('John Doe', 'john@example.com', '(202) 555-1234', true),
+('Jane Smith', 'jane@example.com', '(202) 555-5678', false)
+ON CONFLICT (email) DO NOTHING;
+
+-- Sample reservations (optional)
+-- slot_id counts half-hour buckets (1800 seconds) since 1970-01-01 in restaurant-local time
+INSERT INTO reservations (customer_id, time_slot, slot_id, table_number, party_size, duration_minutes)
+SELECT customer_id, time_slot, FLOOR(EXTRACT(EPOCH FROM time_slot) / 1800), table_number, party_size, duration_minutes
+FROM (VALUES
+    (1, TIMESTAMP '2024-12-01 19:00:00', 5, 2, 90),
+    (2, TIMESTAMP '2024-12-01 20:30:00', 12, 4, 90)
+) AS sample(customer_id, time_slot, table_number, party_size, duration_minutes)
+ON CONFLICT DO NOTHING;
+
+-- Keep slot inventory in step with the sample reservations: each one takes
+-- its table in every half hour of its stay
+INSERT INTO slot_inventory (slot_id, time_slot, booked_count, table_mask)
+SELECT r.slot_id + c.step, MIN(r.time_slot + c.step * INTERVAL '30 minutes'), COUNT(*),
+       BIT_OR(1::bigint << (r.table_number - 1))
+FROM reservations r
+CROSS JOIN LATERAL generate_series(0, CAST(CEIL(r.duration_minutes / 30.0) AS integer) - 1) AS c(step)
+GROUP BY r.slot_id + c.step
+ON CONFLICT (slot_id) DO NOTHING;
+"""
+
+
+def render_schema():
+    parts = [HEADER]
+    parts.append('-- Tables, constraints and indexes')
+    for statement in schema_ddl():
+        statement = statement.replace('\t', '    ').replace('\n PARTITION BY', ' PARTITION BY')
+        lines = [line.rstrip() for line in statement.splitlines()]
+        parts.append('\n'.join(lines) + ';\n')
+
+    parts.append('-- Mark every migration as applied so the app does not re-run them')
+    parts.append('INSERT INTO schema_migrations (version, description) VALUES')
+    parts.append(',\n'.join(
+        "({}, '{}')".format(migration.version, migration.description.replace("'", "''"))
+        for migration in MIGRATIONS
+    ))
+    parts.append('ON CONFLICT (version) DO NOTHING;\n')
+
+    parts.append('-- Floor plan from Config.TABLE_LAYOUT (the app rewrites it at startup)')
+    parts.append('INSERT INTO tables (table_number, capacity, zone) VALUES')
+    parts.append(',\n'.join(
+        f"({number}, {capacity}, '{zone}')" for number, capacity, zone in floor_plan.tables()
+    ))
+    parts.append('ON CONFLICT (table_number) DO UPDATE SET capacity = EXCLUDED.capacity, zone = EXCLUDED.zone;\n')
+
+    parts.append('-- Monthly partition for the sample reservations')
+    parts.append(str(create_partition_sql(SAMPLE_MONTH)) + ';\n')
+
+    parts.append(SAMPLE_DATA)
+    return '\n'.join(parts)
+
+
+if __name__ == "__main__":
+    with open(SCHEMA_PATH, 'w', encoding='utf-8') as schema_file:
+        schema_file.write(render_schema())
+    print(f"✅ Wrote {SCHEMA_PATH}")
@@ -0,0 +1,245 @@
+"""
+Party-size-aware seating.
+
+The floor plan (Config.TABLE_LAYOUT) gives every table a number of seats and
+a zone. It is compiled into one bitset per distinct capacity, using the same
+bit layout as slot_inventory.table_mask (bit n - 1 = table n). Seating a
+party bisects to the smallest capacity that fits, then tests each larger
+bucket against the slot's taken mask until one has a free table, and takes
+the lowest-numbered free table in it. That costs O(log k) plus one
+bit operation per capacity tried (k distinct capacities), never a scan of
+the tables. Best fit keeps the large tables free for the large parties that
+need them.
+
+When no single free table seats the party, adjacent free tables are pushed
+together (Config.TABLE_ADJACENCY). The search looks for the fewest tables
+that seat the party, up to Config.MAX_COMBINED_TABLES. Among those it picks
+the fewest seats, then the lowest table numbers. It enumerates connected
+sets of free tables on bitmasks, each set once (the ESU algorithm, grown
+from its lowest-numbered table). It skips a set size that cannot reach the
+party even at the largest capacity, and abandons a partial set that cannot
+catch up. Results are memoized on (free tables, party size), since many
+slots share the same free-table pattern and availability queries repeat.
+
+The floor plan is also written to the `tables` table at startup, so
+reports can join reservations to capacities and zones.
+"""
+
+import bisect
+from functools import lru_cache
+
+from sqlalchemy import text
+
+from config import Config
+from models import db
+
+SYNC_TABLE_SQL = text("""
+    INSERT INTO tables (table_number, capacity, zone)
+    VALUES (:table_number, :capacity, :zone)
+    ON CONFLICT (table_number) DO UPDATE
+    SET capacity = EXCLUDED.capacity, zone = EXCLUDED.zone
+""")
+
+REMOVE_TABLES_SQL = text("DELETE FROM tables WHERE table_number > :total_tables")
+
+# slot_inventory.table_mask is a signed bigint, so bit 63 is not available
+MAX_TABLES = 63
+
+
+def popcount(mask):
+    return bin(mask).count('1')
+
+
+def lowest_table(mask):
+    """Table number of the lowest set bit."""
+    return (mask & -mask).bit_length()
+
+
+def parse_party_size(value):
+    """number_of_guests from a request as an int, or None if it is not a positive whole number."""
+    if isinstance(value, bool):
+        return None
+    try:
+        party_size = int(value)
+    except (TypeError, ValueError):
+        return None
+    if isinstance(value, float) and value != party_size:
+        return None
+    return party_size if party_size >= 1 else None
+
+
+def table_numbers(mask):
+    """Table numbers set in a mask, ascending."""
+    numbers = []
+    while mask:
+        low = mask & -mask
+        numbers.append(low.bit_length())
+        mask ^= low
+    return numbers
+
+
+class FloorPlan:
+    """Tables bucketed by capacity, as bitsets over table numbers, plus the adjacency graph."""
+
+    def __init__(self, layout, total_tables, adjacency=(), max_combined=1, cache_size=4096):
+        if total_tables > MAX_TABLES:
+            raise ValueError(f'TOTAL_TABLES: a table mask holds at most {MAX_TABLES} tables, not {total_tables}')
+        self.capacity = [0] * (total_tables + 1)  # table number -> seats
+        self.zone = [None] * (total_tables + 1)
+        for first, last, seats, zone in layout:
+            for number in range(first, last + 1):
+                if not 1 <= number <= total_tables or self.capacity[number]:
+                    raise ValueError(f'TABLE_LAYOUT: table {number} is out of range or listed twice')
+                self.capacity[number] = seats
+                self.zone[number] = zone
+        missing = [number for number in range(1, total_tables + 1) if not self.capacity[number]]
+        if missing:
+            raise ValueError(f'TABLE_LAYOUT: tables {missing} have no capacity')
+
+        self.total_tables = total_tables
+        self.capacities = sorted(set(self.capacity[1:]))
+        self.bucket_masks = [0] * len(self.capacities)
+        for number in range(1, total_tables + 1):
+            self.bucket_masks[self.capacities.index(self.capacity[number])] |= 1 << (number - 1)
+        # fitting_masks[i]: every table seating at least capacities[i]
+        self.fitting_masks = [0] * len(self.capacities)
+        fitting = 0
+        for i in reversed(range(len(self.capacities))):
+            fitting |= self.bucket_masks[i]
+            self.fitting_masks[i] = fitting
+        self.max_capacity = self.capacities[-1]
+        self.total_seats = sum(self.capacity)
+
+        # neighbours[n]: mask of the tables that can be pushed against table n
+        self.neighbours = [0] * (total_tables + 1)
+        for run in adjacency:
+            for a, b in zip(run, run[1:]):
+                if not (1 <= a <= total_tables and 1 <= b <= total_tables) or a == b:
+                    raise ValueError(f'TABLE_ADJACENCY: {a}-{b} is not a pair of tables')
+                self.neighbours[a] |= 1 << (b - 1)
+                self.neighbours[b] |= 1 << (a - 1)
+        self.max_combined = max_combined
+        self._search = lru_cache(maxsize=cache_size)(self._find_combination)
+        self.max_party = max(
+            [self.max_capacity] + [
+                seats
+                for size in range(2, max_combined + 1)
+                for _, seats in self._connected_sets((1 << total_tables) - 1, size, 0)
+            ]
+        )
+
+    @classmethod
+    def from_config(cls):
+        return cls(
+            Config.TABLE_LAYOUT, Config.TOTAL_TABLES, Config.TABLE_ADJACENCY,
+            Config.MAX_COMBINED_TABLES, Config.SEATING_CACHE_SIZE
+        )
+
+    def best_fit(self, taken_mask, party_size):
+        """Number of the smallest free table that seats the party, or None."""
+        for i in range(bisect.bisect_left(self.capacities, party_size), len(self.capacities)):
+            free = self.bucket_masks[i] & ~taken_mask
+            if free:
+                return lowest_table(free)
+        return None
+
+    def seat(self, taken_mask, party_size):
+        """
+        Tables for the party as a tuple, lead (lowest-numbered) table first:
+        the best-fitting single table, else the smallest adjacent combination.
+        None if the party cannot be seated.
+        """
+        table_number = self.best_fit(taken_mask, party_size)
+        if table_number is not None:
+            return (table_number,)
+        if party_size > self.max_party:
+            return None
+        return self._search(self.all_tables & ~taken_mask, party_size)
+
+    @property
+    def all_tables(self):
+        return (1 << self.total_tables) - 1
+
+    def _find_combination(self, free, party_size):
+        largest = max((self.capacity[n] for n in table_numbers(free)), default=0)
+        for size in range(2, self.max_combined + 1):
+            if size * largest < party_size:
+                continue  # Even the largest free tables would fall short
+            best = None
+            for mask, seats in self._connected_sets(free, size, party_size, largest):
+                if seats >= party_size and (best is None or (seats, mask) < best):
+                    best = (seats, mask)
+            if best is not None:
+                return tuple(table_numbers(best[1]))
+        return None
+
+    def _connected_sets(self, free, size, party_size, largest=None):
+        """
+        Yield (mask, seats) for every connected set of `size` free tables,
+        skipping partial sets that cannot reach party_size.
+        """
+        largest = largest or self.max_capacity
+        capacity = self.capacity
+        neighbours = self.neighbours
+        for start in table_numbers(free):
+            # Grow only with higher-numbered tables so each set is found once
+            above = free & ~((1 << start) - 1)
+            stack = [(1 << (start - 1), neighbours[start] & above, neighbours[start] | (1 << (start - 1)),
+                      1, capacity[start])]
+            while stack:
+                chosen, extension, closed, count, seats = stack.pop()
+                if count == size:
+                    yield chosen, seats
+                    continue
+                if seats + (size - count) * largest < party_size:
+                    continue
+                while extension:
+                    low = extension & -extension
+                    extension ^= low
+                    table = low.bit_length()
+                    stack.append((
+                        chosen | low,
+                        extension | (neighbours[table] & above & ~closed),
+                        closed | neighbours[table],
+                        count + 1,
+                        seats + capacity[table],
+                    ))
+
+    def fitting_mask(self, party_size):
+        """Bitset of every table that seats the party."""
+        i = bisect.bisect_left(self.capacities, party_size)
+        return self.fitting_masks[i] if i < len(self.capacities) else 0
+
+    def free_tables_for(self, taken_mask, party_size):
+        """How many free tables could seat the party."""
+        return popcount(self.fitting_mask(party_size) & ~taken_mask)
+
+    def seating_options(self, taken_mask, party_size):
+        """
+        Free tables that seat the party on their own, or 1 if only a
+        combination of adjacent tables does, or 0 if the party cannot be seated.
+        """
+        available = self.free_tables_for(taken_mask, party_size)
+        if available:
+            return available
+        return 1 if self.seat(taken_mask, party_size) else 0
+
+    def cache_info(self):
+        return self._search.cache_info()
+
+    def tables(self):
+        for number in range(1, self.total_tables + 1):
+            yield number, self.capacity[number], self.zone[number]
+
+
+floor_plan = FloorPlan.from_config()
+
+
+def sync_tables():
+    """Write the configured floor plan to the tables table."""
+    db.session.execute(SYNC_TABLE_SQL, [
+        {'table_number': number, 'capacity': capacity, 'zone': zone}
+        for number, capacity, zone in floor_plan.tables()
+    ])
+    db.session.execute(REMOVE_TABLES_SQL, {'total_tables': floor_plan.total_tables})
+    db.session.commit()
@@ -0,0 +1,291 @@
+"""
+Booked table counts shared by every worker process on one host.
+
+With N pre-forked workers, each per-process cache has to be filled and kept
+coherent separately. This module instead keeps one array of per-slot counts
+in a multiprocessing.shared_memory block that every worker maps, covering the
+booking window (Config.RESERVATION_ADVANCE_DAYS). Availability checks read it
+without locks, a database query or a network hop; create_reservation writes
+the new count after it commits.
+
+Layout: a ring of half-hour buckets, each holding an int64 tag (the bucket's
+slot id), an int64 version, an int64 sequence and an int32 count. A slot
+lives at index slot_id % capacity. Writers clear the tag before changing a
+bucket and restore it afterwards, and readers re-check the tag after reading
+the count, so a torn read is never returned - the caller just falls back to
+the database. Every write bumps the bucket's version.
+
+Workers publish counts in whatever order their request threads get there,
+not in commit order. So every transaction that changes slot counts takes a
+value from the slot_write_seq sequence while it still holds the slots'
+inventory locks (write_sequence), and a later commit to a slot always gets a
+larger one. A bucket keeps the sequence of the count it holds and only
+accepts a larger one. The compare and the write happen under a file lock
+shared by every process that maps the block, so two workers cannot
+interleave them. (Where fcntl is missing, i.e. Windows, the lock only covers
+one process: run a single worker there.)
+
+The window is loaded at startup and afterwards only by a background
+refresher thread: every SHARED_COUNTERS_REFRESH_INTERVAL seconds, when the
+day rolls over, and when a write finds that the array has drifted from the
+database. Requests never wait for it. A count that no publish corrected, for
+instance from a worker that died between its commit and its publish, is thus
+replaced within one interval. A rebuild reads the versions before it queries
+the database and skips every bucket written since, so a count published
+meanwhile is not overwritten by the older one the query saw. It keeps each
+bucket's sequence, so any commit the query missed still publishes over it.
+"""
+
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from multiprocessing import resource_tracker, shared_memory
+
+from sqlalchemy import text
+
+from booking import booked_counts_between
+from config import Config
+from models import db
+from slots import SLOT_EPOCH, SLOT_LENGTH, restaurant_now, slot_id
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+EMPTY_TAG = -1
+
+TAG_SIZE = 8       # int64
+VERSION_SIZE = 8   # int64
+SEQUENCE_SIZE = 8  # int64
+COUNT_SIZE = 4     # int32
+
+NEXT_WRITE_SEQUENCE_SQL = text("SELECT nextval('slot_write_seq')")
+
+
+def is_bucket_aligned(time_slot):
+    return (time_slot - SLOT_EPOCH) % SLOT_LENGTH == timedelta(0)
+
+
+class SharedCounters:
+    def __init__(self, name, days):
+        # Two spare days so the ring never wraps inside the booking window
+        self.capacity = (days + 2) * 48
+        size = self.capacity * (TAG_SIZE + VERSION_SIZE + SEQUENCE_SIZE + COUNT_SIZE)
+
+        try:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            self.created = True
+        except FileExistsError:
+            self._shm = shared_memory.SharedMemory(name=name)
+            self.created = False
+        # The block outlives any one worker; stop the resource tracker from
+        # unlinking it when this process exits
+        try:
+            resource_tracker.unregister(self._shm._name, 'shared_memory')
+        except Exception:
+            pass
+
+        if self._shm.size < size:
+            raise RuntimeError(f'Shared memory block {name!r} is smaller than expected')
+
+        tags_end = self.capacity * TAG_SIZE
+        versions_end = tags_end + self.capacity * VERSION_SIZE
+        sequences_end = versions_end + self.capacity * SEQUENCE_SIZE
+        self._tags = self._shm.buf[:tags_end].cast('q')
+        self._versions = self._shm.buf[tags_end:versions_end].cast('q')
+        self._sequences = self._shm.buf[versions_end:sequences_end].cast('q')
+        self._counts = self._shm.buf[sequences_end:sequences_end + self.capacity * COUNT_SIZE].cast('i')
+        # flock excludes other processes; threads of this one share the file
+        # and take the thread lock first
+        self._write_lock = threading.Lock()
+        self._lock_file = open(os.path.join(tempfile.gettempdir(), f'{name}.lock'), 'a')
+
+    @contextmanager
+    def _writing(self):
+        with self._write_lock:
+            if fcntl is not None:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def get(self, time_slot):
+        """Shared booked count for the slot, or None if it is not loaded."""
+        number = slot_id(time_slot)
+        index = number % self.capacity
+        if self._tags[index] != number:
+            return None
+        count = self._counts[index]
+        if self._tags[index] != number:
+            return None  # Rewritten while we were reading
+        return count
+
+    def publish(self, time_slot, count, sequence):
+        """
+        Store the count a transaction committed after taking sequence,
+        unless the bucket already holds a later commit's count. Returns
+        (stored, the count it replaced or None if the slot was not loaded).
+        """
+        number = slot_id(time_slot)
+        index = number % self.capacity
+        with self._writing():
+            loaded = self._tags[index] == number
+            if loaded and self._sequences[index] >= sequence:
+                return False, None
+            previous = self._counts[index] if loaded else None
+            self._write(number, count, sequence)
+        return True, previous
+
+    def _write(self, number, count, sequence):
+        index = number % self.capacity
+        self._tags[index] = EMPTY_TAG
+        self._counts[index] = count
+        self._sequences[index] = sequence
+        self._versions[index] += 1
+        self._tags[index] = number
+
+    def versions(self, start, end):
+        """Version of every half-hour bucket in [start, end], as {slot_id: version}."""
+        return {
+            number: self._versions[number % self.capacity]
+            for number in range(slot_id(start), slot_id(end) + 1)
+        }
+
+    def rebuild(self, counts, versions):
+        """
+        Load the buckets of versions (from versions()) from a {slot_id:
+        count} dict, skipping those written since the versions were read.
+        """
+        skipped = 0
+        with self._writing():
+            for number, version in versions.items():
+                index = number % self.capacity
+                if self._versions[index] != version:
+                    skipped += 1
+                    continue
+                sequence = self._sequences[index] if self._tags[index] == number else 0
+                self._write(number, counts.get(number, 0), sequence)
+        return skipped
+
+    def close(self):
+        self._tags.release()
+        self._versions.release()
+        self._sequences.release()
+        self._counts.release()
+        self._shm.close()
+        self._lock_file.close()
+
+
+class CounterRefresher(threading.Thread):
+    """Rebuilds the shared window off the request path, on request and every interval."""
+
+    def __init__(self, app, interval):
+        super().__init__(name='shared-counter-refresher', daemon=True)
+        self.app = app
+        self.interval = interval
+        self._requested = threading.Event()
+
+    def request(self):
+        self._requested.set()
+
+    def run(self):
+        while True:
+            self._requested.wait(self.interval)
+            self._requested.clear()
+            try:
+                with self.app.app_context():
+                    rebuild_shared_counters()
+            except Exception as e:
+                logger.warning('Could not rebuild shared availability counters: %s', e)
+
+
+shared_counters = None
+_refresher = None
+
+# Day the shared window was last loaded by this process
+_window_day = None
+
+
+def booking_window():
+    """First and last half-hour bucket that can currently be booked."""
+    start = datetime.combine(restaurant_now().date(), datetime.min.time())
+    end = start + timedelta(days=Config.RESERVATION_ADVANCE_DAYS + 1) - SLOT_LENGTH
+    return start, end
+
+
+def rebuild_shared_counters():
+    """Reload the shared counts for the booking window from the database."""
+    global _window_day
+    start, end = booking_window()
+    versions = shared_counters.versions(start, end)
+    skipped = shared_counters.rebuild(booked_counts_between(start, end), versions)
+    _window_day = start.date()
+    logger.info('Rebuilt shared availability counters from %s to %s (%d newer kept)', start, end, skipped)
+
+
+def init_shared_counters(app):
+    """Map (or create) the shared block, load it from the database and start its refresher."""
+    global shared_counters, _refresher
+    if shared_counters is None and Config.SHARED_COUNTERS_ENABLED:
+        shared_counters = SharedCounters(Config.SHARED_COUNTERS_NAME, Config.RESERVATION_ADVANCE_DAYS)
+        rebuild_shared_counters()
+        _refresher = CounterRefresher(app, Config.SHARED_COUNTERS_REFRESH_INTERVAL)
+        _refresher.start()
+    return shared_counters
+
+
+def in_window(time_slot):
+    """
+    True if the slot has a bucket in the loaded window. On a new day the
+    refresher is asked to load its window and the database answers until then.
+    """
+    if _window_day != restaurant_now().date():
+        _refresher.request()
+        return False
+    start, end = booking_window()
+    return start <= time_slot <= end and is_bucket_aligned(time_slot)
+
+
+def lookup_booked_count(time_slot):
+    """Shared booked count for the slot, or None when the database must be asked."""
+    if shared_counters is None or not in_window(time_slot):
+        return None
+    return shared_counters.get(time_slot)
+
+
+def write_sequence():
+    """
+    Next value of slot_write_seq, for a transaction that changes slot counts
+    and still holds their inventory locks; pass it to record_booking after
+    the commit. None when the shared counters are off.
+    """
+    if shared_counters is None:
+        return None
+    return db.session.execute(NEXT_WRITE_SEQUENCE_SQL).scalar()
+
+
+def record_booking(time_slot, new_count, sequence, tables_booked=1):
+    """
+    Publish a slot's count after a booking commits, given the write_sequence
+    its transaction took. A count from an earlier commit that arrives late is
+    dropped. If the shared value was not the count the booking started from,
+    the array has drifted from the database and the refresher rebuilds the
+    window.
+    """
+    if shared_counters is None or sequence is None or not in_window(time_slot):
+        return
+    stored, previous = shared_counters.publish(time_slot, new_count, sequence)
+    if not stored:
+        return  # A later commit already published this slot
+    expected = new_count - tables_booked
+    if previous is not None and previous != expected:
+        logger.warning('Shared counter drift at %s (had %s, expected %s)', time_slot, previous, expected)
+        _refresher.request()
@@ -0,0 +1,113 @@
+"""
+Per-slot serialized booking queues.
+
+Concurrent bookings for the same popular slot all contend for the same
+inventory row and reservation index pages. In slot-queue mode
+(Config.BOOKING_MODE = 'slot_queue') the dispatcher instead routes each
+booking to a worker thread that owns its time slot, actor-style. A slot's
+worker takes whatever has queued up for it, allocates those bookings one
+after another in memory against the slot's free-table mask, and persists
+them in arrival order in a single transaction, so at most one transaction
+per slot is in flight in this process. Different slots have different
+workers and proceed in parallel, although a stay that runs into the next
+slots shares their inventory rows; every booking locks those in slot order,
+so neighbouring workers may wait on each other but never deadlock. Workers
+exit after sitting idle.
+"""
+
+import queue
+import threading
+
+from config import Config
+from group_commit import PendingBooking, commit_bookings
+
+
+class SlotWorker(threading.Thread):
+    def __init__(self, dispatcher, time_slot):
+        super().__init__(name=f'slot-worker-{time_slot:%Y%m%d-%H%M}', daemon=True)
+        self.dispatcher = dispatcher
+        self.time_slot = time_slot
+        self.queue = queue.Queue()
+
+    def run(self):
+        while True:
+            try:
+                batch = [self.queue.get(timeout=self.dispatcher.idle_timeout)]
+            except queue.Empty:
+                if self.dispatcher.retire(self):
+                    return
+                continue
+
+            while len(batch) < self.dispatcher.max_batch:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            committed = commit_bookings(self.dispatcher.app, batch)
+            self.dispatcher.record_batch(len(batch), committed)
+
+
+class SlotDispatcher:
+    def __init__(self, app, max_batch, idle_timeout):
+        self.app = app
+        self.max_batch = max_batch
+        self.idle_timeout = idle_timeout
+        self._workers = {}
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.bookings = 0
+        self.failed_batches = 0
+
+    def book(self, data, time_slot, timeout=None, response_body=None):
+        """
+        Queue a booking on its slot's worker and wait for it to be persisted.
+        Returns an Allocation or raises what allocating it raised, or
+        BookingPendingError after timeout seconds (see group_commit).
+        """
+        pending = PendingBooking(data, time_slot, response_body)
+        with self._lock:
+            worker = self._workers.get(time_slot)
+            if worker is None:
+                worker = SlotWorker(self, time_slot)
+                self._workers[time_slot] = worker
+                worker.start()
+            # Queued under the lock so an idle worker cannot retire in between
+            worker.queue.put(pending)
+        return pending.wait(timeout)
+
+    def retire(self, worker):
+        """Remove an idle worker unless a booking was queued for it meanwhile."""
+        with self._lock:
+            if not worker.queue.empty():
+                return False
+            self._workers.pop(worker.time_slot, None)
+            return True
+
+    def record_batch(self, size, committed):
+        with self._lock:
+            if committed:
+                self.batches += 1
+                self.bookings += size
+            else:
+                self.failed_batches += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'active_slots': len(self._workers),
+                'batches': self.batches,
+                'bookings': self.bookings,
+                'failed_batches': self.failed_batches
+            }
+
+
+dispatcher = None
+
+
+def start_slot_dispatcher(app):
+    """Create the dispatcher for this process when slot queues are enabled."""
+    global dispatcher
+    if dispatcher is None and Config.BOOKING_MODE == 'slot_queue':
+        dispatcher = SlotDispatcher(app, Config.GROUP_COMMIT_MAX_BATCH, Config.SLOT_WORKER_IDLE_TIMEOUT)
+    return dispatcher
@@ -0,0 +1,78 @@
+"""
+Nearest-available-slot search.
+
+When a guest's slot is full, the useful answer is the closest times that are
+still open. The booking window's open slots (slots.booking_window_slots) form
+a sorted list; a search bisects into it at the requested time and walks
+outward in both directions, picking the nearer candidate at each step.
+Taken-table masks come from one range scan of slot_inventory around the
+requested time; the range doubles only if it did not hold enough open slots,
+so a search costs one query in the common case and never one query per slot.
+A slot counts as open when a table, or a set of adjacent tables, that
+seats the party is free for the party's whole stay (slots.dining_minutes).
+"""
+
+import bisect
+from datetime import timedelta
+
+from booking import stay_mask, table_masks_between
+from seating import floor_plan
+from slots import SLOT_LENGTH, booking_window_slots, dining_minutes, dining_slots, restaurant_now, slot_id
+
+# Most alternatives a single search returns
+MAX_ALTERNATIVES = 20
+
+# Half-width of the first range read around the requested slot
+INITIAL_RADIUS = timedelta(days=1)
+
+
+def outward(grid, time_slot, first, last):
+    """
+    Yield grid[first:last] ordered by distance from time_slot, nearest first
+    (earlier slot first on a tie).
+    """
+    right = max(first, min(bisect.bisect_left(grid, time_slot), last))
+    left = right - 1
+    while left >= first or right < last:
+        if right >= last or (left >= first and time_slot - grid[left] <= grid[right] - time_slot):
+            yield grid[left]
+            left -= 1
+        else:
+            yield grid[right]
+            right += 1
+
+
+def nearest_available_slots(time_slot, party_size=2, n=5):
+    """
+    Up to n slots closest to time_slot with a free table for the party, as
+    (time_slot, available_tables) pairs nearest first, where available_tables
+    counts the tables free for the party's whole stay that seat it (1 when
+    only tables pushed together do). Only future slots inside the booking window are considered.
+    """
+    grid = booking_window_slots()
+    first = bisect.bisect_left(grid, restaurant_now())
+    last = len(grid)
+    if first >= last or n <= 0:
+        return []
+
+    stay = dining_slots(dining_minutes(party_size))
+    radius = INITIAL_RADIUS
+    while True:
+        start = max(grid[first], time_slot - radius)
+        end = min(grid[last - 1], time_slot + radius)
+        # Stays starting near the end of the range run past it
+        masks = table_masks_between(start, end + (stay - 1) * SLOT_LENGTH)
+
+        found = []
+        for slot in outward(grid, time_slot, first, last):
+            if abs(slot - time_slot) > radius:
+                break  # Counts beyond the range read are unknown
+            available = floor_plan.seating_options(stay_mask(masks, slot_id(slot), stay), party_size)
+            if available:
+                found.append((slot, available))
+                if len(found) == n:
+                    return found
+
+        if start <= grid[first] and end >= grid[last - 1]:
+            return found  # The whole window was read
+        radius *= 2
@@ -0,0 +1,180 @@
+"""
+Time slot helpers shared by the reservation endpoints.
+
+The frontend sends UTC ISO strings (Date.toISOString()) while scripts and
+older clients send naive local timestamps. Every time slot is normalized to
+naive restaurant-local time before it touches the database, and sent back
+with its UTC offset so browsers in any timezone read it correctly.
+"""
+
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from config import Config
+
+RESTAURANT_TZ = ZoneInfo(Config.TIMEZONE)
+
+
+def parse_time_slot(value):
+    """Parse an ISO timestamp into naive restaurant-local time."""
+    time_slot = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if time_slot.tzinfo is not None:
+        time_slot = time_slot.astimezone(RESTAURANT_TZ).replace(tzinfo=None)
+    return time_slot.replace(second=0, microsecond=0)
+
+
+def format_time_slot(time_slot):
+    """ISO timestamp with the restaurant's UTC offset."""
+    return time_slot.replace(tzinfo=RESTAURANT_TZ).isoformat()
+
+
+# Reservations are taken every half hour while the restaurant is open
+SLOT_MINUTES = 30
+SLOT_LENGTH = timedelta(minutes=SLOT_MINUTES)
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+# Integer slot ids count half-hour buckets from this (local) epoch
+SLOT_EPOCH = datetime(1970, 1, 1)
+EPOCH_WEEKDAY = SLOT_EPOCH.weekday()
+
+
+def slot_id(time_slot):
+    """Integer id of a (naive local) time slot's half-hour bucket."""
+    return (time_slot - SLOT_EPOCH) // SLOT_LENGTH
+
+
+def first_slot_id_from(time_slot):
+    """Id of the first slot starting at or after time_slot."""
+    return -(-(time_slot - SLOT_EPOCH) // SLOT_LENGTH)
+
+
+def slot_from_id(value):
+    return SLOT_EPOCH + value * SLOT_LENGTH
+
+
+def dining_minutes(party_size):
+    """How long a party keeps its table (Config.DINING_MINUTES_BY_PARTY, else Config.DINING_MINUTES)."""
+    for smallest, largest, minutes in Config.DINING_MINUTES_BY_PARTY:
+        if smallest <= party_size <= largest:
+            return minutes
+    return Config.DINING_MINUTES
+
+
+def dining_slots(minutes):
+    """Half-hour slots a table stays taken for a stay of `minutes`, starting with the booked one."""
+    return max(1, -(-minutes // SLOT_MINUTES))
+
+
+# Most slots any configured stay covers; bounds how far back a slot's
+# occupants can have started
+MAX_DINING_SLOTS = max(
+    [dining_slots(Config.DINING_MINUTES)]
+    + [dining_slots(minutes) for _, _, minutes in Config.DINING_MINUTES_BY_PARTY]
+)
+
+
+def day_number(day):
+    """Days between the epoch and a date."""
+    return (day - SLOT_EPOCH.date()).days
+
+
+def hours_mask(hours):
+    """Bitset of the half-hour buckets in a day that are open (bit n = bucket n)."""
+    if not hours:
+        return 0
+    first = int(hours['open'] * 60) // SLOT_MINUTES
+    last = int(hours['close'] * 60) // SLOT_MINUTES
+    return ((1 << last) - 1) & ~((1 << first) - 1)
+
+
+class SlotGrid:
+    """
+    Bookable half-hour slots compiled from the weekly business hours into one
+    bitset per weekday, with a per-date overlay for holidays, closures and
+    special hours. Checking a slot is a dict lookup and a bit test.
+    """
+
+    def __init__(self, business_hours, closed_dates=(), special_hours=None):
+        self.weekday_masks = [hours_mask(business_hours.get(day)) for day in WEEKDAYS]
+        self.overlay = {}  # day number -> bitset, replacing the weekday's hours
+        for day, hours in (special_hours or {}).items():
+            self.overlay[day_number(date.fromisoformat(day))] = hours_mask(hours)
+        for day in closed_dates:
+            self.overlay[day_number(date.fromisoformat(day))] = 0
+
+    @classmethod
+    def from_config(cls):
+        return cls(Config.BUSINESS_HOURS, Config.CLOSED_DATES, Config.SPECIAL_HOURS)
+
+    def day_mask(self, number):
+        mask = self.overlay.get(number)
+        if mask is None:
+            mask = self.weekday_masks[(number + EPOCH_WEEKDAY) % 7]
+        return mask
+
+    def is_open(self, value):
+        """True if the restaurant takes reservations in the slot with this id."""
+        number, bucket = divmod(value, SLOTS_PER_DAY)
+        return (self.day_mask(number) >> bucket) & 1 == 1
+
+    def slot_ids(self, start_date, days):
+        """Ids of every open slot for `days` days starting at `start_date`, in order."""
+        first_day = day_number(start_date)
+        for number in range(first_day, first_day + days):
+            mask = self.day_mask(number)
+            bucket = 0
+            while mask:
+                if mask & 1:
+                    yield number * SLOTS_PER_DAY + bucket
+                mask >>= 1
+                bucket += 1
+
+
+slot_grid = SlotGrid.from_config()
+
+
+def business_slots(start_date, days):
+    """Yield every bookable time slot for `days` days starting at `start_date`."""
+    for value in slot_grid.slot_ids(start_date, days):
+        yield slot_from_id(value)
+
+
+def restaurant_now():
+    return datetime.now(RESTAURANT_TZ).replace(tzinfo=None)
+
+
+def booking_window_ids():
+    """First and last slot id inside the booking window, starting from now."""
+    now = restaurant_now()
+    first = first_slot_id_from(now)
+    last_day = day_number(now.date()) + Config.RESERVATION_ADVANCE_DAYS
+    return first, (last_day + 1) * SLOTS_PER_DAY - 1
+
+
+def is_bookable(time_slot):
+    """
+    True if time_slot starts a half-hour slot during business hours, in the
+    future and inside the booking window. Runs before any database access.
+    """
+    if (time_slot - SLOT_EPOCH) % SLOT_LENGTH:
+        return False
+    value = slot_id(time_slot)
+    first, last = booking_window_ids()
+    return first <= value <= last and slot_grid.is_open(value)
+
+
+# Day the window's slot list was built for, and the list itself
+_window_day = None
+_window_slots = []
+
+
+def booking_window_slots():
+    """Sorted open slots from the start of today through the end of the booking window."""
+    global _window_day, _window_slots
+    today = restaurant_now().date()
+    if _window_day != today:
+        _window_slots = list(business_slots(today, Config.RESERVATION_ADVANCE_DAYS + 1))
+        _window_day = today
+    return _window_slots
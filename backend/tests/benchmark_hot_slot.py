@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Latency benchmark for a single hot time slot under many concurrent clients
+
+Start the backend with the booking mode to measure, e.g.
+
+    BOOKING_MODE=slot_queue python app.py
+
+then run this script. Every client books the same slot at once; 30 get a
+table and the rest are told the slot is full. Run it once per BOOKING_MODE
+(direct, group_commit, slot_queue) and compare the percentiles.
+"""
+
+import requests
+import statistics
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+BASE_URL = 'http://localhost:5000'
+
+def book(time_slot, run_id, i):
+    data = {
+        'customer_name': f'Hot Slot {i}',
+        'email': f'hot_{run_id}_{i}@test.com',
+        'phone': '1234567890',
+        'time_slot': time_slot,
+        'number_of_guests': 2
+    }
+    started = time.perf_counter()
+    try:
+        response = requests.post(f'{BASE_URL}/api/reservations', json=data)
+        status = response.status_code
+    except Exception:
+        status = 'error'
+    return time.perf_counter() - started, status
+
+def percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def benchmark_hot_slot(clients=200):
+    # A distinct slot per run so repeated runs start from an empty slot
+    run_id = uuid.uuid4().hex[:8]
+    day = datetime.now() + timedelta(days=6 + int(run_id, 16) % 20)
+    time_slot = day.replace(hour=19, minute=0, second=0, microsecond=0).strftime('%Y-%m-%d %H:%M:%S')
+    
+    print('🔥 Hot Slot Benchmark')
+    print('=' * 50)
+    print(f'Time Slot: {time_slot}')
+    print(f'Concurrent clients: {clients}')
+    print('=' * 50)
+    
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        started = time.perf_counter()
+        results = list(pool.map(lambda i: book(time_slot, run_id, i), range(clients)))
+        elapsed = time.perf_counter() - started
+    
+    latencies = sorted(latency * 1000 for latency, _ in results)
+    statuses = {}
+    for _, status in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    
+    print(f'Responses by status: {statuses}')
+    print(f'Wall time:  {elapsed:.2f} s ({clients / elapsed:.0f} requests/s)')
+    print(f'Mean:       {statistics.mean(latencies):.1f} ms')
+    print(f'p50:        {percentile(latencies, 50):.1f} ms')
+    print(f'p95:        {percentile(latencies, 95):.1f} ms')
+    print(f'p99:        {percentile(latencies, 99):.1f} ms')
+    print(f'Max:        {latencies[-1]:.1f} ms')
+    
+    if statuses.get(201, 0) > 30:
+        print('❌ OVERBOOKING: more than 30 tables were booked')
+
+if __name__ == "__main__":
+    benchmark_hot_slot(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
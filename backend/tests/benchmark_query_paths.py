@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+CPU and allocation microbenchmark for the reservation, availability and
+newsletter query paths
+
+Runs in-process against the database in DATABASE_URL (no server needed):
+
+    python tests/benchmark_query_paths.py [iterations]
+
+Each path is timed in its earlier form and in its current form:
+
+- reservation: loading Reservation objects to list booked table numbers and
+  scanning them for free tables, versus locking the slot's inventory row
+  and reading the free tables from its bitmask;
+- availability and newsletter: text() statements run through the ORM
+  session, versus column-only Core statements run on its connection.
+
+Every call is followed by a rollback, so nothing is written and both forms
+pay the same transaction overhead. CPU time comes from time.process_time
+(this process only, so database time is excluded). Allocations are the
+tracemalloc peak per call.
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import app
+from booking import TOTAL_TABLES, booked_count, booked_counts_between, free_tables, lock_slot_inventory
+from customers import upsert_customer
+from models import Reservation, db
+from slots import slot_id
+
+# The statements these paths used before they moved to Core
+OLD_READ_INVENTORY_SQL = text("SELECT booked_count FROM slot_inventory WHERE slot_id = :slot_id")
+
+OLD_READ_INVENTORY_RANGE_SQL = text("""
+    SELECT slot_id, booked_count
+    FROM slot_inventory
+    WHERE slot_id BETWEEN :first AND :last AND booked_count > 0
+    ORDER BY slot_id
+""")
+
+OLD_UPSERT_CUSTOMER_SQL = text("""
+    INSERT INTO customers (name, email, phone, newsletter_signup, created_at)
+    VALUES (:name, :email, :phone, :newsletter_signup, :created_at)
+    ON CONFLICT (email) DO UPDATE
+    SET newsletter_signup = COALESCE(customers.newsletter_signup, FALSE) OR EXCLUDED.newsletter_signup
+    RETURNING id, (xmax = 0) AS created
+""")
+
+
+def busiest_slot():
+    """The slot with the most reservations, so the ORM path has rows to load"""
+    row = db.session.execute(text("""
+        SELECT time_slot FROM reservations GROUP BY time_slot ORDER BY COUNT(*) DESC LIMIT 1
+    """)).first()
+    db.session.rollback()
+    if row is not None:
+        return row.time_slot
+    return (datetime.now() + timedelta(days=7)).replace(hour=19, minute=0, second=0, microsecond=0)
+
+
+def measure(call, iterations):
+    """(CPU microseconds per call, peak KiB allocated per call)"""
+    for _ in range(10):
+        call()
+        db.session.rollback()
+
+    started = time.process_time()
+    for _ in range(iterations):
+        call()
+        db.session.rollback()
+    cpu = (time.process_time() - started) / iterations * 1e6
+
+    peaks = []
+    tracemalloc.start()
+    for _ in range(min(iterations, 200)):
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        call()
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+        db.session.rollback()
+    tracemalloc.stop()
+    return cpu, sum(peaks) / len(peaks) / 1024
+
+
+def benchmark_query_paths(iterations=2000):
+    with app.app_context():
+        time_slot = busiest_slot()
+        end = time_slot + timedelta(days=7)
+        first, last = slot_id(time_slot), slot_id(end)
+        customer = {
+            'name': 'Benchmark Guest', 'email': 'benchmark_query_paths@test.com', 'phone': '',
+            'newsletter_signup': True, 'created_at': datetime.utcnow(),
+        }
+
+        def orm_free_tables():
+            reservations = Reservation.query.filter_by(slot_id=first).all()
+            booked_tables = [r.table_number for r in reservations]
+            return [t for t in range(1, TOTAL_TABLES + 1) if t not in booked_tables]
+
+        paths = [
+            ('reservation: free tables',
+             orm_free_tables,
+             lambda: free_tables(lock_slot_inventory(time_slot)[1])),
+            ('availability: one slot',
+             lambda: db.session.execute(OLD_READ_INVENTORY_SQL, {'slot_id': first}).scalar(),
+             lambda: booked_count(time_slot)),
+            ('availability: 7-day range',
+             lambda: {row.slot_id: row.booked_count for row in db.session.execute(
+                 OLD_READ_INVENTORY_RANGE_SQL, {'first': first, 'last': last})},
+             lambda: booked_counts_between(time_slot, end)),
+            ('newsletter: upsert customer',
+             lambda: db.session.execute(OLD_UPSERT_CUSTOMER_SQL, customer).one(),
+             lambda: upsert_customer(customer['email'], customer['name'], newsletter_signup=True)),
+        ]
+
+        print('⏱️  Query Path Microbenchmark')
+        print('=' * 78)
+        print(f'Time Slot: {time_slot}   Iterations: {iterations}')
+        print('=' * 78)
+        print(f"{'path':<30}{'before µs':>11}{'after µs':>11}{'before KiB':>13}{'after KiB':>12}")
+        for name, before, after in paths:
+            before_cpu, before_kib = measure(before, iterations)
+            after_cpu, after_kib = measure(after, iterations)
+            print(f'{name:<30}{before_cpu:>11.1f}{after_cpu:>11.1f}{before_kib:>13.1f}{after_kib:>12.1f}')
+
+
+if __name__ == "__main__":
+    benchmark_query_paths(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
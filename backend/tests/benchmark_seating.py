@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Seating simulation: best-fit allocator vs random table choice
+
+Runs in-process against the configured floor plan (Config.TABLE_LAYOUT); no
+server or database needed:
+
+    python tests/benchmark_seating.py [nights] [demand]
+
+Every night each half-hour slot gets a stream of requests with a typical
+mix of party sizes. There are `demand` times as many requests as the floor
+has seats, arriving in random order. Both policies see the same requests:
+
+- random: a random free table that seats the party. This is the old
+  random.choice over free tables, made capacity-aware; the old code ignored
+  party size completely.
+- best fit: seating.floor_plan.best_fit, the smallest free table that seats
+  the party.
+
+Reports guests seated per night, parties turned away and seat utilization.
+
+It then times FloorPlan.seat for parties too large for any one table, on
+the configured floor plan and on a generated 100-table grid. Each search
+runs against random half-booked slots, once cold and once from the memo.
+"""
+
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from seating import FloorPlan, floor_plan
+
+SLOTS_PER_NIGHT = 12  # 5 PM - 11 PM in half hours
+
+# Party size -> relative frequency
+PARTY_MIX = {1: 4, 2: 40, 3: 12, 4: 22, 5: 8, 6: 7, 7: 3, 8: 4}
+
+# Distinct taken-table masks per combination-search timing run
+SEARCH_MASKS = 2000
+
+
+def grid_plan(rows=10, columns=10, seats=4):
+    """rows x columns four-tops, each adjacent to its neighbours in its row and column"""
+    tables = rows * columns
+    adjacency = [tuple(range(r * columns + 1, (r + 1) * columns + 1)) for r in range(rows)]
+    adjacency += [tuple(range(c + 1, tables + 1, columns)) for c in range(columns)]
+    return FloorPlan([(1, tables, seats, 'main')], tables, adjacency, max_combined=3, cache_size=SEARCH_MASKS * 2)
+
+
+def random_fit(taken_mask, party_size, rng):
+    fitting = [
+        number for number in range(1, floor_plan.total_tables + 1)
+        if not taken_mask >> (number - 1) & 1 and floor_plan.capacity[number] >= party_size
+    ]
+    return rng.choice(fitting) if fitting else None
+
+
+def best_fit(taken_mask, party_size, rng):
+    return floor_plan.best_fit(taken_mask, party_size)
+
+
+def simulate(policy, nights, demand, seed):
+    # Separate generators so both policies get the same request stream
+    requests_rng = random.Random(seed)
+    policy_rng = random.Random(seed + 1)
+    sizes, weights = zip(*PARTY_MIX.items())
+    mean_party = sum(size * weight for size, weight in PARTY_MIX.items()) / sum(weights)
+    requests_per_slot = int(floor_plan.total_seats * demand / mean_party)
+    seated_per_night = []
+    turned_away = 0
+    elapsed = 0.0
+    assignments = 0
+    for _ in range(nights):
+        seated = 0
+        for _ in range(SLOTS_PER_NIGHT):
+            taken = 0
+            for party_size in requests_rng.choices(sizes, weights, k=requests_per_slot):
+                started = time.perf_counter()
+                table_number = policy(taken, party_size, policy_rng)
+                elapsed += time.perf_counter() - started
+                assignments += 1
+                if table_number is None:
+                    turned_away += 1
+                    continue
+                taken |= 1 << (table_number - 1)
+                seated += party_size
+        seated_per_night.append(seated)
+    return seated_per_night, turned_away, elapsed / assignments * 1e6
+
+
+def benchmark_seating(nights=200, demand=1.0):
+    capacity_per_night = floor_plan.total_seats * SLOTS_PER_NIGHT
+    print('🪑 Seating Simulation')
+    print('=' * 70)
+    print(f'Tables: {floor_plan.total_tables}   Seats: {floor_plan.total_seats}   '
+          f'Nights: {nights}   Demand: {demand:.0%} of seats')
+    print('=' * 70)
+    print(f"{'policy':<12}{'guests/night':>14}{'utilization':>13}{'turned away':>13}{'µs/assign':>12}")
+    for name, policy in [('random', random_fit), ('best fit', best_fit)]:
+        seated, turned_away, micros = simulate(policy, nights, demand, seed=42)
+        mean = statistics.fmean(seated)
+        print(f'{name:<12}{mean:>14.1f}{mean / capacity_per_night:>13.1%}'
+              f'{turned_away / nights:>13.1f}{micros:>12.2f}')
+
+
+def time_search(plan, party_size, rng):
+    """(cold µs, memoized µs, share seated) for one party size over random half-booked slots"""
+    masks = [
+        sum(1 << (number - 1) for number in range(1, plan.total_tables + 1) if rng.random() < 0.5)
+        for _ in range(SEARCH_MASKS)
+    ]
+    timings = []
+    for _ in range(2):
+        started = time.perf_counter()
+        seated = sum(plan.seat(mask, party_size) is not None for mask in masks)
+        timings.append((time.perf_counter() - started) / len(masks) * 1e6)
+    return timings[0], timings[1], seated / len(masks)
+
+
+def benchmark_combinations():
+    rng = random.Random(7)
+    print()
+    print('🔗 Combined-Table Search')
+    print('=' * 70)
+    print(f"{'floor plan':<22}{'party':>6}{'cold µs':>11}{'memo µs':>11}{'seated':>10}")
+    for name, plan, parties in [
+        (f'configured ({floor_plan.total_tables})', floor_plan, [10, 12, 16]),
+        ('grid (100)', grid_plan(), [6, 10, 12]),
+    ]:
+        for party_size in parties:
+            plan._search.cache_clear()
+            cold, warm, seated = time_search(plan, party_size, rng)
+            print(f'{name:<22}{party_size:>6}{cold:>11.1f}{warm:>11.2f}{seated:>10.0%}')
+
+
+if __name__ == "__main__":
+    benchmark_seating(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 200,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    )
+    benchmark_combinations()
@@ -95,9 +95,9 @@ class CafeFausseTester:
         """Test 3: Single Reservation Creation"""
         try:
             # Use a unique future time slot based on current time to avoid conflicts
-            # Using days=4 and current hour + 1 to ensure it's in the future and different from overbooking test
+            # Using days=4 and a business-hours slot to ensure it's in the future and different from overbooking test
             now = datetime.now()
-            future_time = (now + timedelta(days=4)).replace(hour=(now.hour + 1) % 24, minute=0, second=0, microsecond=0).strftime('%Y-%m-%dT%H:%M:%S')
+            future_time = (now + timedelta(days=4)).replace(hour=20, minute=0, second=0, microsecond=0).strftime('%Y-%m-%dT%H:%M:%S')
             
             data = {
                 "customer_name": "Demo Customer",
@@ -130,9 +130,9 @@ class CafeFausseTester:
         print("="*60)
         
         # Use a time slot based on current time to avoid conflicts
-        # Using days=2 and current hour to ensure it's in the future
+        # Using days=2 and a business-hours slot to ensure it's in the future
         now = datetime.now()
-        test_time = (now + timedelta(days=2)).replace(hour=now.hour, minute=0, second=0, microsecond=0).strftime('%Y-%m-%dT%H:%M:%S')
+        test_time = (now + timedelta(days=2)).replace(hour=18, minute=0, second=0, microsecond=0).strftime('%Y-%m-%dT%H:%M:%S')
         
         self.log_test("Overbooking Test Setup", "INFO", 
             f"Testing time slot: {test_time}")
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Verify that moving and cancelling a reservation gives its table back straight away
+"""
+
+import requests
+import uuid
+from datetime import datetime, timedelta
+
+URL = 'http://localhost:5000/api/reservations'
+CHECK_URL = 'http://localhost:5000/api/reservations/check'
+
+def available_tables(time_slot):
+    return requests.get(CHECK_URL, params={'time_slot': time_slot}).json()['available_tables']
+
+def test_cancel_change():
+    # Use a future evening that the other tests don't touch
+    start = (datetime.now() + timedelta(days=9)).replace(hour=18, minute=0, second=0, microsecond=0)
+    first_slot = start.strftime('%Y-%m-%d %H:%M:%S')
+    # 19:30 is open every day and clear of the first booking's stay
+    later_slot = (start + timedelta(hours=1, minutes=30)).strftime('%Y-%m-%d %H:%M:%S')
+    email = f'change_{uuid.uuid4().hex[:8]}@test.com'
+
+    print('🧪 Cancel and Change Test')
+    print('=' * 50)
+    print(f'Booked Slot: {first_slot}   Moved To: {later_slot}')
+    print('=' * 50)
+
+    try:
+        before = [available_tables(first_slot), available_tables(later_slot)]
+        response = requests.post(URL, json={
+            'customer_name': 'Change Test',
+            'email': email,
+            'phone': '1234567890',
+            'time_slot': first_slot,
+            'number_of_guests': 2
+        })
+        if response.status_code != 201:
+            print(f'❌ Booking failed: {response.status_code} - {response.json().get("error")}')
+            return
+        reservation_id = response.json()['reservation_id']
+        print(f'Booking: #{reservation_id} at table {response.json()["table_number"]}')
+
+        wrong_email = requests.delete(f'{URL}/{reservation_id}', params={'email': 'someone_else@test.com'})
+        moved = requests.patch(f'{URL}/{reservation_id}', json={'email': email, 'time_slot': later_slot})
+        after_move = [available_tables(first_slot), available_tables(later_slot)]
+        cancelled = requests.delete(f'{URL}/{reservation_id}', params={'email': email})
+        after_cancel = [available_tables(first_slot), available_tables(later_slot)]
+        cancelled_again = requests.delete(f'{URL}/{reservation_id}', params={'email': email})
+    except Exception as e:
+        print(f'💥 ERROR - {e}')
+        return
+
+    checks = [
+        ('Wrong email is rejected', wrong_email.status_code == 404),
+        ('Move keeps the reservation id',
+         moved.status_code == 200 and moved.json().get('reservation_id') == reservation_id),
+        ('Move frees the first slot and takes the later one', after_move == [before[0], before[1] - 1]),
+        ('Cancel frees the later slot', cancelled.status_code == 200 and after_cancel == before),
+        ('Second cancel finds nothing', cancelled_again.status_code == 404),
+    ]
+    for name, passed in checks:
+        print(f'{"✅" if passed else "❌"} {name}')
+
+    if all(passed for _, passed in checks):
+        print('✅ CANCEL AND CHANGE: WORKING - freed tables are available immediately')
+    else:
+        print('❌ CANCEL AND CHANGE: NEEDS INVESTIGATION')
+        print(f'   Free tables before {before}, after move {after_move}, after cancel {after_cancel}')
+
+if __name__ == "__main__":
+    test_cancel_change()
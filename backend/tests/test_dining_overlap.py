@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Verify that a booking keeps its table for the party's whole stay, not just its own time slot
+"""
+
+import requests
+import uuid
+from datetime import datetime, timedelta
+
+CHECK_URL = 'http://localhost:5000/api/reservations/check'
+
+def available_tables(time_slot):
+    return requests.get(CHECK_URL, params={'time_slot': time_slot}).json()['available_tables']
+
+def test_dining_overlap():
+    url = 'http://localhost:5000/api/reservations'
+    # Use a future evening that the other tests don't touch
+    start = (datetime.now() + timedelta(days=6)).replace(hour=18, minute=0, second=0, microsecond=0)
+    slots = [(start + timedelta(minutes=30 * i)).strftime('%Y-%m-%d %H:%M:%S') for i in range(5)]
+
+    data = {
+        'customer_name': 'Overlap Test',
+        'email': f'overlap_{uuid.uuid4().hex[:8]}@test.com',
+        'phone': '1234567890',
+        'time_slot': slots[0],
+        'number_of_guests': 2
+    }
+
+    print('🧪 Dining Duration Test')
+    print('=' * 50)
+    print(f'Booked Slot: {slots[0]}')
+    print('=' * 50)
+
+    try:
+        before = [available_tables(slot) for slot in slots]
+        response = requests.post(url, json=data)
+        after = [available_tables(slot) for slot in slots]
+    except Exception as e:
+        print(f'💥 ERROR - {e}')
+        return
+
+    if response.status_code != 201:
+        print(f'❌ Booking failed: {response.status_code} - {response.json().get("error")}')
+        return
+    result = response.json()
+    minutes = result['duration_minutes']
+    covered = -(-minutes // 30)
+    print(f'Booking: Table {result["table_number"]} for {minutes} minutes')
+
+    expected = [1 if i < covered else 0 for i in range(len(slots))]
+    taken = [b - a for b, a in zip(before, after)]
+    for slot, used in zip(slots, taken):
+        print(f'  {slot}: {used} table(s) taken by this booking')
+
+    if taken == expected:
+        print(f'✅ DINING DURATION: WORKING - the table is taken for {covered} slots and free after')
+    else:
+        print('❌ DINING DURATION: NEEDS INVESTIGATION')
+        print(f'   Expected {expected}, got {taken}')
+
+if __name__ == "__main__":
+    test_dining_overlap()
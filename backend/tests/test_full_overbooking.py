@@ -11,10 +11,10 @@ from datetime import datetime, timedelta
 def test_full_overbooking():
     url = 'http://localhost:5000/api/reservations'
     # Use a dynamic future time slot based on current time to avoid conflicts
-    # Using days=3 and current hour to ensure it's in the future and different from system health check
+    # Using days=3 and a business-hours slot (open every day) to ensure it's in the future and different from system health check
     now = datetime.now()
     future_date = now + timedelta(days=3)
-    time_slot = future_date.replace(hour=now.hour, minute=0, second=0, microsecond=0).strftime('%Y-%m-%d %H:%M:%S')
+    time_slot = future_date.replace(hour=18, minute=0, second=0, microsecond=0).strftime('%Y-%m-%d %H:%M:%S')
     
     print('🧪 Comprehensive Overbooking Test')
     print('=' * 50)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Verify that a cancellation in a full slot seats the first party on its waitlist
+"""
+
+import requests
+import uuid
+from datetime import datetime, timedelta
+
+URL = 'http://localhost:5000/api/reservations'
+WAITLIST_URL = 'http://localhost:5000/api/waitlist'
+
+def reservation(email, time_slot, **extra):
+    return {
+        'customer_name': 'Waitlist Test',
+        'email': email,
+        'phone': '1234567890',
+        'time_slot': time_slot,
+        'number_of_guests': 2,
+        **extra
+    }
+
+def test_waitlist():
+    # Use a future evening that the other tests don't touch
+    time_slot = (datetime.now() + timedelta(days=11)).replace(
+        hour=19, minute=0, second=0, microsecond=0
+    ).strftime('%Y-%m-%d %H:%M:%S')
+    email = f'waitlist_{uuid.uuid4().hex[:8]}@test.com'
+    waiting_email = f'waiting_{uuid.uuid4().hex[:8]}@test.com'
+
+    print('🧪 Waitlist Promotion Test')
+    print('=' * 50)
+    print(f'Time Slot: {time_slot}')
+    print('=' * 50)
+
+    try:
+        # Fill the slot
+        booked = []
+        for _ in range(40):
+            response = requests.post(URL, json=reservation(email, time_slot))
+            if response.status_code != 201:
+                break
+            booked.append(response.json()['reservation_id'])
+        print(f'Booked {len(booked)} tables before the slot was full')
+
+        joined = requests.post(URL, json=reservation(waiting_email, time_slot, join_waitlist=True))
+        if joined.status_code != 202:
+            print(f'❌ Joining the waitlist failed: {joined.status_code} - {joined.json().get("error")}')
+            return
+        waitlist_id = joined.json()['waitlist_id']
+        print(f'Waitlist entry: #{waitlist_id}')
+
+        before = requests.get(f'{WAITLIST_URL}/{waitlist_id}', params={'email': waiting_email}).json()
+        cancelled = requests.delete(f'{URL}/{booked[-1]}', params={'email': email})
+        after = requests.get(f'{WAITLIST_URL}/{waitlist_id}', params={'email': waiting_email}).json()
+    except Exception as e:
+        print(f'💥 ERROR - {e}')
+        return
+
+    checks = [
+        ('Waiting before the cancellation', before.get('status') == 'waiting'),
+        ('Cancellation succeeded', cancelled.status_code == 200),
+        ('Promoted by the cancellation', after.get('status') == 'confirmed' and after.get('reservation_id')),
+    ]
+    for name, passed in checks:
+        print(f'{"✅" if passed else "❌"} {name}')
+
+    if all(passed for _, passed in checks):
+        print(f'✅ WAITLIST: WORKING - the waiting party got reservation #{after["reservation_id"]}')
+    else:
+        print('❌ WAITLIST: NEEDS INVESTIGATION')
+        print(f'   Before: {before}   After: {after}')
+
+if __name__ == "__main__":
+    test_waitlist()
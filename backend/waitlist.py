@@ -0,0 +1,223 @@
+"""
+Waitlist for fully booked slots.
+
+A guest turned away from a full slot can ask to wait for it
+(join_waitlist in POST /api/reservations). The request is stored in the
+waitlist table and queued in memory (waitlist_queue), by party size and
+then by request time.
+
+Whenever tables are given back - a cancellation, a change, a hold released
+or expired - the transaction that gives them back also promotes waiting
+parties whose stay covers a slot where the tables came free. That includes
+parties waiting for up to MAX_DINING_SLOTS - 1 slots earlier, who would
+still be at the table then. Start slots are tried in order and, in each,
+the largest waiting party first, since that party is the one the freed
+tables fit best. Within a party size the earliest request wins, and the
+next one is seated after it until no party of that size fits what is left
+for its whole stay.
+
+The caller locks promotion_window of the freed slots before giving the
+tables back, so the inventory rows promotion needs are taken in slot order,
+like a booking takes them, and the two cannot deadlock.
+
+Promotion books through booking.allocate_table, so a promoted party gets
+the same tables, inventory updates and backstops as any booking. Its
+waitlist row records the reservation_id, which the guest can look up with
+GET /api/waitlist/<id>.
+"""
+
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import text
+
+from booking import SlotFullError, TableAllocationError, allocate_table, lock_inventories, stay_mask, tables_mask
+from models import db
+from seating import floor_plan
+from slots import (
+    MAX_DINING_SLOTS, dining_minutes, dining_slots, first_slot_id_from, restaurant_now, slot_from_id, slot_grid,
+    slot_id
+)
+from waitlist_queue import waitlist_queue
+
+# A promoted party: the waitlist entry it came from and its booking
+Promotion = namedtuple('Promotion', ['entry_id', 'slot_id', 'party_size', 'allocation'])
+
+JOIN_WAITLIST_SQL = text("""
+    INSERT INTO waitlist (customer_id, time_slot, slot_id, party_size, requested_at)
+    VALUES (:customer_id, :time_slot, :slot_id, :party_size, :requested_at)
+    RETURNING id, requested_at
+""")
+
+# One slot's waiting parties, read through the partial index on slot_id
+LOAD_WAITING_SQL = text("""
+    SELECT id, party_size, requested_at
+    FROM waitlist
+    WHERE slot_id = :slot_id AND reservation_id IS NULL
+""")
+
+# Waits for a concurrent promotion or departure of the same entry
+CLAIM_ENTRY_SQL = text("""
+    SELECT customer_id
+    FROM waitlist
+    WHERE id = :entry_id AND reservation_id IS NULL
+    FOR UPDATE
+""")
+
+PROMOTE_ENTRY_SQL = text("""
+    UPDATE waitlist
+    SET reservation_id = :reservation_id, promoted_at = :promoted_at
+    WHERE id = :entry_id
+""")
+
+FIND_ENTRY_SQL = text("""
+    SELECT w.id, w.time_slot, w.party_size, w.requested_at, w.reservation_id, w.promoted_at
+    FROM waitlist w
+    JOIN customers c ON c.id = w.customer_id
+    WHERE w.id = :entry_id AND lower(c.email) = lower(:email)
+""")
+
+LEAVE_WAITLIST_SQL = text("""
+    DELETE FROM waitlist w
+    USING customers c
+    WHERE w.id = :entry_id AND c.id = w.customer_id AND lower(c.email) = lower(:email)
+      AND w.reservation_id IS NULL
+    RETURNING w.id
+""")
+
+
+def join_waitlist(customer_id, time_slot, party_size):
+    """
+    Add a party to a slot's waitlist inside the caller's transaction and
+    return the new entry's (id, requested_at). Pass them to queue_entry once
+    the transaction commits.
+    """
+    return db.session.execute(JOIN_WAITLIST_SQL, {
+        'customer_id': customer_id,
+        'time_slot': time_slot,
+        'slot_id': slot_id(time_slot),
+        'party_size': party_size,
+        'requested_at': datetime.utcnow(),
+    }).one()
+
+
+def queue_entry(entry_id, requested_at, time_slot, party_size):
+    """Queue a committed waitlist entry in this process."""
+    waitlist_queue.push(slot_id(time_slot), entry_id, party_size, requested_at)
+
+
+def find_entry(entry_id, email):
+    """The guest's waitlist entry, waiting or promoted, or None."""
+    return db.session.execute(FIND_ENTRY_SQL, {'entry_id': entry_id, 'email': email}).first()
+
+
+def leave_waitlist(entry_id, email):
+    """
+    Remove a party that is still waiting. Returns False if there was no
+    such entry (or it was already promoted). It leaves this process's queue
+    when it reaches the head.
+    """
+    removed = db.session.execute(LEAVE_WAITLIST_SQL, {'entry_id': entry_id, 'email': email}).first()
+    db.session.commit()
+    return removed is not None
+
+
+def load_slot(value):
+    """Read a slot's waiting parties into the queue unless it is already there."""
+    if not waitlist_queue.is_loaded(value):
+        marker = waitlist_queue.load_marker()
+        rows = db.session.execute(LOAD_WAITING_SQL, {'slot_id': value})
+        waitlist_queue.load(value, [(row.id, row.party_size, row.requested_at) for row in rows], marker)
+
+
+def claim_next(value, party_size, passed):
+    """
+    Lock the earliest entry still waiting for a party size in a slot, other
+    than those in passed, and return (entry_id, customer_id). Entries that
+    left or were seated elsewhere are added to passed. (None, None) if
+    nobody else is waiting.
+    """
+    while True:
+        entry_id = next(
+            (entry_id for entry_id in waitlist_queue.heads(value, party_size, len(passed) + 1)
+             if entry_id not in passed),
+            None
+        )
+        if entry_id is None:
+            return None, None
+        customer_id = db.session.execute(CLAIM_ENTRY_SQL, {'entry_id': entry_id}).scalar()
+        if customer_id is not None:
+            return entry_id, customer_id
+        passed.add(entry_id)
+        waitlist_queue.remove_head(value, party_size, entry_id)
+
+
+def promotion_window(slot_ids):
+    """
+    Ids of the inventory rows promoting parties into the freed slot_ids can
+    touch: every start slot whose stay covers one of them, and those stays.
+    """
+    return range(min(slot_ids) - (MAX_DINING_SLOTS - 1), max(slot_ids) + MAX_DINING_SLOTS)
+
+
+def promote_waiting(counts, tables_changed):
+    """
+    Seat waiting parties whose stay covers a slot of counts, the {slot_id:
+    booked count} of slots where tables were just given back, inside the
+    caller's transaction. The caller must already hold the locks of
+    promotion_window(counts). Each booking's new counts and tables taken
+    are added to counts and tables_changed, so the caller notifies and
+    publishes them with its own. Returns the Promotions; pass them to
+    finish_promotions after the commit.
+    """
+    promotions = []
+    if not counts:
+        return promotions
+    freed = set(counts)
+    first_start = max(min(freed) - (MAX_DINING_SLOTS - 1), first_slot_id_from(restaurant_now()))
+    # A hold can expire after its slot has started, so past starts are skipped
+    starts = [value for value in range(first_start, max(freed) + 1) if slot_grid.is_open(value)]
+    for value in starts:
+        load_slot(value)
+    waiting = {value: waitlist_queue.party_sizes(value) for value in starts}
+    if not any(waiting.values()):
+        return promotions
+
+    masks = lock_inventories(promotion_window(freed))
+    for value in starts:
+        for party_size in waiting[value]:
+            stay = dining_slots(dining_minutes(party_size))
+            if freed.isdisjoint(range(value, value + stay)):
+                continue  # Nothing came free during this party's stay
+            passed = set()
+            while floor_plan.seat(stay_mask(masks, value, stay), party_size) is not None:
+                entry_id, customer_id = claim_next(value, party_size, passed)
+                if entry_id is None:
+                    break
+                try:
+                    allocation = allocate_table(customer_id, slot_from_id(value), party_size)
+                except (SlotFullError, TableAllocationError):
+                    break
+                db.session.execute(PROMOTE_ENTRY_SQL, {
+                    'entry_id': entry_id,
+                    'reservation_id': allocation.reservation_id,
+                    'promoted_at': datetime.utcnow(),
+                })
+                passed.add(entry_id)
+
+                for covered, count in allocation.booked_counts.items():
+                    masks[covered] |= tables_mask(allocation.table_numbers)
+                    counts[covered] = count
+                    tables_changed[covered] = tables_changed.get(covered, 0) + len(allocation.table_numbers)
+                promotions.append(Promotion(entry_id, value, party_size, allocation))
+    return promotions
+
+
+def finish_promotions(promotions):
+    """
+    Take committed promotions off this process's queue. One still behind an
+    entry that left is dropped when it reaches the head, like that entry.
+    """
+    for promotion in promotions:
+        waitlist_queue.remove_head(promotion.slot_id, promotion.party_size, promotion.entry_id)
+    waitlist_queue.record_promotions(len(promotions))
@@ -0,0 +1,123 @@
+"""
+In-process priority queue of the parties waiting for each time slot.
+
+The waitlist table is the source of truth (see waitlist.py); this is an
+index over its rows that are still waiting, loaded one slot at a time, the
+first time a table frees up in that slot. Each slot keeps one min-heap per
+party size, ordered by request time. Finding the best-fitting party is a
+look at the head of each heap, one per party size and so at most
+floor_plan.max_party of them. Taking a party is a heappop, O(log n). When
+one event seats several parties of the same size, the next ones are read
+with heads, which only looks as deep as the parties already taken.
+
+Entries that left the waitlist, or were seated by another worker, are
+dropped lazily when they reach the head of their heap. A change another
+worker makes to a slot arrives as that slot's reservation_changed
+notification (see cache_sync), which evicts the slot here. The slot is then
+reloaded at its next event.
+"""
+
+import heapq
+import threading
+
+
+class WaitlistQueue:
+    def __init__(self):
+        self._slots = {}  # slot id -> {party size: [(requested_at, entry id)]}
+        self._stale = set()  # slots loaded while an entry was pushed to an unloaded slot
+        self._unloaded_pushes = 0
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.promoted = 0
+
+    def is_loaded(self, key):
+        with self._lock:
+            return key in self._slots and key not in self._stale
+
+    def load_marker(self):
+        """Taken before reading a slot's rows and passed to load."""
+        with self._lock:
+            return self._unloaded_pushes
+
+    def load(self, key, entries, marker):
+        """
+        Replace a slot's queue with (entry_id, party_size, requested_at)
+        rows. If an entry was pushed to an unloaded slot since marker was
+        taken, the rows may have missed it, so the slot is read again at
+        its next event.
+        """
+        buckets = {}
+        for entry_id, party_size, requested_at in entries:
+            buckets.setdefault(party_size, []).append((requested_at, entry_id))
+        for heap in buckets.values():
+            heapq.heapify(heap)
+        with self._lock:
+            self._slots[key] = buckets
+            self.loads += 1
+            if marker == self._unloaded_pushes:
+                self._stale.discard(key)
+            else:
+                self._stale.add(key)
+
+    def push(self, key, entry_id, party_size, requested_at):
+        """Queue a new entry. A slot that is not loaded picks it up from the table when it is."""
+        with self._lock:
+            buckets = self._slots.get(key)
+            if buckets is None or key in self._stale:
+                # A load of this slot may be reading the table right now
+                self._unloaded_pushes += 1
+            if buckets is not None:
+                heapq.heappush(buckets.setdefault(party_size, []), (requested_at, entry_id))
+
+    def party_sizes(self, key):
+        """Party sizes with someone waiting for the slot, largest first."""
+        with self._lock:
+            return sorted((size for size, heap in self._slots.get(key, {}).items() if heap), reverse=True)
+
+    def head(self, key, party_size):
+        """Entry id of the earliest request for this party size, or None."""
+        with self._lock:
+            heap = self._slots.get(key, {}).get(party_size)
+            return heap[0][1] if heap else None
+
+    def heads(self, key, party_size, n):
+        """Entry ids of the n earliest requests for this party size."""
+        with self._lock:
+            heap = self._slots.get(key, {}).get(party_size, [])
+            return [entry_id for _, entry_id in heapq.nsmallest(n, heap)]
+
+    def remove_head(self, key, party_size, entry_id):
+        """Pop entry_id if it is still the head of its heap."""
+        with self._lock:
+            buckets = self._slots.get(key, {})
+            heap = buckets.get(party_size)
+            if heap and heap[0][1] == entry_id:
+                heapq.heappop(heap)
+                if not heap:
+                    del buckets[party_size]
+
+    def record_promotions(self, count):
+        with self._lock:
+            self.promoted += count
+
+    def invalidate(self, key):
+        with self._lock:
+            self._slots.pop(key, None)
+            self._stale.discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._slots.clear()
+            self._stale.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'loaded_slots': len(self._slots),
+                'queued': sum(len(heap) for buckets in self._slots.values() for heap in buckets.values()),
+                'loads': self.loads,
+                'promoted': self.promoted
+            }
+
+
+waitlist_queue = WaitlistQueue()
@@ -1,5 +1,6 @@
 -- Café Fausse Database Schema
 -- PostgreSQL Database Setup
+-- Generated from backend/models.py by backend/scripts/export_schema.py - do not edit by hand
 
 -- Create database (run this command separately)
 -- CREATE DATABASE cafe_fausse;
@@ -7,29 +8,151 @@
 -- Connect to the database
 -- \c cafe_fausse;
 
--- Create customers table
+-- Tables, constraints and indexes
+CREATE SEQUENCE IF NOT EXISTS slot_write_seq;
+
 CREATE TABLE IF NOT EXISTS customers (
-    id SERIAL PRIMARY KEY,
+    id SERIAL NOT NULL,
     name VARCHAR(100) NOT NULL,
-    email VARCHAR(120) UNIQUE NOT NULL,
+    email VARCHAR(120) NOT NULL,
     phone VARCHAR(20),
-    newsletter_signup BOOLEAN DEFAULT FALSE,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    newsletter_signup BOOLEAN DEFAULT false,
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id),
+    UNIQUE (email)
+);
+
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key VARCHAR(255) NOT NULL,
+    endpoint VARCHAR(100) NOT NULL,
+    request_hash VARCHAR(64) NOT NULL,
+    status_code INTEGER,
+    response_body TEXT,
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (key, endpoint)
+);
+
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created_at ON idempotency_keys (created_at);
+
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER NOT NULL,
+    description VARCHAR(200) NOT NULL,
+    applied_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (version)
+);
+
+CREATE TABLE IF NOT EXISTS slot_inventory (
+    slot_id INTEGER NOT NULL,
+    time_slot TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    booked_count INTEGER DEFAULT 0 NOT NULL,
+    table_mask BIGINT DEFAULT 0 NOT NULL,
+    PRIMARY KEY (slot_id)
+);
+
+CREATE TABLE IF NOT EXISTS table_holds (
+    token VARCHAR(36) NOT NULL,
+    time_slot TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    slot_id INTEGER NOT NULL,
+    table_number INTEGER NOT NULL,
+    duration_minutes INTEGER NOT NULL,
+    expires_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    client VARCHAR(64),
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (token),
+    CONSTRAINT uq_table_holds_slot_table UNIQUE (slot_id, table_number)
+);
+
+CREATE TABLE IF NOT EXISTS tables (
+    table_number INTEGER NOT NULL,
+    capacity INTEGER NOT NULL,
+    zone VARCHAR(20) NOT NULL,
+    PRIMARY KEY (table_number)
 );
 
--- Create reservations table
 CREATE TABLE IF NOT EXISTS reservations (
-    id SERIAL PRIMARY KEY,
-    customer_id INTEGER NOT NULL REFERENCES customers(id) ON DELETE CASCADE,
-    time_slot TIMESTAMP NOT NULL,
-    table_number INTEGER NOT NULL CHECK (table_number >= 1 AND table_number <= 30),
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    id SERIAL NOT NULL,
+    customer_id INTEGER NOT NULL,
+    time_slot TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    slot_id INTEGER NOT NULL,
+    table_number INTEGER NOT NULL,
+    party_size INTEGER DEFAULT 2 NOT NULL,
+    duration_minutes INTEGER NOT NULL,
+    combined_with INTEGER,
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, slot_id),
+    CONSTRAINT uq_reservations_slot_table UNIQUE (slot_id, table_number),
+    CONSTRAINT reservations_table_number_check CHECK (table_number >= 1 AND table_number <= 30),
+    FOREIGN KEY(customer_id) REFERENCES customers (id) ON DELETE CASCADE
+) PARTITION BY RANGE (slot_id);
+
+CREATE INDEX IF NOT EXISTS idx_reservations_customer_id ON reservations (customer_id);
+
+CREATE INDEX IF NOT EXISTS idx_reservations_time_slot ON reservations (time_slot);
+
+CREATE TABLE IF NOT EXISTS waitlist (
+    id SERIAL NOT NULL,
+    customer_id INTEGER NOT NULL,
+    time_slot TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    slot_id INTEGER NOT NULL,
+    party_size INTEGER NOT NULL,
+    requested_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    reservation_id INTEGER,
+    promoted_at TIMESTAMP WITHOUT TIME ZONE,
+    PRIMARY KEY (id),
+    FOREIGN KEY(customer_id) REFERENCES customers (id) ON DELETE CASCADE
 );
 
--- Create indexes for better performance
-CREATE INDEX IF NOT EXISTS idx_reservations_time_slot ON reservations(time_slot);
-CREATE INDEX IF NOT EXISTS idx_reservations_customer_id ON reservations(customer_id);
-CREATE INDEX IF NOT EXISTS idx_customers_email ON customers(email);
+CREATE INDEX IF NOT EXISTS idx_waitlist_waiting ON waitlist (slot_id) WHERE reservation_id IS NULL;
+
+-- Mark every migration as applied so the app does not re-run them
+INSERT INTO schema_migrations (version, description) VALUES
+(1, 'Integer slot ids on reservations, inventory and holds'),
+(2, 'Constraints and defaults declared in the models'),
+(3, 'Indexes declared in the models'),
+(4, 'Monthly range partitions of reservations by slot_id'),
+(5, 'Party size on reservations'),
+(6, 'Combined tables on reservations'),
+(7, 'Dining durations and overlapping-stay constraints'),
+(8, 'Client address on table holds'),
+(9, 'Sequence ordering slot count changes')
+ON CONFLICT (version) DO NOTHING;
+
+-- Floor plan from Config.TABLE_LAYOUT (the app rewrites it at startup)
+INSERT INTO tables (table_number, capacity, zone) VALUES
+(1, 2, 'bar'),
+(2, 2, 'bar'),
+(3, 2, 'bar'),
+(4, 2, 'bar'),
+(5, 2, 'bar'),
+(6, 2, 'bar'),
+(7, 2, 'bar'),
+(8, 2, 'bar'),
+(9, 4, 'main'),
+(10, 4, 'main'),
+(11, 4, 'main'),
+(12, 4, 'main'),
+(13, 4, 'main'),
+(14, 4, 'main'),
+(15, 4, 'main'),
+(16, 4, 'main'),
+(17, 4, 'main'),
+(18, 4, 'main'),
+(19, 4, 'main'),
+(20, 4, 'main'),
+(21, 4, 'patio'),
+(22, 4, 'patio'),
+(23, 4, 'patio'),
+(24, 4, 'patio'),
+(25, 4, 'patio'),
+(26, 4, 'patio'),
+(27, 6, 'main'),
+(28, 6, 'main'),
+(29, 8, 'private'),
+(30, 8, 'private')
+ON CONFLICT (table_number) DO UPDATE SET capacity = EXCLUDED.capacity, zone = EXCLUDED.zone;
+
+-- Monthly partition for the sample reservations
+CREATE TABLE IF NOT EXISTS reservations_2024_12 PARTITION OF reservations (CONSTRAINT reservations_2024_12_no_overlap EXCLUDE USING gist (int4range(table_number, table_number, '[]') WITH &&, tsrange(time_slot, time_slot + duration_minutes * INTERVAL '1 minute') WITH &&)) FOR VALUES FROM (962784) TO (964272);
 
 -- Insert sample data (optional)
 INSERT INTO customers (name, email, phone, newsletter_signup) VALUES
@@ -38,7 +161,21 @@ INSERT INTO customers (name, email, phone, newsletter_signup) VALUES
 ON CONFLICT (email) DO NOTHING;
 
 -- Sample reservations (optional)
-INSERT INTO reservations (customer_id, time_slot, table_number) VALUES
-(1, '2024-12-01 19:00:00', 5),
-(2, '2024-12-01 20:30:00', 12)
+-- slot_id counts half-hour buckets (1800 seconds) since 1970-01-01 in restaurant-local time
+INSERT INTO reservations (customer_id, time_slot, slot_id, table_number, party_size, duration_minutes)
+SELECT customer_id, time_slot, FLOOR(EXTRACT(EPOCH FROM time_slot) / 1800), table_number, party_size, duration_minutes
+FROM (VALUES
+    (1, TIMESTAMP '2024-12-01 19:00:00', 5, 2, 90),
+    (2, TIMESTAMP '2024-12-01 20:30:00', 12, 4, 90)
+) AS sample(customer_id, time_slot, table_number, party_size, duration_minutes)
 ON CONFLICT DO NOTHING;
+
+-- Keep slot inventory in step with the sample reservations: each one takes
+-- its table in every half hour of its stay
+INSERT INTO slot_inventory (slot_id, time_slot, booked_count, table_mask)
+SELECT r.slot_id + c.step, MIN(r.time_slot + c.step * INTERVAL '30 minutes'), COUNT(*),
+       BIT_OR(1::bigint << (r.table_number - 1))
+FROM reservations r
+CROSS JOIN LATERAL generate_series(0, CAST(CEIL(r.duration_minutes / 30.0) AS integer) - 1) AS c(step)
+GROUP BY r.slot_id + c.step
+ON CONFLICT (slot_id) DO NOTHING;
@@ -1,26 +1,33 @@
-import React, { useState } from "react";
+import React, { useState, useRef } from "react";
 import "./Footer.css";
 
 const Footer = () => {
   const [email, setEmail] = useState("");
   const [isSubscribed, setIsSubscribed] = useState(false);
   const [isLoading, setIsLoading] = useState(false);
+  // Reused when the same email is resubmitted after a network error
+  const idempotencyKey = useRef(null);
 
   const handleNewsletterSubmit = async (e) => {
     e.preventDefault();
     if (!email) return;
 
     setIsLoading(true);
+    if (!idempotencyKey.current) {
+      idempotencyKey.current = crypto.randomUUID();
+    }
     try {
       const response = await fetch("http://localhost:5000/api/newsletter", {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
+          "Idempotency-Key": idempotencyKey.current,
         },
         body: JSON.stringify({ email }),
       });
 
       if (response.ok) {
+        idempotencyKey.current = null;
         setIsSubscribed(true);
         setEmail("");
       } else {
@@ -92,7 +99,10 @@ const Footer = () => {
                   type="email"
                   placeholder="Enter your email"
                   value={email}
-                  onChange={(e) => setEmail(e.target.value)}
+                  onChange={(e) => {
+                    idempotencyKey.current = null;
+                    setEmail(e.target.value);
+                  }}
                   required
                   className="newsletter-input"
                 />
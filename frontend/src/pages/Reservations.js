@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import "./Reservations.css";
 
 const Reservations = () => {
@@ -13,78 +13,185 @@ const Reservations = () => {
   const [isSubmitting, setIsSubmitting] = useState(false);
   const [submitStatus, setSubmitStatus] = useState(null);
   const [availableSlots, setAvailableSlots] = useState([]);
+  // Largest party the floor plan seats, from the server
+  const [maxParty, setMaxParty] = useState(null);
+  // Reused when the same form is resubmitted so the server books it only once
+  const idempotencyKey = useRef(null);
+  // Table set aside while the guest fills in the rest of the form
+  const [hold, setHold] = useState(null);
+  const holdRef = useRef(null);
+  // Bumped on every selection, so a hold that comes back late is given up
+  const holdRequest = useRef(0);
 
-  // Generate time slots for the next 30 days
-  const generateTimeSlots = () => {
-    const slots = [];
-    const today = new Date();
+  // Bookable slots come from the server's business-hours grid
+  const loadTimeSlots = async () => {
+    try {
+      const response = await fetch("http://localhost:5000/api/slots");
+      if (!response.ok) return [];
 
-    for (let i = 0; i < 30; i++) {
-      const date = new Date(today);
-      date.setDate(today.getDate() + i);
+      const data = await response.json();
+      setMaxParty(data.max_party);
+      return data.slots.map((slot) => ({
+        value: slot.time_slot,
+        label: new Date(slot.time_slot).toLocaleString("en-US", {
+          weekday: "short",
+          month: "short",
+          day: "numeric",
+          hour: "numeric",
+          minute: "2-digit",
+          hour12: true,
+        }),
+      }));
+    } catch (error) {
+      console.error("Time slot lookup error:", error);
+      return [];
+    }
+  };
 
-      // Skip if it's a past date
-      if (date < today) continue;
+  // Grey out fully booked slots using a single range availability request
+  const loadAvailability = async (slots) => {
+    if (slots.length === 0) return;
 
-      const dayOfWeek = date.getDay();
+    try {
+      const params = new URLSearchParams({
+        from: slots[0].value,
+        to: slots[slots.length - 1].value,
+      });
+      const response = await fetch(
+        `http://localhost:5000/api/availability?${params}`
+      );
+      if (!response.ok) return;
 
-      // Business hours: Mon-Sat 5PM-11PM, Sun 5PM-9PM
-      const isSunday = dayOfWeek === 0;
-      const startHour = 17; // 5 PM
-      const endHour = isSunday ? 21 : 23; // 9 PM on Sunday, 11 PM other days
+      const data = await response.json();
+      const fullSlots = new Set(
+        data.slots
+          .filter((slot) => !slot.is_available)
+          .map((slot) => new Date(slot.time_slot).getTime())
+      );
 
-      for (let hour = startHour; hour < endHour; hour++) {
-        for (let minute = 0; minute < 60; minute += 30) {
-          const slotDate = new Date(date);
-          slotDate.setHours(hour, minute, 0, 0);
+      setAvailableSlots(
+        slots.map((slot) => ({
+          ...slot,
+          isFull: fullSlots.has(new Date(slot.value).getTime()),
+        }))
+      );
+    } catch (error) {
+      // Leave every slot selectable; the booking request still checks capacity
+      console.error("Availability lookup error:", error);
+    }
+  };
 
-          slots.push({
-            value: slotDate.toISOString(),
-            label: slotDate.toLocaleString("en-US", {
-              weekday: "short",
-              month: "short",
-              day: "numeric",
-              hour: "numeric",
-              minute: "2-digit",
-              hour12: true,
-            }),
-          });
-        }
-      }
+  useEffect(() => {
+    const loadSlots = async () => {
+      const slots = await loadTimeSlots();
+      setAvailableSlots(slots);
+      loadAvailability(slots);
+    };
+    loadSlots();
+  }, []);
+
+  const updateHold = (nextHold) => {
+    holdRef.current = nextHold;
+    setHold(nextHold);
+  };
+
+  const releaseHold = (token) => {
+    fetch(`http://localhost:5000/api/holds/${token}`, {
+      method: "DELETE",
+    }).catch(() => {
+      // The server releases it anyway once it expires
+    });
+  };
+
+  // Hold a table for the party in the chosen slot, giving back any table held before
+  const placeHold = async (timeSlot, guests) => {
+    const request = ++holdRequest.current;
+    if (holdRef.current) {
+      releaseHold(holdRef.current.token);
+      updateHold(null);
     }
+    if (!timeSlot) return;
 
-    return slots;
+    try {
+      const response = await fetch("http://localhost:5000/api/holds", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ time_slot: timeSlot, number_of_guests: guests }),
+      });
+      const data = await response.json();
+      if (!response.ok) return;
+      if (request !== holdRequest.current) {
+        // The guest picked something else (or left) while this was in flight
+        releaseHold(data.hold_token);
+      } else {
+        updateHold({
+          token: data.hold_token,
+          timeSlot,
+          guests,
+          expiresAt: new Date(data.expires_at),
+        });
+      }
+    } catch (error) {
+      // Booking without a hold still works; it just is not guaranteed a table
+      console.error("Table hold error:", error);
+    }
   };
 
+  // Give the table back if the guest leaves the page
   useEffect(() => {
-    setAvailableSlots(generateTimeSlots());
+    return () => {
+      holdRequest.current += 1;
+      if (holdRef.current) releaseHold(holdRef.current.token);
+    };
   }, []);
 
   const handleInputChange = (e) => {
     const { name, value, type, checked } = e.target;
+    idempotencyKey.current = null;
     setFormData((prev) => ({
       ...prev,
       [name]: type === "checkbox" ? checked : value,
     }));
+    if (name === "time_slot") {
+      placeHold(value, formData.number_of_guests);
+    } else if (name === "number_of_guests" && formData.time_slot) {
+      // A different party size may need a different table
+      placeHold(formData.time_slot, value);
+    }
   };
 
   const handleSubmit = async (e) => {
     e.preventDefault();
     setIsSubmitting(true);
     setSubmitStatus(null);
+    if (!idempotencyKey.current) {
+      idempotencyKey.current = crypto.randomUUID();
+    }
 
     try {
       const response = await fetch("http://localhost:5000/api/reservations", {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
+          "Idempotency-Key": idempotencyKey.current,
         },
-        body: JSON.stringify(formData),
+        body: JSON.stringify({
+          ...formData,
+          hold_token:
+            hold &&
+            hold.timeSlot === formData.time_slot &&
+            String(hold.guests) === String(formData.number_of_guests)
+              ? hold.token
+              : undefined,
+        }),
       });
 
       const data = await response.json();
 
-      if (response.ok) {
+      if (response.status === 202 && data.pending) {
+        // Still being booked; keep the key so submitting again replays the result
+        setSubmitStatus({ type: "info", message: data.message });
+      } else if (response.ok) {
         setSubmitStatus({
           type: "success",
           message: "Reservation confirmed successfully!",
@@ -93,6 +200,8 @@ const Reservations = () => {
           ).toLocaleString()}`,
         });
         // Reset form
+        idempotencyKey.current = null;
+        updateHold(null);
         setFormData({
           customer_name: "",
           email: "",
@@ -102,10 +211,28 @@ const Reservations = () => {
           newsletter_signup: false,
         });
       } else {
+        if (response.status === 410 || response.status === 409) {
+          // The hold lapsed or no longer fits; the guest has to pick a time again
+          updateHold(null);
+        }
         setSubmitStatus({
           type: "error",
           message:
             data.error || "An error occurred while making your reservation",
+          details:
+            data.alternatives && data.alternatives.length > 0
+              ? `Nearest open times: ${data.alternatives
+                  .map((slot) =>
+                    new Date(slot.time_slot).toLocaleString("en-US", {
+                      weekday: "short",
+                      month: "short",
+                      day: "numeric",
+                      hour: "numeric",
+                      minute: "2-digit",
+                    })
+                  )
+                  .join(", ")}`
+              : null,
         });
       }
     } catch (error) {
@@ -118,6 +245,8 @@ const Reservations = () => {
     }
   };
 
+  const partySizes = Array.from({ length: maxParty || 0 }, (_, i) => i + 1);
+
   return (
     <div
       className="reservations"
@@ -141,7 +270,8 @@ const Reservations = () => {
           <p className="reservation-description">
             We hold reservations for 15 minutes past the scheduled time. Please
             call us if you need to cancel or modify your reservation. Large
-            parties (8+ guests) should call us directly
+            parties{maxParty ? ` (${maxParty + 1}+ guests)` : ""} should call us
+            directly
           </p>
           <p className="booking-contact">
             Booking request <span className="phone-number">+88-123-123456</span>{" "}
@@ -165,11 +295,20 @@ const Reservations = () => {
               >
                 <option value="">Select a date and time</option>
                 {availableSlots.map((slot, index) => (
-                  <option key={index} value={slot.value}>
-                    {slot.label}
+                  <option key={index} value={slot.value} disabled={slot.isFull}>
+                    {slot.isFull ? `${slot.label} (Fully booked)` : slot.label}
                   </option>
                 ))}
               </select>
+              {hold && (
+                <p className="hold-note">
+                  A table is held for you until{" "}
+                  {hold.expiresAt.toLocaleTimeString("en-US", {
+                    hour: "numeric",
+                    minute: "2-digit",
+                  })}
+                </p>
+              )}
             </div>
 
             <div className="form-group">
@@ -185,7 +324,7 @@ const Reservations = () => {
                 required
               >
                 <option value="">Number of Guests *</option>
-                {[1, 2, 3, 4, 5, 6, 7, 8].map((num) => (
+                {partySizes.map((num) => (
                   <option key={num} value={num}>
                     {num} {num === 1 ? "Guest" : "Guests"}
                   </option>